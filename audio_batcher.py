@@ -0,0 +1,84 @@
+import asyncio
+import os
+from typing import Awaitable, Callable, Optional
+
+
+class OutboundAudioBatcher:
+    """Coalesce small agent-audio chunks before they are sent to Twilio.
+
+    Audio is held until at least ``frame_ms`` of it is buffered, then the
+    whole buffer goes out as one ``media`` message (large chunks are never
+    split). A timer flushes whatever is buffered ``max_latency_ms`` after
+    the first byte arrived, so the caller never waits longer than that for
+    the start of a reply.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[str], Awaitable[None]],
+        encode: Callable[[bytes], str],
+        *,
+        frame_ms: Optional[int] = None,
+        max_latency_ms: Optional[int] = None,
+        sample_rate: int = 8000,
+    ):
+        self._send = send
+        self._encode = encode
+        frame_ms = frame_ms or int(os.getenv("TWILIO_OUTBOUND_FRAME_MS", "100"))
+        if max_latency_ms is None:
+            max_latency_ms = int(os.getenv("TWILIO_OUTBOUND_MAX_LATENCY_MS", "40"))
+        # mulaw is one byte per sample
+        self.frame_bytes = sample_rate * frame_ms // 1000
+        self.max_latency = max_latency_ms / 1000
+
+        self._buffer = bytearray()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._lock = asyncio.Lock()
+        self._flush_tasks = set()
+
+        self.chunks_in = 0
+        self.messages_out = 0
+
+    async def add(self, audio: bytes):
+        self.chunks_in += 1
+        self._buffer += audio
+        if len(self._buffer) >= self.frame_bytes:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_latency, self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        task = asyncio.ensure_future(self.flush())
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_done)
+
+    def _flush_done(self, task):
+        self._flush_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"⚠️ Outbound audio flush failed: {task.exception()}")
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    async def flush(self):
+        """Send everything buffered now."""
+        # The lock keeps timer and size-triggered flushes in audio order
+        async with self._lock:
+            self._cancel_timer()
+            if not self._buffer:
+                return
+            audio = bytes(self._buffer)
+            self._buffer.clear()
+            self.messages_out += 1
+            await self._send(self._encode(audio))
+
+    def clear(self):
+        """Drop unsent audio, e.g. when the caller barges in."""
+        self._cancel_timer()
+        self._buffer.clear()
+
+    def stats(self) -> dict:
+        return {"chunks_in": self.chunks_in, "messages_out": self.messages_out}
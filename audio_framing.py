@@ -0,0 +1,48 @@
+from typing import Sequence
+
+_NO_FRAMES = ()
+
+
+class AudioFramer:
+    """Cut an incoming audio byte stream into fixed-size frames.
+
+    Audio accumulates in a single bytearray and consumed frames are deleted
+    from its front, which CPython does by advancing the buffer's start offset
+    rather than copying the unsent tail into a new object. Each emitted frame
+    is its own copy, safe to hand to a queue.
+    """
+
+    __slots__ = ("frame_size", "_buffer")
+
+    def __init__(self, frame_size: int):
+        if frame_size <= 0:
+            raise ValueError("frame_size must be positive")
+        self.frame_size = frame_size
+        self._buffer = bytearray()
+
+    @property
+    def pending(self) -> int:
+        """Bytes staged towards the next frame."""
+        return len(self._buffer)
+
+    def feed(self, data) -> Sequence[bytearray]:
+        """Add ``data`` and return every frame it completes."""
+        buffer = self._buffer
+        buffer += data
+        frame_size = self.frame_size
+
+        # Common case: a small Twilio chunk that doesn't finish a frame
+        if len(buffer) < frame_size:
+            return _NO_FRAMES
+
+        frames = []
+        while len(buffer) >= frame_size:
+            frames.append(buffer[:frame_size])
+            del buffer[:frame_size]
+        return frames
+
+    def flush(self) -> bytes:
+        """Return and clear any partial frame."""
+        tail = bytes(self._buffer)
+        self._buffer.clear()
+        return tail
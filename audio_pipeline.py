@@ -0,0 +1,113 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Optional
+
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+MERGE = "merge"
+POLICIES = (DROP_OLDEST, DROP_NEWEST, MERGE)
+
+
+class AudioPipeline:
+    """Bounded audio queue between the Twilio receiver and the Deepgram sender.
+
+    When the queue is full the overflow policy decides what gives:
+    ``drop_oldest`` discards the stalest queued frame, ``drop_newest``
+    discards the incoming frame, and ``merge`` appends the incoming frame to
+    the newest queued one (up to ``merge_limit`` frames' worth) so a slow
+    socket catches up with fewer, larger sends. Frames older than
+    ``max_age`` seconds are dropped at dequeue time instead of being sent
+    late. Drop-in for the ``asyncio.Queue`` ``put_nowait``/``get`` calls.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_frames: Optional[int] = None,
+        max_age: Optional[float] = None,
+        policy: Optional[str] = None,
+        merge_limit: int = 4,
+    ):
+        self.max_frames = max_frames or int(os.getenv("AUDIO_QUEUE_MAX_FRAMES", "25"))
+        if max_age is None:
+            max_age = float(os.getenv("AUDIO_MAX_FRAME_AGE_MS", "5000")) / 1000
+        self.max_age = max_age
+        self.policy = policy or os.getenv("AUDIO_DROP_POLICY", DROP_OLDEST)
+        if self.policy not in POLICIES:
+            raise ValueError(f"Unknown audio drop policy '{self.policy}'")
+        self.merge_limit = merge_limit
+
+        # (enqueued_at, frame, frames_merged)
+        self._frames = deque()
+        self._ready = asyncio.Event()
+
+        self.enqueued = 0
+        self.sent = 0
+        self.merged = 0
+        self.dropped_overflow = 0
+        self.dropped_stale = 0
+        self.max_depth = 0
+        self._age_total = 0.0
+        self._age_max = 0.0
+
+    def qsize(self) -> int:
+        return len(self._frames)
+
+    def put_nowait(self, frame):
+        now = time.monotonic()
+        self.enqueued += 1
+
+        if len(self._frames) >= self.max_frames:
+            if self.policy == DROP_NEWEST:
+                self.dropped_overflow += 1
+                return
+            if self.policy == MERGE and self._merge_into_tail(frame):
+                return
+            # A merged entry carries several frames' worth of audio
+            _, _, count = self._frames.popleft()
+            self.dropped_overflow += count
+
+        self._frames.append((now, frame, 1))
+        self.max_depth = max(self.max_depth, len(self._frames))
+        self._ready.set()
+
+    def _merge_into_tail(self, frame) -> bool:
+        enqueued_at, tail, count = self._frames[-1]
+        if count >= self.merge_limit:
+            return False
+        # Keep the tail's timestamp so the merged frame's age reflects its oldest audio
+        self._frames[-1] = (enqueued_at, bytes(tail) + bytes(frame), count + 1)
+        self.merged += 1
+        return True
+
+    async def get(self):
+        while True:
+            while not self._frames:
+                self._ready.clear()
+                await self._ready.wait()
+
+            enqueued_at, frame, count = self._frames.popleft()
+            age = time.monotonic() - enqueued_at
+            if self.max_age and age > self.max_age:
+                self.dropped_stale += count
+                continue
+
+            self.sent += count
+            self._age_total += age * count
+            self._age_max = max(self._age_max, age)
+            return frame
+
+    def stats(self) -> dict:
+        return {
+            "depth": len(self._frames),
+            "max_depth": self.max_depth,
+            "enqueued": self.enqueued,
+            "sent": self.sent,
+            "merged": self.merged,
+            "dropped_overflow": self.dropped_overflow,
+            "dropped_stale": self.dropped_stale,
+            "age_avg_ms": round(self._age_total / self.sent * 1000, 2) if self.sent else 0.0,
+            "age_max_ms": round(self._age_max * 1000, 2),
+        }
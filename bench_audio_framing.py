@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: legacy bytearray slicing vs AudioFramer in twilio_receiver
+
+Feeds the same synthetic mulaw stream through both framers for a range of
+inbound chunk sizes (Twilio normally sends 160-byte / 20 ms chunks) and
+reports frames per second for each.
+"""
+import argparse
+import os
+import time
+
+from audio_framing import AudioFramer
+
+BUFFER_SIZE = 20 * 160
+
+
+def legacy_framer(chunks, frame_size):
+    """The original twilio_receiver loop."""
+    frames = 0
+    inbuffer = bytearray(b"")
+    for chunk in chunks:
+        inbuffer.extend(chunk)
+        while len(inbuffer) >= frame_size:
+            frame = inbuffer[:frame_size]
+            frames += 1
+            inbuffer = inbuffer[frame_size:]
+    return frames
+
+
+def ring_framer(chunks, frame_size):
+    frames = 0
+    feed = AudioFramer(frame_size).feed
+    for chunk in chunks:
+        frames += len(feed(chunk))
+    return frames
+
+
+def run(chunk_size, seconds_of_audio, repeat):
+    total_bytes = 8000 * seconds_of_audio
+    chunks = [os.urandom(chunk_size) for _ in range(total_bytes // chunk_size)]
+
+    results = {}
+    for name, framer in (("legacy", legacy_framer), ("ring", ring_framer)):
+        best = float("inf")
+        frames = 0
+        for _ in range(repeat):
+            started = time.perf_counter()
+            frames = framer(chunks, BUFFER_SIZE)
+            best = min(best, time.perf_counter() - started)
+        results[name] = (frames, best)
+
+    legacy_frames, legacy_time = results["legacy"]
+    ring_frames, ring_time = results["ring"]
+    assert legacy_frames == ring_frames
+    print(
+        f"chunk={chunk_size:>6}B  frames={ring_frames:>6}  "
+        f"legacy={legacy_frames / legacy_time:>12,.0f} frames/s "
+        f"({legacy_time / len(chunks) * 1e9:>6.0f} ns/chunk)  "
+        f"ring={ring_frames / ring_time:>12,.0f} frames/s "
+        f"({ring_time / len(chunks) * 1e9:>6.0f} ns/chunk)  "
+        f"speedup={legacy_time / ring_time:.2f}x"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=int, default=600, help="seconds of 8 kHz audio per run")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"Audio framing benchmark ({args.seconds}s of audio, frame={BUFFER_SIZE}B, best of {args.repeat})")
+    for chunk_size in (160, 640, 3200, 16000, 64000):
+        run(chunk_size, args.seconds, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Benchmark: encoding a stored session document for a mobile client
+
+"before" is the old path: walk the document to convert datetimes and
+ObjectIds and drop passcodeHash, then json.dumps the copy. "after" is the
+codec encoding the document (already projected without passcodeHash) in a
+single pass. Results are encodes per second on one core, plus the peak
+memory allocated by one encode.
+"""
+import argparse
+import json
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+import mobile_codec
+
+STARTED = datetime(2026, 3, 2, 14, 5)
+
+
+def session_document(messages, *, with_passcode_hash):
+    """A finished call as ``find_session(with_history=True)`` returns it from Mongo."""
+    document = {
+        "_id": ObjectId(),
+        "sessionId": "MZ18ad3ab5a668481ce02b83e7395059f0",
+        "callSid": "CA18ad3ab5a668481ce02b83e7395059f0",
+        "phoneNumber": "+15550100",
+        "username": "caller",
+        "status": "completed",
+        "createdAt": STARTED,
+        "updatedAt": STARTED + timedelta(seconds=7 * messages),
+        "endedAt": STARTED + timedelta(seconds=7 * messages),
+        "messages": [
+            {
+                "seq": seq,
+                "role": "assistant" if seq % 2 else "user",
+                "type": "agent_response" if seq % 2 else "transcription",
+                "text": "Take one tablet twice a day with food, and avoid NSAIDs while on it.",
+                "timestamp": STARTED + timedelta(seconds=7 * seq),
+            }
+            for seq in range(messages)
+        ],
+        "functionCalls": [
+            {
+                "seq": messages + n,
+                "name": "check_drug_interactions",
+                "parameters": {"medications": ["lisinopril", "ibuprofen"]},
+                "result": {"severity": "moderate", "interactions": 1},
+                "timestamp": STARTED + timedelta(seconds=70 * n),
+            }
+            for n in range(messages // 10)
+        ],
+    }
+    if with_passcode_hash:
+        document["passcodeHash"] = "0" * 64
+    return document
+
+
+def serialise_for_client(data):
+    """The recursive conversion the bridge used to run before encoding."""
+    if isinstance(data, datetime):
+        return data.isoformat()
+    if isinstance(data, ObjectId):
+        return str(data)
+    if isinstance(data, list):
+        return [serialise_for_client(item) for item in data]
+    if isinstance(data, dict):
+        return {key: serialise_for_client(value) for key, value in data.items() if key != "passcodeHash"}
+    return data
+
+
+def before(document):
+    return json.dumps({"event": "history", "history": serialise_for_client(document)})
+
+
+def single_pass(codec):
+    def run(document):
+        return codec.encode({"event": "history", "history": document})
+
+    return run
+
+
+def best_rate(func, item, repeat, number):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            func(item)
+        best = min(best, time.perf_counter() - started)
+    return number / best
+
+
+def peak_allocated(func, item):
+    tracemalloc.start()
+    func(item)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--number", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    stored = session_document(args.messages, with_passcode_hash=True)
+    projected = session_document(args.messages, with_passcode_hash=False)
+    before_rate = best_rate(before, stored, args.repeat, args.number)
+    print(f"Client serialisation benchmark ({args.messages} messages, best of {args.repeat})")
+    print(
+        f"{'before: walk + json.dumps':<30} {before_rate:>9,.0f}/s  "
+        f"peak={peak_allocated(before, stored) / 1024:>7,.0f} KiB"
+    )
+    for codec in mobile_codec.available.values():
+        encode = single_pass(codec)
+        rate = best_rate(encode, projected, args.repeat, args.number)
+        print(
+            f"{'after: ' + codec.name + ' single pass':<30} {rate:>9,.0f}/s  "
+            f"peak={peak_allocated(encode, projected) / 1024:>7,.0f} KiB  speedup={rate / before_rate:.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Benchmark: mobile wire encodings for history and recent_conversations payloads
+
+For each encoding available here (JSON through json_backend, MessagePack,
+CBOR) it reports the encoded size, the size after permessage-deflate with
+the server's default window, and encode/decode throughput on one core.
+"""
+import argparse
+import os
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+
+import mobile_codec
+
+STARTED = datetime(2026, 3, 2, 14, 5, tzinfo=timezone.utc)
+
+
+def history_chunk(size):
+    """A ``history_chunk`` as the bridge sends it, after serialising for the client."""
+    entries = []
+    for seq in range(size):
+        timestamp = (STARTED + timedelta(seconds=7 * seq)).isoformat()
+        if seq % 10 == 9:
+            entries.append({
+                "kind": "function_call",
+                "seq": seq,
+                "timestamp": timestamp,
+                "function_name": "check_drug_interactions",
+                "arguments": {"medications": ["lisinopril", "ibuprofen"]},
+                "result": {"severity": "moderate", "interactions": 1},
+            })
+        else:
+            entries.append({
+                "kind": "message",
+                "seq": seq,
+                "timestamp": timestamp,
+                "speaker": "agent" if seq % 2 else "user",
+                "text": "Take one tablet twice a day with food, and avoid NSAIDs while on it. " * 2,
+            })
+    return {
+        "event": "history_chunk",
+        "session_id": "MZ18ad3ab5a668481ce02b83e7395059f0",
+        "entries": entries,
+        "next_cursor": f"seq:{size}",
+    }
+
+
+def recent_conversations(count, messages):
+    conversations = []
+    for n in range(count):
+        chunk = history_chunk(messages)["entries"]
+        conversations.append({
+            "sessionId": f"MZ{n:032x}",
+            "callSid": f"CA{n:032x}",
+            "phoneNumber": "+15550100",
+            "username": "caller",
+            "status": "completed",
+            "createdAt": (STARTED + timedelta(minutes=n)).isoformat(),
+            "updatedAt": (STARTED + timedelta(minutes=n, seconds=90)).isoformat(),
+            "messages": [entry for entry in chunk if entry["kind"] == "message"],
+            "functionCalls": [entry for entry in chunk if entry["kind"] == "function_call"],
+        })
+    return {"event": "recent_conversations", "conversations": conversations}
+
+
+def deflated_size(frame, window_bits):
+    if isinstance(frame, str):
+        frame = frame.encode("utf-8")
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -window_bits, 5)
+    # permessage-deflate strips the trailing empty block
+    return len(compressor.compress(frame) + compressor.flush(zlib.Z_SYNC_FLUSH)) - 4
+
+
+def best_rate(func, item, repeat, number):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            func(item)
+        best = min(best, time.perf_counter() - started)
+    return number / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--window-bits", type=int, default=int(os.getenv("MOBILE_WS_DEFLATE_WINDOW_BITS", "12")))
+    args = parser.parse_args()
+
+    payloads = {
+        "history_chunk 50": history_chunk(50),
+        "history_chunk 200": history_chunk(200),
+        "recent_conversations 5x40": recent_conversations(5, 40),
+    }
+    print(
+        f"Mobile codec benchmark (encodings: {', '.join(mobile_codec.available)}, "
+        f"deflate window 2^{args.window_bits}, best of {args.repeat})"
+    )
+    for label, payload in payloads.items():
+        print(label)
+        baseline = None
+        # JSON first: sizes are reported relative to it
+        for codec in sorted(mobile_codec.available.values(), key=lambda codec: codec.binary):
+            frame = codec.encode(payload)
+            raw = len(frame.encode("utf-8")) if isinstance(frame, str) else len(frame)
+            baseline = baseline or raw
+            encode_rate = best_rate(codec.encode, payload, args.repeat, args.number)
+            decode_rate = best_rate(codec.decode, frame, args.repeat, args.number)
+            print(
+                f"  {codec.name:<8} raw={raw:>8,}B ({raw / baseline:>4.0%})  "
+                f"deflated={deflated_size(frame, args.window_bits):>7,}B  "
+                f"encode={encode_rate:>9,.0f}/s  decode={decode_rate:>9,.0f}/s"
+            )
+
+
+if __name__ == "__main__":
+    main()
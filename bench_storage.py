@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Benchmark: call history storage backends under the same load
+
+Writes ``--sessions`` calls of ``--messages`` entries each through the
+same ``SessionWriteBehind`` batching the bridge uses, then times reading
+each session's full history, paging it with ``history_pages`` and listing
+recent sessions. SQLite runs against a temporary file; MongoDB runs when
+``MONGODB_URI`` is set, in a scratch ``<MONGODB_DB_NAME>_bench`` database
+that is dropped afterwards.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+
+from session_writer import SessionWriteBehind
+from storage import MONGO, SQLITE
+
+PHONE = "+15550100"
+PASSCODE_HASH = "0" * 64
+
+
+def entry(n):
+    if n % 5 == 4:
+        return "functionCalls", {
+            "name": "lookup_medication",
+            "parameters": {"name": "ibuprofen"},
+            "result": {"found": True, "dosage": "200mg every 4-6 hours"},
+            "timestamp": datetime.now(timezone.utc),
+        }
+    return "messages", {
+        "role": "user" if n % 2 else "assistant",
+        "type": "transcription",
+        "text": "How often can I take this medication with food? " * 2,
+        "timestamp": datetime.now(timezone.utc),
+    }
+
+
+async def open_backend(name, workdir):
+    if name == SQLITE:
+        from sqlite_storage import SQLiteStorage
+
+        storage = SQLiteStorage(os.path.join(workdir, "bench.db"))
+        await storage.start()
+        return storage, None
+
+    from mongo_storage import MongoStorage
+    from persistence import MongoPersistence
+
+    db_name = os.getenv("MONGODB_DB_NAME", "agent") + "_bench"
+    storage = MongoStorage(MongoPersistence(db_name=db_name))
+    await storage.start()
+    if not storage.available:
+        raise RuntimeError("MongoDB is not reachable")
+
+    async def cleanup():
+        await storage.persistence.client.drop_database(db_name)
+
+    return storage, cleanup
+
+
+async def run_backend(name, args, workdir):
+    storage, cleanup = await open_backend(name, workdir)
+    session_ids = [f"MZbench{n:05d}" for n in range(args.sessions)]
+    try:
+        for session_id in session_ids:
+            await storage.upsert_session(
+                session_id,
+                {
+                    "callSid": f"CA{session_id}",
+                    "phoneNumber": PHONE,
+                    "username": "bench",
+                    "passcodeHash": PASSCODE_HASH,
+                    "timestamp": datetime.now(timezone.utc),
+                },
+            )
+
+        writer = SessionWriteBehind(storage, batch_size=args.batch_size, flush_interval_ms=10_000)
+        started = time.perf_counter()
+        # Calls interleave the way concurrent calls do
+        for n in range(args.messages):
+            for session_id in session_ids:
+                field, item = entry(n)
+                await writer.add(session_id, field, item)
+        await writer.flush()
+        write_seconds = time.perf_counter() - started
+        total = args.sessions * args.messages
+
+        started = time.perf_counter()
+        for session_id in session_ids:
+            await storage.find_session(PHONE, PASSCODE_HASH, session_id, with_history=True)
+        full_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        paged = 0
+        for session_id in session_ids:
+            session = await storage.find_session(PHONE, PASSCODE_HASH, session_id)
+            async for entries, _ in storage.history_pages(session, size=args.page_size):
+                paged += len(entries)
+        paged_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        cursor = None
+        while True:
+            _, cursor = await storage.recent_sessions(limit=5, cursor=cursor)
+            if cursor is None:
+                break
+        recent_seconds = time.perf_counter() - started
+
+        return {
+            "write": total / write_seconds,
+            "flushes": writer.stats()["flushes"],
+            "full_ms": full_seconds / args.sessions * 1000,
+            "paged_ms": paged_seconds / args.sessions * 1000,
+            "paged": paged,
+            "recent_ms": recent_seconds * 1000,
+        }
+    finally:
+        if cleanup is not None:
+            await cleanup()
+        await storage.close()
+
+
+def report(name, result):
+    print(
+        f"{name:<8} write={result['write']:>10,.0f} entries/s ({result['flushes']} batches)  "
+        f"full history={result['full_ms']:>7.2f} ms/session  "
+        f"paged={result['paged_ms']:>7.2f} ms/session  "
+        f"recent walk={result['recent_ms']:>7.2f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=200, help="entries per session")
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--backends", default="sqlite,mongo")
+    args = parser.parse_args()
+
+    load_dotenv()
+    backends = args.backends.split(",")
+    print(
+        f"History storage benchmark ({args.sessions} sessions x {args.messages} entries, "
+        f"batch size {args.batch_size})"
+    )
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in backends:
+            if name == MONGO and not os.getenv("MONGODB_URI"):
+                print(f"{name:<8} skipped (MONGODB_URI is not set)")
+                continue
+            report(name, asyncio.run(run_backend(name, args, workdir)))
+
+
+if __name__ == "__main__":
+    main()
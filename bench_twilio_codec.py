@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Twilio media message handling, stdlib path vs twilio_codec
+
+Inbound measures decoding a Twilio ``media`` envelope and its base64
+payload; outbound measures building the ``media`` message for one chunk of
+agent audio. Results are frames per second on a single core.
+"""
+import argparse
+import base64
+import json
+import os
+import time
+
+from json_backend import get_backend
+from twilio_codec import TwilioMediaCodec
+
+STREAM_SID = "MZ18ad3ab5a668481ce02b83e7395059f0"
+
+
+def inbound_message(payload_size):
+    return json.dumps({
+        "event": "media",
+        "sequenceNumber": "42",
+        "media": {
+            "track": "inbound",
+            "chunk": "41",
+            "timestamp": "5140",
+            "payload": base64.b64encode(os.urandom(payload_size)).decode("ascii"),
+        },
+        "streamSid": STREAM_SID,
+    })
+
+
+def legacy_inbound(messages):
+    for message in messages:
+        data = json.loads(message)
+        media = data["media"]
+        chunk = base64.b64decode(media["payload"])
+        if media["track"] == "inbound":
+            pass
+
+
+def codec_inbound(codec):
+    decode = codec.decode
+    decode_payload = codec.decode_payload
+
+    def run(messages):
+        for message in messages:
+            data = decode(message)
+            media = data["media"]
+            if media["track"] == "inbound":
+                chunk = decode_payload(media)
+
+    return run
+
+
+def legacy_outbound(chunks):
+    for raw_mulaw in chunks:
+        media_message = {
+            "event": "media",
+            "streamSid": STREAM_SID,
+            "media": {"payload": base64.b64encode(raw_mulaw).decode("ascii")},
+        }
+        json.dumps(media_message)
+
+
+def codec_outbound(codec):
+    encode_media = codec.encoder(STREAM_SID).media
+
+    def run(chunks):
+        for raw_mulaw in chunks:
+            encode_media(raw_mulaw)
+
+    return run
+
+
+def best_rate(func, items, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(items)
+        best = min(best, time.perf_counter() - started)
+    return len(items) / best
+
+
+def report(label, legacy_rate, codec_rate):
+    print(
+        f"{label:<28} before={legacy_rate:>12,.0f} frames/s  "
+        f"after={codec_rate:>12,.0f} frames/s  speedup={codec_rate / legacy_rate:.2f}x"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--frames", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--backend", default=None, help="force json, ujson or orjson")
+    args = parser.parse_args()
+
+    codec = TwilioMediaCodec(get_backend(args.backend))
+    print(f"Twilio codec benchmark (JSON backend: {codec.backend.name}, best of {args.repeat})")
+
+    for size in (160, 640):
+        messages = [inbound_message(size) for _ in range(args.frames)]
+        report(
+            f"inbound  {size:>5}B payload",
+            best_rate(legacy_inbound, messages, args.repeat),
+            best_rate(codec_inbound(codec), messages, args.repeat),
+        )
+
+    for size in (160, 800, 3200):
+        chunks = [os.urandom(size) for _ in range(args.frames)]
+        report(
+            f"outbound {size:>5}B chunk",
+            best_rate(legacy_outbound, chunks, args.repeat),
+            best_rate(codec_outbound(codec), chunks, args.repeat),
+        )
+
+
+if __name__ == "__main__":
+    main()
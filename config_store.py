@@ -0,0 +1,159 @@
+import asyncio
+import inspect
+import json
+import os
+from typing import Any, Callable, Dict, List, Optional
+
+
+class ConfigError(Exception):
+    """Raised when the agent config can't be loaded or doesn't match the tools."""
+
+
+def validate_functions(config: dict, function_map: Dict[str, Callable[..., Any]]) -> List[str]:
+    """Check the declared agent functions against the tools we can run."""
+    problems = []
+    functions = config.get("agent", {}).get("think", {}).get("functions", [])
+
+    for spec in functions:
+        name = spec.get("name")
+        func = function_map.get(name)
+        if func is None:
+            problems.append(f"function '{name}' is declared but not in FUNCTION_MAP")
+            continue
+
+        parameters = spec.get("parameters", {})
+        properties = set(parameters.get("properties", {}))
+        required = set(parameters.get("required", []))
+
+        missing_properties = required - properties
+        if missing_properties:
+            problems.append(f"function '{name}' requires undeclared parameters {sorted(missing_properties)}")
+
+        signature = inspect.signature(func)
+        accepts_kwargs = any(
+            param.kind is inspect.Parameter.VAR_KEYWORD for param in signature.parameters.values()
+        )
+        if not accepts_kwargs:
+            unknown = properties - set(signature.parameters)
+            if unknown:
+                problems.append(f"function '{name}' does not accept parameters {sorted(unknown)}")
+
+        mandatory = {
+            param_name
+            for param_name, param in signature.parameters.items()
+            if param.default is inspect.Parameter.empty
+            and param.kind in (inspect.Parameter.POSITIONAL_OR_KEYWORD, inspect.Parameter.KEYWORD_ONLY)
+        }
+        not_required = mandatory - required
+        if not_required:
+            problems.append(f"function '{name}' needs {sorted(not_required)} but the schema doesn't require them")
+
+    return problems
+
+
+class ConfigStore:
+    """Agent config loaded once, pre-encoded, and hot-reloaded on change.
+
+    ``settings_payload`` is the Settings message already serialised to JSON
+    text, ready to send to every Deepgram connection. ``watch`` polls the
+    file's mtime and swaps in a new config only if it parses and validates;
+    calls already connected keep the Settings they started with.
+    """
+
+    def __init__(
+        self,
+        path: str = "config.json",
+        function_map: Optional[Dict[str, Callable[..., Any]]] = None,
+        *,
+        poll_interval: Optional[float] = None,
+    ):
+        self.path = path
+        self.function_map = function_map
+        self.poll_interval = (
+            poll_interval if poll_interval is not None else float(os.getenv("CONFIG_POLL_INTERVAL", "2"))
+        )
+        self.config: Optional[dict] = None
+        self.settings_payload: Optional[str] = None
+        self.generation = 0
+        self._mtime: Optional[float] = None
+        self._listeners: List[Callable[[], Any]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def load(self) -> dict:
+        """Read, validate and cache the config; raises ConfigError on failure."""
+        try:
+            mtime = os.stat(self.path).st_mtime
+            with open(self.path, "r") as f:
+                config = json.load(f)
+        except (OSError, ValueError) as exc:
+            raise ConfigError(f"Could not load {self.path}: {exc}") from exc
+
+        if self.function_map is not None:
+            problems = validate_functions(config, self.function_map)
+            if problems:
+                raise ConfigError(f"Invalid {self.path}: " + "; ".join(problems))
+
+        self.config = config
+        self.settings_payload = json.dumps(config)
+        self.generation += 1
+        self._mtime = mtime
+        return config
+
+    def get(self) -> dict:
+        if self.config is None:
+            self.load()
+        return self.config
+
+    def get_payload(self) -> str:
+        if self.settings_payload is None:
+            self.load()
+        return self.settings_payload
+
+    def on_reload(self, listener: Callable[[], Any]):
+        """Call ``listener`` (sync or async) after each successful reload."""
+        self._listeners.append(listener)
+
+    async def reload_if_changed(self) -> bool:
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError as exc:
+            print(f"⚠️ Config file unavailable, keeping current config: {exc}")
+            return False
+        if mtime == self._mtime:
+            return False
+
+        try:
+            self.load()
+        except ConfigError as exc:
+            # Remember this version so a broken file isn't re-parsed every poll
+            self._mtime = mtime
+            print(f"⚠️ {exc}. Keeping previous config.")
+            return False
+
+        print(f"🔄 Reloaded {self.path} (generation {self.generation})")
+        for listener in self._listeners:
+            try:
+                result = listener()
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as exc:
+                print(f"⚠️ Config reload listener failed: {exc}")
+        return True
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            await self.reload_if_changed()
+
+    def start_watching(self):
+        if self._task is None and self.poll_interval > 0:
+            self._task = asyncio.create_task(self._watch())
+
+    async def stop_watching(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,109 @@
+"""
+Fakes shared by the test modules; import them with ``from conftest import ...``
+"""
+import asyncio
+import json
+import os
+import tempfile
+
+from pymongo.errors import BulkWriteError
+
+
+def temp_path():
+    """A fresh SQLite database path in its own temporary directory."""
+    directory = tempfile.mkdtemp()
+    return os.path.join(directory, "history.db")
+
+
+class FakeClient:
+    """A mobile websocket that records the JSON it is sent."""
+
+    def __init__(self, name, delay=0.0):
+        self.remote_address = (name, 0)
+        self.delay = delay
+        self.received = []
+        self.closed_with = None
+
+    async def send(self, message):
+        await asyncio.sleep(self.delay)
+        self.received.append(json.loads(message))
+
+    async def close(self, code=1000, reason=""):
+        self.closed_with = code
+
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def sort(self, key, direction=1):
+        self.documents.sort(key=lambda doc: doc[key], reverse=direction < 0)
+        return self
+
+    def limit(self, count):
+        self.documents = self.documents[:count]
+        return self
+
+    async def to_list(self, length=None):
+        return [dict(doc) for doc in self.documents[:length]]
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in self.documents:
+            yield dict(doc)
+
+
+class FakeCollection:
+    """Just enough of a Motor collection for these tests."""
+
+    def __init__(self, documents=None):
+        self.documents = list(documents or [])
+        self.updates = []
+
+    @staticmethod
+    def _matches(doc, query):
+        for key, expected in query.items():
+            if key.startswith("$"):
+                continue
+            value = doc.get(key)
+            if isinstance(expected, dict) and "$gt" in expected:
+                if value is None or value <= expected["$gt"]:
+                    return False
+            elif value != expected:
+                return False
+        return True
+
+    def find(self, query, projection=None):
+        return FakeCursor([doc for doc in self.documents if self._matches(doc, query)])
+
+    async def find_one(self, query, projection=None, sort=None):
+        cursor = self.find(query)
+        if sort:
+            cursor.sort(*sort[0])
+        found = await cursor.to_list(1)
+        return found[0] if found else None
+
+    async def insert_many(self, documents, ordered=True):
+        keys = {(doc["sessionId"], doc["seq"]) for doc in self.documents}
+        errors, inserted = [], []
+        for doc in documents:
+            if (doc["sessionId"], doc["seq"]) in keys:
+                errors.append({"code": 11000})
+            else:
+                keys.add((doc["sessionId"], doc["seq"]))
+                self.documents.append(dict(doc))
+                inserted.append(doc["seq"])
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "nInserted": len(inserted)})
+        return type("Result", (), {"inserted_ids": inserted})()
+
+    async def create_index(self, keys, unique=False):
+        pass
+
+    async def bulk_write(self, operations, ordered=True):
+        self.updates.extend(op._doc for op in operations)
+
+    async def update_one(self, query, update):
+        self.updates.append(update)
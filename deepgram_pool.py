@@ -0,0 +1,188 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional
+
+from websockets.protocol import State
+
+
+class PooledConnection:
+    __slots__ = ("ws", "created_at")
+
+    def __init__(self, ws):
+        self.ws = ws
+        self.created_at = time.monotonic()
+
+
+class AgentConnectionPool:
+    """Warm pool of connected, already-configured Deepgram agent sockets.
+
+    Each idle socket has finished its TLS and websocket handshakes and been
+    sent the Settings message, so a call that checks one out can stream
+    audio straight away. Sockets are single-use: the call closes its socket
+    when it ends and a background task tops the pool back up. Idle sockets
+    are kept alive, health-checked with pings and recycled after ``ttl``
+    seconds.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], Awaitable],
+        settings: Callable[[], str],
+        *,
+        size: Optional[int] = None,
+        ttl: Optional[float] = None,
+        health_interval: Optional[float] = None,
+    ):
+        self._connect = connect
+        self._settings = settings
+        self.size = size if size is not None else int(os.getenv("DEEPGRAM_POOL_SIZE", "2"))
+        self.ttl = ttl if ttl is not None else float(os.getenv("DEEPGRAM_POOL_TTL", "60"))
+        self.health_interval = (
+            health_interval if health_interval is not None
+            else float(os.getenv("DEEPGRAM_POOL_HEALTH_INTERVAL", "5"))
+        )
+
+        self._idle = deque()
+        self._opening = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.discarded = 0
+        self.connect_failures = 0
+        self._first_audio_ms = deque(maxlen=200)
+
+    async def open_connection(self):
+        """Open and configure a fresh agent socket."""
+        ws = await self._connect()
+        try:
+            await ws.send(self._settings())
+        except Exception:
+            await ws.close()
+            raise
+        return ws
+
+    def _is_usable(self, conn: PooledConnection) -> bool:
+        return conn.ws.state is State.OPEN and time.monotonic() - conn.created_at < self.ttl
+
+    async def checkout(self):
+        """Return a configured socket, from the pool when one is ready."""
+        while self._idle:
+            conn = self._idle.popleft()
+            if self._is_usable(conn):
+                self.hits += 1
+                self._wake()
+                return conn.ws
+            await self._discard(conn)
+
+        self.misses += 1
+        self._wake()
+        return await self.open_connection()
+
+    async def invalidate(self):
+        """Close idle sockets, e.g. after Settings change; the pool refills itself."""
+        stale = list(self._idle)
+        self._idle.clear()
+        for conn in stale:
+            await self._discard(conn)
+        self._wake()
+
+    async def _discard(self, conn: PooledConnection):
+        self.discarded += 1
+        try:
+            await conn.ws.close()
+        except Exception:
+            pass
+
+    def _wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def start(self):
+        if self.size > 0 and self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._maintain())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        while self._idle:
+            await self._discard(self._idle.popleft())
+
+    async def _maintain(self):
+        backoff = 1.0
+        while True:
+            self._wakeup.clear()
+            await self._health_check()
+
+            try:
+                while len(self._idle) + self._opening < self.size:
+                    self._opening += 1
+                    try:
+                        ws = await self.open_connection()
+                    finally:
+                        self._opening -= 1
+                    self._idle.append(PooledConnection(ws))
+                backoff = 1.0
+                timeout = self.health_interval
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                self.connect_failures += 1
+                print(f"⚠️ Deepgram pool could not open a connection: {exc}. Retrying in {backoff:.0f}s")
+                timeout = backoff
+                backoff = min(backoff * 2, 30.0)
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _health_check(self):
+        for conn in list(self._idle):
+            if conn not in self._idle:
+                continue  # checked out while we were pinging another socket
+            if self._is_usable(conn) and await self._responds(conn):
+                continue
+            try:
+                self._idle.remove(conn)
+            except ValueError:
+                continue
+            await self._discard(conn)
+
+    @staticmethod
+    async def _responds(conn: PooledConnection) -> bool:
+        try:
+            # KeepAlive stops the agent closing an idle socket; the ping proves it answers
+            await conn.ws.send('{"type":"KeepAlive"}')
+            pong = await conn.ws.ping()
+            await asyncio.wait_for(pong, timeout=2)
+            return True
+        except Exception:
+            return False
+
+    def record_first_audio(self, milliseconds: float):
+        self._first_audio_ms.append(milliseconds)
+
+    def stats(self) -> dict:
+        checkouts = self.hits + self.misses
+        samples = sorted(self._first_audio_ms)
+        return {
+            "idle": len(self._idle),
+            "size": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / checkouts, 3) if checkouts else 0.0,
+            "discarded": self.discarded,
+            "connect_failures": self.connect_failures,
+            "first_audio_ms_p50": samples[len(samples) // 2] if samples else None,
+            "first_audio_ms_max": samples[-1] if samples else None,
+        }
@@ -0,0 +1,88 @@
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+class Subscriber:
+    __slots__ = ("name", "handler", "max_pending", "queue", "task", "handled", "dropped", "failed")
+
+    def __init__(self, name: str, handler: Callable[[dict], Awaitable[Any]], max_pending: int):
+        self.name = name
+        self.handler = handler
+        self.max_pending = max_pending
+        self.queue: Optional[asyncio.Queue] = None
+        self.task: Optional[asyncio.Task] = None
+        self.handled = 0
+        self.dropped = 0
+        self.failed = 0
+
+
+class EventBus:
+    """In-process event bus that decouples the call path from side effects.
+
+    ``publish`` never awaits: it drops the event into each subscriber's
+    queue and returns. Every subscriber has its own consumer task that
+    handles events one at a time, in publish order, so a slow Mongo write
+    or mobile client only delays that subscriber. A subscriber more than
+    ``max_pending`` events behind drops new ones, except those published
+    with ``droppable=False``, which are always queued.
+    """
+
+    def __init__(self, *, max_pending: Optional[int] = None):
+        self.max_pending = max_pending or int(os.getenv("EVENT_BUS_MAX_PENDING", "10000"))
+        self.subscribers: Dict[str, Subscriber] = {}
+
+    def subscribe(self, name: str, handler: Callable[[dict], Awaitable[Any]]):
+        self.subscribers[name] = Subscriber(name, handler, self.max_pending)
+
+    def publish(self, event: dict, *, droppable: bool = True):
+        for subscriber in self.subscribers.values():
+            self._ensure_consumer(subscriber)
+            if droppable and subscriber.queue.qsize() >= subscriber.max_pending:
+                subscriber.dropped += 1
+                if subscriber.dropped == 1 or subscriber.dropped % 1000 == 0:
+                    print(f"⚠️ Event bus '{subscriber.name}' is full; dropped {subscriber.dropped} events")
+                continue
+            subscriber.queue.put_nowait(event)
+
+    def _ensure_consumer(self, subscriber: Subscriber):
+        # Consumers start lazily so the bus can be built before the event loop runs
+        if subscriber.task is None or subscriber.task.done():
+            if subscriber.queue is None:
+                # Unbounded so events that must not be dropped always fit;
+                # publish enforces max_pending for the rest
+                subscriber.queue = asyncio.Queue()
+            subscriber.task = asyncio.get_running_loop().create_task(self._consume(subscriber))
+
+    async def _consume(self, subscriber: Subscriber):
+        while True:
+            event = await subscriber.queue.get()
+            try:
+                await subscriber.handler(event)
+                subscriber.handled += 1
+            except Exception as exc:
+                subscriber.failed += 1
+                print(f"⚠️ Event bus '{subscriber.name}' handler failed: {exc}")
+            finally:
+                subscriber.queue.task_done()
+
+    async def drain(self, timeout: Optional[float] = None):
+        """Wait until every event published so far has been handled."""
+        waits = [
+            subscriber.queue.join()
+            for subscriber in self.subscribers.values()
+            if subscriber.task is not None
+        ]
+        if waits:
+            await asyncio.wait_for(asyncio.gather(*waits), timeout=timeout)
+
+    def stats(self) -> dict:
+        return {
+            name: {
+                "pending": subscriber.queue.qsize() if subscriber.queue is not None else 0,
+                "handled": subscriber.handled,
+                "dropped": subscriber.dropped,
+                "failed": subscriber.failed,
+            }
+            for name, subscriber in self.subscribers.items()
+        }
@@ -0,0 +1,83 @@
+import itertools
+import os
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Iterable, List, Optional
+
+
+class EventRecord:
+    __slots__ = ("seq", "session_id", "payload")
+
+    def __init__(self, seq: int, session_id: Optional[str], payload: dict):
+        self.seq = seq
+        self.session_id = session_id
+        self.payload = payload
+
+
+class EventHistory:
+    """Recent call events kept in memory, bounded per session and overall.
+
+    Each session has a ring buffer of its last ``per_session`` events. When
+    the total across sessions goes over ``max_events``, the oldest events of
+    the least recently active session are evicted first, so a long-running
+    process holds a fixed amount of history however many calls it serves.
+    """
+
+    def __init__(self, *, per_session: Optional[int] = None, max_events: Optional[int] = None):
+        self.per_session = per_session or int(os.getenv("EVENT_HISTORY_PER_SESSION", "200"))
+        self.max_events = max_events or int(os.getenv("EVENT_HISTORY_MAX_EVENTS", "5000"))
+        # Least recently active session first
+        self._sessions: "OrderedDict[Optional[str], Deque[EventRecord]]" = OrderedDict()
+        self._seq = itertools.count()
+        self.total = 0
+        self.evicted = 0
+
+    def record(self, session_id: Optional[str], payload: dict):
+        events = self._sessions.get(session_id)
+        if events is None:
+            events = self._sessions[session_id] = deque(maxlen=self.per_session)
+        else:
+            self._sessions.move_to_end(session_id)
+
+        if len(events) == self.per_session:
+            # The ring buffer overwrites its oldest entry
+            self.evicted += 1
+        else:
+            self.total += 1
+        events.append(EventRecord(next(self._seq), session_id, payload))
+
+        while self.total > self.max_events:
+            oldest_id, oldest = next(iter(self._sessions.items()))
+            oldest.popleft()
+            self.total -= 1
+            self.evicted += 1
+            if not oldest:
+                del self._sessions[oldest_id]
+
+    def session_ids(self) -> List[Optional[str]]:
+        return list(self._sessions)
+
+    def recent(
+        self,
+        limit: int,
+        session_id: Optional[str] = None,
+        *,
+        sessions: Optional[Iterable[Optional[str]]] = None,
+    ) -> List[dict]:
+        """The last ``limit`` events, oldest first, for one session, some, or all."""
+        if limit <= 0:
+            return []
+        if session_id is not None:
+            sources = [self._sessions.get(session_id, ())]
+        elif sessions is not None:
+            sources = [self._sessions.get(sid, ()) for sid in sessions]
+        else:
+            sources = list(self._sessions.values())
+
+        candidates: List[EventRecord] = []
+        for events in sources:
+            candidates.extend(itertools.islice(events, max(len(events) - limit, 0), None))
+        candidates.sort(key=lambda event: event.seq)
+        return [event.payload for event in candidates[-limit:]]
+
+    def stats(self) -> Dict[str, int]:
+        return {"sessions": len(self._sessions), "events": self.total, "evicted": self.evicted}
@@ -0,0 +1,210 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import aiohttp
+
+from single_flight import SingleFlight
+
+OPENFDA_BASE_URL = "https://api.fda.gov"
+SUMMARY_FIELD_LIMIT = 200
+
+
+def _first(values, default):
+    if values:
+        return values[0]
+    return default
+
+
+def _truncate(text: str, limit: int = SUMMARY_FIELD_LIMIT) -> str:
+    if len(text) > limit:
+        return text[:limit] + "..."
+    return text
+
+
+def summarise_label(result: dict) -> Dict[str, Any]:
+    """Reduce an OpenFDA drug label to the fields the agent reads out."""
+    openfda = result.get("openfda", {})
+    return {
+        "brand_name": _first(openfda.get("brand_name"), "Unknown"),
+        "generic_name": _first(openfda.get("generic_name"), "Unknown"),
+        "manufacturer": _first(openfda.get("manufacturer_name"), "Unknown"),
+        "indications": _first(result.get("indications_and_usage"), "Not available"),
+        "warnings": _truncate(_first(result.get("warnings"), "None listed")),
+        "dosage": _truncate(_first(result.get("dosage_and_administration"), "Not specified")),
+    }
+
+
+class TTLCache:
+    """In-memory LRU cache whose entries also expire after a per-entry TTL."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value, ttl: float, expires_at: Optional[float] = None):
+        self._entries[key] = (value, expires_at or time.time() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DiskCache:
+    """SQLite-backed cache so a restart doesn't re-warm from the network."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS fda_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM fda_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[1] <= time.time():
+            return None
+        return json.loads(row[0]), row[1]
+
+    def set(self, key: str, value, expires_at: float):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO fda_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), expires_at),
+            )
+            self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+
+class OpenFDAClient:
+    """Async OpenFDA drug-label client with pooling, caching and coalescing.
+
+    Lookups share one keep-alive connection pool. Results (including "not
+    found") are kept in a TTL+LRU cache, concurrent lookups for the same
+    drug share a single request, and an optional SQLite file persists the
+    cache across restarts.
+    """
+
+    def __init__(
+        self,
+        *,
+        base_url: Optional[str] = None,
+        ttl: Optional[float] = None,
+        negative_ttl: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        cache_path: Optional[str] = None,
+        pool_size: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ):
+        self.base_url = (base_url or os.getenv("OPENFDA_BASE_URL", OPENFDA_BASE_URL)).rstrip("/")
+        self.ttl = ttl if ttl is not None else float(os.getenv("OPENFDA_CACHE_TTL", "86400"))
+        self.negative_ttl = (
+            negative_ttl if negative_ttl is not None else float(os.getenv("OPENFDA_NEGATIVE_TTL", "3600"))
+        )
+        self.pool_size = pool_size or int(os.getenv("OPENFDA_POOL_SIZE", "10"))
+        self.timeout = timeout if timeout is not None else float(os.getenv("OPENFDA_TIMEOUT", "5"))
+        self.cache = TTLCache(max_entries or int(os.getenv("OPENFDA_CACHE_SIZE", "1024")))
+
+        cache_path = cache_path if cache_path is not None else os.getenv("OPENFDA_CACHE_PATH")
+        self.disk_cache = DiskCache(cache_path) if cache_path else None
+
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._flights = SingleFlight()
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "coalesced": 0, "requests": 0}
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self._session
+
+    async def lookup(self, drug_name: str) -> Dict[str, Any]:
+        """Return summarised label data, or an ``error`` dict."""
+        key = drug_name.strip().lower()
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.stats["hits"] += 1
+            return cached
+
+        if key in self._flights:
+            self.stats["coalesced"] += 1
+        return await self._flights.run(key, lambda: self._load(key, drug_name))
+
+    async def _load(self, key: str, drug_name: str) -> Dict[str, Any]:
+        if self.disk_cache is not None:
+            stored = await asyncio.to_thread(self.disk_cache.get, key)
+            if stored is not None:
+                value, expires_at = stored
+                self.stats["disk_hits"] += 1
+                self.cache.set(key, value, 0, expires_at=expires_at)
+                return value
+
+        self.stats["misses"] += 1
+        result, ttl = await self._fetch(drug_name)
+        if ttl:
+            expires_at = time.time() + ttl
+            self.cache.set(key, result, ttl, expires_at=expires_at)
+            if self.disk_cache is not None:
+                await asyncio.to_thread(self.disk_cache.set, key, result, expires_at)
+        return result
+
+    async def _fetch(self, drug_name: str):
+        """Query OpenFDA; returns ``(result, ttl)`` where ttl 0 means don't cache."""
+        self.stats["requests"] += 1
+        params = {"search": f'openfda.brand_name:"{drug_name}"', "limit": "1"}
+        try:
+            async with self._get_session().get(f"{self.base_url}/drug/label.json", params=params) as response:
+                # OpenFDA answers 404 when a search has no matches
+                if response.status == 404:
+                    return {"error": f"No FDA data found for '{drug_name}'"}, self.negative_ttl
+                if response.status != 200:
+                    return {"error": f"FDA API error: HTTP {response.status}"}, 0
+                data = await response.json(content_type=None)
+        except Exception as e:
+            return {"error": f"FDA API error: {str(e) or type(e).__name__}"}, 0
+
+        if data.get("results"):
+            return summarise_label(data["results"][0]), self.ttl
+        return {"error": f"No FDA data found for '{drug_name}'"}, self.negative_ttl
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        if self.disk_cache is not None:
+            self.disk_cache.close()
+            self.disk_cache = None
+
+
+# Shared client used by the pharmacy tools
+fda_client = OpenFDAClient()
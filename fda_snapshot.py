@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Offline OpenFDA drug-label snapshot.
+
+``build`` ingests OpenFDA drug-label bulk export files (``.json`` or the
+``.json.zip`` downloads) into a compact snapshot file; ``FDASnapshot``
+memory-maps that file and answers name lookups with a binary search, so
+drug info never waits on the network.
+
+Snapshot layout (little endian):
+
+    header   magic, version, entry count, index/keys/records offsets
+    index    one fixed-width entry per name, sorted by name bytes:
+             key offset (u32), key length (u16), record offset (u32),
+             record length (u32)
+    keys     concatenated lower-cased brand and generic names (UTF-8)
+    records  compact JSON of each summarised label (UTF-8)
+
+Usage:
+    python fda_snapshot.py build fda_labels.snap drug-label-0001-of-0012.json.zip ...
+    python fda_snapshot.py lookup fda_labels.snap advil
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import zipfile
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+from fda_client import summarise_label
+
+MAGIC = b"FDASNAP1"
+VERSION = 1
+HEADER = struct.Struct("<8sIIQQQ")
+INDEX_ENTRY = struct.Struct("<IHII")
+
+
+def normalise_name(name: str) -> str:
+    return " ".join(name.lower().split())
+
+
+def iter_labels(path: str) -> Iterator[dict]:
+    """Yield label results from one bulk export file."""
+    if path.endswith(".zip"):
+        with zipfile.ZipFile(path) as archive:
+            for member in archive.namelist():
+                if member.endswith(".json"):
+                    with archive.open(member) as f:
+                        yield from json.load(f).get("results", [])
+        return
+
+    with open(path, "rb") as f:
+        yield from json.load(f).get("results", [])
+
+
+def build_snapshot(output_path: str, input_paths: Iterable[str]) -> int:
+    """Write a snapshot for ``input_paths``; returns the number of names indexed."""
+    # name -> (effective_time, record index); the newest label wins per name
+    names: Dict[str, tuple] = {}
+    records = []
+
+    for path in input_paths:
+        for label in iter_labels(path):
+            openfda = label.get("openfda", {})
+            label_names = {
+                normalise_name(name)
+                for name in openfda.get("brand_name", []) + openfda.get("generic_name", [])
+                if name and name.strip()
+            }
+            if not label_names:
+                continue
+
+            effective_time = label.get("effective_time", "")
+            record_id = None
+            for name in label_names:
+                current = names.get(name)
+                if current is not None and current[0] >= effective_time:
+                    continue
+                if record_id is None:
+                    record_id = len(records)
+                    records.append(
+                        json.dumps(summarise_label(label), separators=(",", ":")).encode("utf-8")
+                    )
+                names[name] = (effective_time, record_id)
+
+    sorted_names = sorted((name.encode("utf-8"), entry[1]) for name, entry in names.items())
+
+    # Only keep records that still own at least one name after de-duplication
+    record_offsets = {}
+    kept_records = []
+    offset = 0
+    for record_id in sorted({record_id for _, record_id in sorted_names}):
+        record_offsets[record_id] = offset
+        kept_records.append(records[record_id])
+        offset += len(records[record_id])
+
+    index = bytearray()
+    keys = bytearray()
+    for key, record_id in sorted_names:
+        index += INDEX_ENTRY.pack(
+            len(keys),
+            len(key),
+            record_offsets[record_id],
+            len(records[record_id]),
+        )
+        keys += key
+
+    index_offset = HEADER.size
+    keys_offset = index_offset + len(index)
+    records_offset = keys_offset + len(keys)
+
+    tmp_path = output_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(sorted_names), index_offset, keys_offset, records_offset))
+        f.write(index)
+        f.write(keys)
+        for record in kept_records:
+            f.write(record)
+    os.replace(tmp_path, output_path)
+    return len(sorted_names)
+
+
+class FDASnapshot:
+    """Read-only, memory-mapped view of a snapshot file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # An empty file can't be mapped
+            self._file.close()
+            raise
+        size = len(self._map)
+        if size < HEADER.size:
+            self.close()
+            raise ValueError(f"{path} is truncated ({size} bytes, shorter than the header)")
+        magic, version, count, index_offset, keys_offset, records_offset = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} is not an FDA snapshot (version {VERSION})")
+        if not index_offset + count * INDEX_ENTRY.size <= keys_offset <= records_offset <= size:
+            self.close()
+            raise ValueError(f"{path} is truncated or corrupt ({size} bytes)")
+        self._count = count
+        self._index_offset = index_offset
+        self._keys_offset = keys_offset
+        self._records_offset = records_offset
+
+    def __len__(self):
+        return self._count
+
+    def _entry(self, position: int):
+        return INDEX_ENTRY.unpack_from(self._map, self._index_offset + position * INDEX_ENTRY.size)
+
+    def _key(self, entry) -> bytes:
+        start = self._keys_offset + entry[0]
+        return self._map[start:start + entry[1]]
+
+    def lookup(self, drug_name: str) -> Optional[Dict[str, Any]]:
+        """Return the summarised label for a brand or generic name, if present."""
+        target = normalise_name(drug_name).encode("utf-8")
+        low, high = 0, self._count
+        while low < high:
+            mid = (low + high) // 2
+            entry = self._entry(mid)
+            key = self._key(entry)
+            if key < target:
+                low = mid + 1
+            elif key > target:
+                high = mid
+            else:
+                start = self._records_offset + entry[2]
+                return json.loads(self._map[start:start + entry[3]])
+        return None
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+def load_default_snapshot() -> Optional[FDASnapshot]:
+    """Open the snapshot named by ``FDA_SNAPSHOT_PATH``, if configured."""
+    path = os.getenv("FDA_SNAPSHOT_PATH")
+    if not path:
+        return None
+    try:
+        snapshot = FDASnapshot(path)
+    except (OSError, ValueError) as exc:
+        print(f"Failed to open FDA snapshot '{path}': {exc}. Using live OpenFDA lookups.")
+        return None
+    print(f"Loaded FDA snapshot '{path}' with {len(snapshot)} drug names.")
+    return snapshot
+
+
+# Shared snapshot used by the pharmacy tools (None when not configured)
+fda_snapshot = load_default_snapshot()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query an offline OpenFDA label snapshot")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="ingest bulk export files into a snapshot")
+    build.add_argument("output")
+    build.add_argument("inputs", nargs="+")
+
+    lookup = commands.add_parser("lookup", help="look up a drug name in a snapshot")
+    lookup.add_argument("snapshot")
+    lookup.add_argument("name")
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        count = build_snapshot(args.output, args.inputs)
+        print(f"✅ Wrote {count} drug names to {args.output}")
+    else:
+        snapshot = FDASnapshot(args.snapshot)
+        try:
+            print(json.dumps(snapshot.lookup(args.name), indent=2))
+        finally:
+            snapshot.close()
+
+
+if __name__ == "__main__":
+    main()
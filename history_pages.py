@@ -0,0 +1,252 @@
+import os
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import DESCENDING
+
+import session_messages
+
+DEFAULT_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "50"))
+MAX_PAGE_SIZE = int(os.getenv("HISTORY_MAX_PAGE_SIZE", "500"))
+
+# Session fields sent to clients; the history itself is streamed separately
+SUMMARY_PROJECTION = {
+    "_id": 0,
+    "sessionId": 1,
+    "callSid": 1,
+    "phoneNumber": 1,
+    "username": 1,
+    "status": 1,
+    "createdAt": 1,
+    "updatedAt": 1,
+    "endedAt": 1,
+    "messageCount": 1,
+    "messagesLayout": 1,
+}
+
+# Whole session documents for clients: the passcode hash never leaves the server
+DOCUMENT_PROJECTION = {"passcodeHash": 0}
+
+# Streaming order for sessions that still embed their history
+EMBEDDED_FIELDS = ("messages", "functionCalls")
+
+
+class CursorError(ValueError):
+    """Raised for a cursor or paging argument a client sent that we can't use."""
+
+
+def page_size(value: Any) -> int:
+    if value is None:
+        return DEFAULT_PAGE_SIZE
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        raise CursorError(f"page_size must be an integer, got {value!r}")
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def entry_fields(value: Any) -> Optional[List[str]]:
+    """Validate a client's ``fields`` list (``None`` means every field)."""
+    if value is None:
+        return None
+    if not isinstance(value, list) or not all(isinstance(field, str) for field in value):
+        raise CursorError("fields must be a list of field names")
+    return value
+
+
+def project_entry(entry: dict, fields: Optional[Iterable[str]]) -> dict:
+    if fields is None:
+        return entry
+    keep = set(fields) | {"kind", "seq"}
+    return {key: value for key, value in entry.items() if key in keep}
+
+
+def parse_history_cursor(cursor: Optional[str], layout: str) -> Tuple[str, int]:
+    """History cursors are ``seq:<n>`` (collection) or ``<field>:<offset>`` (embedded).
+
+    Embedded sessions also accept ``seq:<n>``, for catching up after a
+    known entry.
+    """
+    if cursor is None:
+        return ("seq", -1) if layout == session_messages.COLLECTION else (EMBEDDED_FIELDS[0], 0)
+    try:
+        name, _, position = cursor.partition(":")
+        position = int(position)
+    except (AttributeError, ValueError):
+        raise CursorError(f"Invalid history cursor {cursor!r}")
+    valid = ("seq",) if layout == session_messages.COLLECTION else ("seq",) + EMBEDDED_FIELDS
+    if name not in valid or position < (-1 if name == "seq" else 0):
+        raise CursorError(f"Invalid history cursor {cursor!r}")
+    return name, position
+
+
+async def history_pages(
+    db,
+    session: dict,
+    *,
+    size: int,
+    cursor: Optional[str] = None,
+    fields: Optional[List[str]] = None,
+) -> AsyncIterator[Tuple[List[dict], Optional[str]]]:
+    """Yield ``(entries, next_cursor)`` pages of one session's history.
+
+    Only one page is held in memory at a time. ``next_cursor`` resumes
+    after the page it came with and is ``None`` on the last page.
+    """
+    layout = session.get("messagesLayout", session_messages.EMBEDDED)
+    name, position = parse_history_cursor(cursor, layout)
+    session_id = session["sessionId"]
+
+    if layout == session_messages.COLLECTION:
+        projection = None
+        if fields is not None:
+            projection = {"_id": 0, "seq": 1, "kind": 1, **{field: 1 for field in fields}}
+        after_seq = position if position >= 0 else None
+        while True:
+            entries, after_seq = await session_messages.read_page(
+                db[session_messages.SESSION_MESSAGES],
+                session_id,
+                after_seq=after_seq,
+                limit=size,
+                projection=projection,
+            )
+            for entry in entries:
+                entry.pop("sessionId", None)
+            next_cursor = f"seq:{after_seq}" if after_seq is not None else None
+            yield entries, next_cursor
+            if next_cursor is None:
+                return
+
+    sessions = db["call_sessions"]
+    if name == "seq":
+        async for page in _embedded_pages_after(sessions, session_id, position, size=size, fields=fields):
+            yield page
+        return
+
+    field_index = EMBEDDED_FIELDS.index(name)
+    offset = position
+    while field_index < len(EMBEDDED_FIELDS):
+        field = EMBEDDED_FIELDS[field_index]
+        # Fetch one extra element to know whether this array has more
+        document = await sessions.find_one(
+            {"sessionId": session_id},
+            projection={"_id": 0, "sessionId": 1, field: {"$slice": [offset, size + 1]}},
+        )
+        items = (document or {}).get(field) or []
+        kind = session_messages.KINDS[field]
+        entries = [project_entry({**item, "kind": kind}, fields) for item in items[:size]]
+
+        if len(items) > size:
+            offset += size
+            next_cursor = f"{field}:{offset}"
+        else:
+            field_index += 1
+            offset = 0
+            next_cursor = f"{EMBEDDED_FIELDS[field_index]}:0" if field_index < len(EMBEDDED_FIELDS) else None
+
+        if entries or next_cursor is None:
+            yield entries, next_cursor
+
+
+async def _embedded_pages_after(
+    sessions,
+    session_id: str,
+    after_seq: int,
+    *,
+    size: int,
+    fields: Optional[List[str]],
+) -> AsyncIterator[Tuple[List[dict], Optional[str]]]:
+    """Embedded entries numbered after ``after_seq``, merged across arrays in ``seq`` order."""
+    while True:
+        # Each array is appended in seq order, so its first size + 1 matches
+        # are enough to fill a page and tell whether there is another
+        found = await sessions.aggregate(
+            [
+                {"$match": {"sessionId": session_id}},
+                {
+                    "$project": {
+                        "_id": 0,
+                        **{
+                            field: {
+                                "$slice": [
+                                    {
+                                        "$filter": {
+                                            "input": {"$ifNull": [f"${field}", []]},
+                                            "cond": {"$gt": ["$$this.seq", after_seq]},
+                                        }
+                                    },
+                                    size + 1,
+                                ]
+                            }
+                            for field in EMBEDDED_FIELDS
+                        },
+                    }
+                },
+            ]
+        ).to_list(length=1)
+        document = found[0] if found else {}
+        entries = sorted(
+            (
+                {**item, "kind": session_messages.KINDS[field]}
+                for field in EMBEDDED_FIELDS
+                for item in document.get(field) or []
+            ),
+            key=lambda entry: entry["seq"],
+        )
+        page = entries[:size]
+        next_cursor = None
+        if len(entries) > size:
+            after_seq = page[-1]["seq"]
+            next_cursor = f"seq:{after_seq}"
+        yield [project_entry(entry, fields) for entry in page], next_cursor
+        if next_cursor is None:
+            return
+
+
+def parse_recent_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, str]]:
+    """Recent-conversation cursors are ``<createdAt ISO>|<sessionId>``."""
+    if cursor is None:
+        return None
+    try:
+        created, _, session_id = cursor.partition("|")
+        return datetime.fromisoformat(created), session_id
+    except (AttributeError, ValueError):
+        raise CursorError(f"Invalid conversations cursor {cursor!r}")
+
+
+def recent_cursor(session: dict) -> str:
+    return f"{session['createdAt'].isoformat()}|{session['sessionId']}"
+
+
+def _parse_recent_cursor(cursor: Optional[str]) -> Optional[Dict[str, Any]]:
+    position = parse_recent_cursor(cursor)
+    if position is None:
+        return None
+    created_at, session_id = position
+    return {
+        "$or": [
+            {"createdAt": {"$lt": created_at}},
+            {"createdAt": created_at, "sessionId": {"$lt": session_id}},
+        ]
+    }
+
+
+async def recent_sessions(
+    sessions,
+    *,
+    limit: int,
+    cursor: Optional[str] = None,
+) -> Tuple[List[dict], Optional[str]]:
+    """Newest sessions first, metadata only, plus the cursor for the next page."""
+    query = _parse_recent_cursor(cursor) or {}
+    found = await (
+        sessions.find(query, projection=SUMMARY_PROJECTION)
+        .sort([("createdAt", DESCENDING), ("sessionId", DESCENDING)])
+        .limit(limit + 1)
+        .to_list(length=limit + 1)
+    )
+    page = found[:limit]
+    next_cursor = None
+    if len(found) > limit and page:
+        next_cursor = recent_cursor(page[-1])
+    return page, next_cursor
@@ -0,0 +1,106 @@
+from typing import Any, Callable, Dict, List, Optional, Set
+
+import history_pages
+
+
+class TailFollower:
+    """One client following new entries of one session after a ``sync_history``.
+
+    Entries arriving while the client is still being caught up from
+    storage wait in ``backlog``; ``last_seq`` drops any the catch-up
+    already covered.
+    """
+
+    __slots__ = ("client", "session_id", "send", "fields", "last_seq", "backlog", "live")
+
+    def __init__(self, client, session_id: str, send: Callable[[dict], Any], fields: Optional[List[str]] = None):
+        self.client = client
+        self.session_id = session_id
+        self.send = send
+        self.fields = fields
+        self.last_seq: Optional[int] = None
+        self.backlog: List[dict] = []
+        self.live = False
+
+
+class HistoryTail:
+    """Streams a session's newly persisted entries to the clients following it."""
+
+    def __init__(self):
+        self._followers: Dict[str, Dict[object, TailFollower]] = {}
+        self.sent = 0
+
+    def following(self, session_id: str) -> bool:
+        return session_id in self._followers
+
+    def follow(
+        self,
+        client,
+        session_id: str,
+        send: Callable[[dict], Any],
+        fields: Optional[List[str]] = None,
+    ) -> TailFollower:
+        """Start buffering ``session_id``'s entries for ``client``; a repeated sync replaces the old follower."""
+        follower = TailFollower(client, session_id, send, fields)
+        self._followers.setdefault(session_id, {})[client] = follower
+        return follower
+
+    def go_live(self, follower: TailFollower, last_seq: Optional[int]):
+        """The catch-up ended at ``last_seq``: send what arrived meanwhile, then every entry as it comes."""
+        follower.last_seq = last_seq
+        follower.live = True
+        backlog, follower.backlog = follower.backlog, []
+        self._deliver(follower, backlog)
+
+    def publish(self, session_id: str, entry: dict):
+        for follower in list(self._followers.get(session_id, {}).values()):
+            if follower.live:
+                self._deliver(follower, [entry])
+            else:
+                follower.backlog.append(entry)
+
+    def _deliver(self, follower: TailFollower, entries: List[dict]):
+        fresh = []
+        for entry in entries:
+            seq = entry.get("seq")
+            if seq is not None and follower.last_seq is not None and seq <= follower.last_seq:
+                continue
+            if seq is not None:
+                follower.last_seq = seq
+            fresh.append(history_pages.project_entry(entry, follower.fields))
+        if fresh:
+            self.sent += len(fresh)
+            follower.send({"event": "history_tail", "session_id": follower.session_id, "entries": fresh})
+
+    def unfollow(self, client, session_id: Optional[str] = None) -> List[str]:
+        """Stop following one session, or all of them; returns the sessions dropped."""
+        dropped = []
+        for sid in [session_id] if session_id is not None else list(self._followers):
+            followers = self._followers.get(sid)
+            if followers is not None and followers.pop(client, None) is not None:
+                dropped.append(sid)
+                if not followers:
+                    del self._followers[sid]
+        return dropped
+
+    def drop(self, follower: TailFollower):
+        """Forget ``follower`` if it is still registered, e.g. after a catch-up failed."""
+        followers = self._followers.get(follower.session_id)
+        if followers is not None and followers.get(follower.client) is follower:
+            del followers[follower.client]
+            if not followers:
+                del self._followers[follower.session_id]
+
+    def end(self, session_id: str):
+        """The call is over: tell its followers nothing more will come."""
+        for follower in self._followers.pop(session_id, {}).values():
+            follower.send({"event": "history_tail_end", "session_id": session_id, "reason": "completed"})
+
+    def remove(self, client):
+        self.unfollow(client)
+
+    def stats(self) -> dict:
+        clients: Set[object] = set()
+        for followers in self._followers.values():
+            clients.update(followers)
+        return {"sessions": len(self._followers), "clients": len(clients), "sent": self.sent}
@@ -0,0 +1,75 @@
+import functools
+import json
+import os
+from typing import Any, Callable, Optional
+
+# Called with objects the backend can't encode natively; returns an encodable
+# replacement or raises TypeError
+Default = Optional[Callable[[Any], Any]]
+
+
+class JSONBackend:
+    """A JSON implementation; ``dumps`` always returns ``str`` for text frames."""
+
+    __slots__ = ("name", "loads", "dumps")
+
+    def __init__(self, name: str, loads: Callable[[Any], Any], dumps: Callable[[Any], str]):
+        self.name = name
+        self.loads = loads
+        self.dumps = dumps
+
+
+def _orjson_backend(default: Default = None) -> JSONBackend:
+    import orjson
+
+    def dumps(obj) -> str:
+        # Non-string keys are stringified like the stdlib does instead of raising
+        return orjson.dumps(obj, default=default, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+
+    return JSONBackend("orjson", orjson.loads, dumps)
+
+
+def _ujson_backend(default: Default = None) -> JSONBackend:
+    import ujson
+
+    def dumps(obj) -> str:
+        return ujson.dumps(obj, ensure_ascii=False, default=default)
+
+    return JSONBackend("ujson", ujson.loads, dumps)
+
+
+def _stdlib_backend(default: Default = None) -> JSONBackend:
+    return JSONBackend("json", json.loads, functools.partial(json.dumps, default=default))
+
+
+_FACTORIES = {
+    "orjson": _orjson_backend,
+    "ujson": _ujson_backend,
+    "json": _stdlib_backend,
+}
+
+
+def get_backend(preferred: Optional[str] = None, *, default: Default = None) -> JSONBackend:
+    """Return ``preferred`` if importable, else the fastest available backend.
+
+    ``default`` encodes types the backend doesn't know (like ``json.dumps``'s
+    hook), during the same pass over the object.
+    """
+    names = ["orjson", "ujson", "json"]
+    if preferred:
+        if preferred not in _FACTORIES:
+            raise ValueError(f"Unknown JSON backend '{preferred}'")
+        names.insert(0, preferred)
+
+    for name in names:
+        try:
+            return _FACTORIES[name](default)
+        except ImportError:
+            continue
+    return _stdlib_backend(default)
+
+
+# Process-wide default, overridable with JSON_BACKEND=json|ujson|orjson
+backend = get_backend(os.getenv("JSON_BACKEND"))
+loads = backend.loads
+dumps = backend.dumps
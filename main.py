@@ -1,58 +1,90 @@
 
 import asyncio
-import base64
 import json
 import ssl
+import time
 import websockets
 import os
 from datetime import datetime
-from medical_functions import FUNCTION_MAP
-from mobile_bridge import mobile_bridge, start_mobile_server
 from dotenv import load_dotenv
 
+# Before the project imports: mobile_bridge picks its history storage when imported
 load_dotenv()
 
+from medical_functions import FUNCTION_MAP
+from mobile_bridge import mobile_bridge, start_mobile_server
+from tool_executor import ToolExecutor
+from audio_framing import AudioFramer
+from audio_pipeline import AudioPipeline
+from twilio_codec import twilio_codec
+from audio_batcher import OutboundAudioBatcher
+from deepgram_pool import AgentConnectionPool
+from config_store import ConfigStore
+
+tool_executor = ToolExecutor(FUNCTION_MAP)
+
+# Strong references to fire-and-forget tasks so they aren't garbage collected
+background_tasks = set()
+
+
+async def _log_failures(coro):
+    try:
+        await coro
+    except Exception as e:
+        print(f'⚠️ Background task failed: {e}')
+
+
+def spawn_background(coro):
+    task = asyncio.create_task(_log_failures(coro))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
 def sts_connect():
     api_key = os.getenv("DEEPGRAM_API_KEY")
     if not api_key:
         raise Exception("Api key not available")
 
-    ssl_context = ssl.create_default_context()
-    ssl_context.check_hostname = False
-    ssl_context.verify_mode = ssl.CERT_NONE
+    url = os.getenv("DEEPGRAM_AGENT_URL", "wss://agent.deepgram.com/v1/agent/converse")
+    options = {}
+    # websockets refuses an ssl argument for a ws:// URL, e.g. a local fake agent
+    if url.startswith("wss://"):
+        ssl_context = ssl.create_default_context()
+        ssl_context.check_hostname = False
+        ssl_context.verify_mode = ssl.CERT_NONE
+        options["ssl"] = ssl_context
 
     sts_ws = websockets.connect(
-        "wss://agent.deepgram.com/v1/agent/converse",
+        url,
         subprotocols=["token",api_key],
-        ssl=ssl_context
+        **options
     )
 
     return sts_ws
 
 
-def load_config():
-    with open('config.json','r') as f:
-        return json.load(f)
+# config.json is parsed and validated once, then hot-reloaded when it changes
+config_store = ConfigStore('config.json', FUNCTION_MAP)
 
 
-async def handle_barge_in(decoded,twilio_ws,streamsid):
+# Pre-connected, pre-configured Deepgram sockets so calls skip the handshake
+agent_pool = AgentConnectionPool(sts_connect, config_store.get_payload)
+# Idle sockets were configured with the old Settings; live calls keep theirs
+config_store.on_reload(agent_pool.invalidate)
+
+
+async def handle_barge_in(decoded,twilio_ws,streamsid,audio_batcher=None):
     if decoded['type'] == 'UserStatedSpeaking':
-        clear_message = {
-            'event':'clear',
-            'streamSid':streamsid
-        }
-        await twilio_ws.send(json.dumps(clear_message))
-
-
-def execute_function_call(func_name,arguments):
-    if func_name in FUNCTION_MAP:
-        result = FUNCTION_MAP[func_name](**arguments)
-        print(f'function called if {result}')
-        return result
-    else:
-        result = {'error': f'Function {func_name} not found'}
-        print(result)
-        return result
+        if audio_batcher is not None:
+            audio_batcher.clear() # don't play agent audio still waiting to be batched
+        await twilio_ws.send(twilio_codec.encoder(streamsid).clear_message)
+
+
+async def execute_function_call(func_name,arguments):
+    # Runs on the tool executor so blocking tools never stall the event loop
+    result = await tool_executor.execute(func_name,arguments)
+    print(f'function called if {result}')
+    return result
 
 def create_function_call_response(func_id,fund_name,result):
     return {
@@ -64,45 +96,51 @@ def create_function_call_response(func_id,fund_name,result):
 
 
 async def handle_function_call_request(decoded,sts_ws,session_id):
-    try:
-
-        for function_call in decoded['functions']:
-            func_name = function_call['name']
-            func_id = function_call['id']
-            arguments = json.loads(function_call['arguments'])
+    # Every requested function runs concurrently; each response streams back
+    # to Deepgram as soon as its own function finishes.
+    outcomes = await asyncio.gather(
+        *(run_function_call(function_call,sts_ws,session_id) for function_call in decoded['functions']),
+        return_exceptions=True
+    )
+    for outcome in outcomes:
+        if isinstance(outcome, Exception):
+            print(f'error {outcome}')
 
-            print(f'function called : {func_name} {func_id} {arguments}')
 
-            result = execute_function_call(func_name,arguments) 
-            function_result = create_function_call_response(func_id,func_name,result)
+async def run_function_call(function_call,sts_ws,session_id):
+    func_name = function_call.get('name','unknown')
+    func_id = function_call.get('id','unknown')
+    arguments = {}
 
-            await sts_ws.send(json.dumps(function_result))
-            print(f'sending the function result :{function_result}')
-            
-            # Send to mobile app
-            await mobile_bridge.handle_function_call(
-                func_name,
-                arguments,
-                result,
-                session_id=session_id
-            )
+    try:
+        arguments = json.loads(function_call['arguments'])
+        print(f'function called : {func_name} {func_id} {arguments}')
+        result = await execute_function_call(func_name,arguments)
     except Exception as e:
         print(f'error {e}')
-        error_result = create_function_call_response(
-            func_id if 'func_id' in locals() else 'unknown',
-            func_name if 'func_name' in locals() else 'unknown',
-            {'error':f'func called failed:{str(e)}'}
-        )
-        await sts_ws.send(json.dumps(error_result))
-   
+        result = {'error':f'func called failed:{str(e)}'}
+
+    function_result = create_function_call_response(func_id,func_name,result)
+    await sts_ws.send(json.dumps(function_result))
+    print(f'sending the function result :{function_result}')
+
+    # Mobile fan-out and Mongo writes happen on the bridge's event bus
+    await mobile_bridge.handle_function_call(
+        func_name,
+        arguments,
+        result,
+        session_id=session_id
+    )
+
 
-async def handle_text_message(decoded,twilio_ws,sts_ws,streamsid):
-    await handle_barge_in(decoded,twilio_ws,streamsid)
+async def handle_text_message(decoded,twilio_ws,sts_ws,streamsid,audio_batcher=None):
+    await handle_barge_in(decoded,twilio_ws,streamsid,audio_batcher)
 
     # checking if deepgram require function call or not
 
     if decoded['type'] == 'FunctionCallRequest':
-        await handle_function_call_request(decoded,sts_ws,streamsid)
+        # Don't hold up agent audio while tools run
+        spawn_background(handle_function_call_request(decoded,sts_ws,streamsid))
 
 
 
@@ -116,6 +154,10 @@ async def sts_sender(sts_ws,audio_queue):
 async def sts_receiver(sts_ws,twilio_ws,streamsid_queue):#receive everything from deepgram
     print('sts receiver started') #reveiving from deep gram and sending to twilio
     streamsid = await streamsid_queue.get()
+    call_started = time.monotonic()
+    first_audio_sent = False
+    # Coalesce small agent-audio chunks into fewer Twilio media messages
+    audio_batcher = OutboundAudioBatcher(twilio_ws.send, twilio_codec.encoder(streamsid).media)
 
     # Message buffer for storing conversation during call
     conversation_buffer = []
@@ -173,18 +215,23 @@ async def sts_receiver(sts_ws,twilio_ws,streamsid_queue):#receive everything fro
                         'timestamp': datetime.now().isoformat()
                     })
             
-            await handle_text_message(decoded,twilio_ws,sts_ws,streamsid)
+            await handle_text_message(decoded,twilio_ws,sts_ws,streamsid,audio_batcher)
             continue
 
         raw_mulaw = message
 
-        media_message = {#this is to send twilio
-            "event":"media",
-            "streamSid":streamsid,
-            "media":{"payload":base64.b64encode(raw_mulaw).decode('ascii')}
-        }
+        await audio_batcher.add(raw_mulaw) #this is to send twilio
 
-        await twilio_ws.send(json.dumps(media_message))
+        if not first_audio_sent:
+            first_audio_sent = True
+            agent_pool.record_first_audio((time.monotonic() - call_started) * 1000)
+
+    try:
+        await audio_batcher.flush()
+    except Exception as e:
+        print(f"⚠️ Could not flush final agent audio: {e}")
+    print(f"📊 Outbound audio batching stats: {audio_batcher.stats()}")
+    twilio_codec.release(streamsid)
 
     # Store buffered conversation to MongoDB when call ends
     if conversation_buffer:
@@ -195,12 +242,12 @@ async def sts_receiver(sts_ws,twilio_ws,streamsid_queue):#receive everything fro
 
 async def twilio_receiver(twilio_ws,audio_queue,streamsid_queue):
     BUFFER_SIZE = 20*160 #how much audio we want to store befour sending this to twilio 
-    inbuffer = bytearray(b"")
+    frame_audio = AudioFramer(BUFFER_SIZE).feed
     current_streamsid = None
 
     async for message in twilio_ws:
         try:
-            data = json.loads(message)#loading it to data
+            data = twilio_codec.decode(message)#loading it to data
             event = data['event']
 
             if event == 'start':
@@ -217,21 +264,18 @@ async def twilio_receiver(twilio_ws,audio_queue,streamsid_queue):
 
             elif event == 'media':
                 media = data['media']
-                chunk = base64.b64decode(media['payload'])
                 if media['track'] == 'inbound':
+                    chunk = twilio_codec.decode_payload(media)
                     # print(f"📢 Received audio chunk: {len(chunk)} bytes")
-                    inbuffer.extend(chunk)
-
-                    while len(inbuffer) >= BUFFER_SIZE:#limiting the audio before we sending it to deepgram
-                        chunk = inbuffer[:BUFFER_SIZE]
-                        # print(f"🎤 Sending audio to Deepgram: {len(chunk)} bytes")
-                        audio_queue.put_nowait(chunk)
-                        inbuffer = inbuffer[BUFFER_SIZE:]
+                    for frame in frame_audio(chunk):#limiting the audio before we sending it to deepgram
+                        # print(f"🎤 Sending audio to Deepgram: {len(frame)} bytes")
+                        audio_queue.put_nowait(frame)
 
             elif event == 'stop':
                 session_to_close = data.get('streamSid') or current_streamsid
                 if session_to_close:
                     await mobile_bridge.end_session(session_to_close)
+                    twilio_codec.release(session_to_close)
                 break
         except Exception as e:
             print(f"⚠️ Error processing Twilio message: {e}")
@@ -242,34 +286,49 @@ async def twilio_receiver(twilio_ws,audio_queue,streamsid_queue):
 
 
 async def twilio_handler(twilio_ws):
-    audio_queue = asyncio.Queue()
+    audio_queue = AudioPipeline() # bounded, drops stale inbound audio if Deepgram falls behind
     streamsid_queue = asyncio.Queue()
 
-    try:
-        async with sts_connect() as sts_ws:
-            config_message = load_config()
-            await sts_ws.send(json.dumps(config_message)) #sending the config message to the deep gram
-
-            tasks = [
-                asyncio.create_task(sts_sender(sts_ws,audio_queue)),
-                asyncio.create_task(sts_receiver(sts_ws,twilio_ws,streamsid_queue)),
-                asyncio.create_task(twilio_receiver(twilio_ws,audio_queue,streamsid_queue)),
-            ]
+    sts_ws = None
 
-            done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
-            
-            # Cancel any pending tasks
-            for task in pending:
-                task.cancel()
-            
-            # Check for exceptions in completed tasks
-            for task in done:
-                if task.exception():
-                    raise task.exception()
+    try:
+        # Pooled sockets already have the config message sent to deepgram
+        sts_ws = await agent_pool.checkout()
+
+        tasks = [
+            asyncio.create_task(sts_sender(sts_ws,audio_queue)),
+            asyncio.create_task(sts_receiver(sts_ws,twilio_ws,streamsid_queue)),
+            asyncio.create_task(twilio_receiver(twilio_ws,audio_queue,streamsid_queue)),
+        ]
+
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        
+        # Cancel any pending tasks
+        for task in pending:
+            task.cancel()
+        
+        # Check for exceptions in completed tasks
+        for task in done:
+            if task.exception():
+                raise task.exception()
     except Exception as e:
         print(f"⚠️ Connection handler failed: {e}")
         print(f"🔄 This is normal when calls end - reconnection will happen automatically")
     finally:
+        print(f"📊 Inbound audio queue stats: {audio_queue.stats()}")
+        print(f"📊 Deepgram pool stats: {agent_pool.stats()}")
+        print(f"📊 Event bus stats: {mobile_bridge.events.stats()}")
+        print(f"📊 Session write-behind stats: {mobile_bridge.writer.stats()}")
+        print(f"📊 History storage stats: {mobile_bridge.storage.stats()}")
+        # Per mobile client: queue depth and lag, then commands in flight
+        print(f"📊 Mobile broadcast stats: {mobile_bridge.broadcast.stats()}")
+        print(f"📊 Mobile subscription stats: {mobile_bridge.subscriptions.stats()}")
+        print(f"📊 Mobile command stats: {mobile_bridge.command_stats()}")
+        if sts_ws is not None:
+            try:
+                await sts_ws.close()
+            except Exception:
+                pass
         try:
             await twilio_ws.close()
         except:
@@ -280,6 +339,12 @@ async def main():
     twilio_port = int(os.getenv('TWILIO_WS_PORT', '5000'))
     mobile_port = int(os.getenv('MOBILE_WS_PORT', '8080'))
 
+    config_store.load()
+    config_store.start_watching()
+    await agent_pool.start()
+    # Storage is up (or reconnecting in the background) before calls arrive
+    await mobile_bridge.ensure_db()
+
     print(f'Twilio server binding to port {twilio_port}')
     twilio_server = await websockets.serve(twilio_handler,'localhost',twilio_port)
 
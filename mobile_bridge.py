@@ -1,5 +1,4 @@
 import asyncio
-import json
 import os
 import secrets
 import hashlib
@@ -7,74 +6,62 @@ import websockets
 from typing import Optional, Tuple
 from datetime import datetime, timezone
 
-from bson import ObjectId
+from event_bus import EventBus
+from event_history import EventHistory
+from history_tail import HistoryTail
+import mobile_codec
+from mobile_broadcast import BroadcastHub, is_droppable
+from mobile_commands import CommandReply, InflightCommands
+from mobile_subscriptions import SubscriptionIndex, topic_from_command
+from response_cache import ResponseCache
+import history_pages
+import session_messages
+from session_writer import SessionWriteBehind
+from storage import SessionStorage, open_storage
 
-from motor.motor_asyncio import AsyncIOMotorClient
+# Handled as they arrive, ahead of any commands still running
+INLINE_COMMANDS = {"ping", "subscribe", "unsubscribe", "stop_sync"}
+
+# Commands that change stored data; commands sent after them wait for them
+CREDENTIAL_COMMANDS = {"set_credentials", "update_credentials"}
+
+# Bus events that are queued even when a consumer is backed up
+LIFECYCLE_EVENTS = {"session_started", "session_completed"}
 
 class MobileBridge:
-    def __init__(self):
+    def __init__(self, storage: Optional[SessionStorage] = None):
         self.mobile_clients = set()
-        self.transcriptions = []
-        self.agent_responses = []
-        self.function_calls = []
-        self.mongo_client: Optional[AsyncIOMotorClient] = None
-        self.db = None
-        self.sessions_collection = None
-        self._db_initialized = False
+        self.broadcast = BroadcastHub()
+        # Which clients get events from which calls
+        self.subscriptions = SubscriptionIndex()
+        # Recent conversation events, bounded per session and overall
+        self.history = EventHistory()
+        self.replay_limit = int(os.getenv("MOBILE_REPLAY_EVENTS", "50"))
+        # MongoDB, or a local SQLite file when MONGODB_URI is unset
+        self.storage = storage or open_storage()
         self.session_metadata = {}
+        # Each connected client's in-flight commands, for stats
+        self.inflight = {}
+        # Side effects of call events (mobile fan-out, history writes) run on
+        # their own consumers so the call audio path never waits on them
+        self.events = EventBus()
+        self.events.subscribe("mobile", self._deliver_to_mobile)
+        self.events.subscribe("persistence", self._persist_event)
+        self.writer = SessionWriteBehind(self.storage)
+        # Clients live-tailing a session after sync_history
+        self.tail = HistoryTail()
+        self.writer.on_write(self._tail_entry)
+        # Encoded recent-conversations responses, dropped when a session's
+        # upsert or completion is stored. Written messages only drop the
+        # "recent" payloads that carry full message lists, not the summaries
+        self.recent_cache = ResponseCache()
+        self.storage.on_available(self.recent_cache.invalidate)
+        self.writer.on_session_write(self.recent_cache.invalidate)
+        self.writer.on_flush(lambda: self.recent_cache.invalidate("recent"))
 
     async def ensure_db(self):
-        """Initialise MongoDB connection if configuration is present."""
-        if self._db_initialized:
-            return
-
-        mongo_uri = os.getenv("MONGODB_URI")
-        if not mongo_uri:
-            print("MONGODB_URI not set. Conversation persistence disabled.")
-            self._db_initialized = True  # Avoid retrying every call
-            return
-
-        db_name = os.getenv("MONGODB_DB_NAME", "agent")
-
-        try:
-            client = AsyncIOMotorClient(mongo_uri, serverSelectionTimeoutMS=5000)
-            # Quick connectivity check
-            await client.admin.command("ping")
-
-            self.mongo_client = client
-            self.db = client[db_name]
-            self.sessions_collection = self.db["call_sessions"]
-
-            # Helpful indexes for lookups
-            await self.sessions_collection.create_index("sessionId", unique=True)
-            await self.sessions_collection.create_index(
-                [("phoneNumber", 1), ("updatedAt", -1)]
-            )
-
-            self._db_initialized = True
-            print(f"MongoDB connected. Using database '{db_name}'.")
-        except Exception as exc:
-            print(f"Failed to initialise MongoDB: {exc}. Persistence disabled.")
-            self._db_initialized = True
-            self.mongo_client = None
-            self.db = None
-            self.sessions_collection = None
-
-    def _serialise_for_client(self, data):
-        if isinstance(data, datetime):
-            return data.isoformat()
-        if isinstance(data, ObjectId):
-            return str(data)
-        if isinstance(data, list):
-            return [self._serialise_for_client(item) for item in data]
-        if isinstance(data, dict):
-            serialised = {}
-            for key, value in data.items():
-                if key == "passcodeHash":
-                    continue
-                serialised[key] = self._serialise_for_client(value)
-            return serialised
-        return data
+        """Open the history storage once; later calls return immediately."""
+        await self.storage.start()
 
     def _hash_passcode(self, passcode: str) -> str:
         return hashlib.sha256(passcode.encode("utf-8")).hexdigest()
@@ -84,8 +71,6 @@ class MobileBridge:
 
     async def start_session(self, session_id: str, metadata: dict):
         """Register a new Twilio call session for persistence."""
-        await self.ensure_db()
-
         phone_number = metadata.get("from", "unknown")
         call_sid = metadata.get("callSid")
         username = metadata.get("username") or metadata.get("caller") or phone_number
@@ -93,38 +78,6 @@ class MobileBridge:
         passcode_hash = self._hash_passcode(passcode)
         now = datetime.now(timezone.utc)
 
-        session_doc = {
-            "sessionId": session_id,
-            "callSid": call_sid,
-            "phoneNumber": phone_number,
-            "username": username,
-            "passcodeHash": passcode_hash,
-            "status": "in_progress",
-            "createdAt": now,
-            "updatedAt": now,
-            "messages": [],
-            "functionCalls": [],
-        }
-
-        if self.sessions_collection is not None:
-            try:
-                await self.sessions_collection.update_one(
-                    {"sessionId": session_id},
-                    {
-                        "$setOnInsert": session_doc,
-                        "$set": {
-                            "phoneNumber": phone_number,
-                            "username": username,
-                            "passcodeHash": passcode_hash,
-                            "status": "in_progress",
-                            "updatedAt": now,
-                        },
-                    },
-                    upsert=True,
-                )
-            except Exception as exc:
-                print(f"Failed to upsert session '{session_id}': {exc}")
-
         self.session_metadata[session_id] = {
             "phone_number": phone_number,
             "username": username,
@@ -132,40 +85,37 @@ class MobileBridge:
         }
 
         # Inform connected clients so they can surface credentials to staff
-        await self.send_to_mobile(
-            {
+        self._publish(
+            "session_started",
+            session_id,
+            record={
+                "callSid": call_sid,
+                "phoneNumber": phone_number,
+                "username": username,
+                "passcodeHash": passcode_hash,
+                "timestamp": now,
+            },
+            client={
                 "event": "session_started",
                 "session_id": session_id,
                 "phone_number": phone_number,
                 "username": username,
                 "passcode": passcode,
                 "timestamp": now.isoformat(),
-            }
+            },
         )
 
     async def end_session(self, session_id: str):
         """Mark a session as completed when a call ends."""
-        await self.ensure_db()
         now = datetime.now(timezone.utc)
-
-        if self.sessions_collection is not None:
-            try:
-                await self.sessions_collection.update_one(
-                    {"sessionId": session_id},
-                    {"$set": {"status": "completed", "endedAt": now, "updatedAt": now}},
-                )
-            except Exception as exc:
-                print(f"Failed to mark session '{session_id}' complete: {exc}")
-
-        if session_id in self.session_metadata:
-            await self.send_to_mobile(
-                {
-                    "event": "session_completed",
-                    "session_id": session_id,
-                    "timestamp": now.isoformat(),
-                }
-            )
-            self.session_metadata.pop(session_id, None)
+        client = None
+        if self.session_metadata.pop(session_id, None) is not None:
+            client = {
+                "event": "session_completed",
+                "session_id": session_id,
+                "timestamp": now.isoformat(),
+            }
+        self._publish("session_completed", session_id, record={"timestamp": now}, client=client)
 
     async def update_session_credentials(
         self,
@@ -175,13 +125,13 @@ class MobileBridge:
         passcode: Optional[str] = None,
     ) -> Tuple[bool, str]:
         """Allow mobile clients to set a custom username/passcode."""
-        await self.ensure_db()
-
         if not session_id:
             return False, "session_id is required"
 
-        if self.sessions_collection is None:
+        if not self.storage.configured:
             return False, "Persistence not configured"
+        if not self.storage.available:
+            return False, "Database temporarily unavailable, try again shortly"
 
         update = {"updatedAt": datetime.now(timezone.utc)}
         if username:
@@ -190,15 +140,13 @@ class MobileBridge:
             update["passcodeHash"] = self._hash_passcode(passcode)
 
         try:
-            result = await self.sessions_collection.update_one(
-                {"sessionId": session_id},
-                {"$set": update},
-            )
+            matched = await self.storage.update_session(session_id, update)
         except Exception as exc:
             return False, f"Failed to update credentials: {exc}"
 
-        if result.matched_count == 0:
+        if not matched:
             return False, "Session not found"
+        self.recent_cache.invalidate()
 
         local_meta = self.session_metadata.setdefault(session_id, {})
         if username:
@@ -216,72 +164,78 @@ class MobileBridge:
         session_id: Optional[str] = None,
     ):
         """Retrieve stored conversation history after verifying passcode."""
-        await self.ensure_db()
-
-        if self.sessions_collection is None:
+        if not self.storage.available:
             return None
 
-        query = {"phoneNumber": phone_number, "passcodeHash": self._hash_passcode(passcode)}
-        if session_id:
-            query["sessionId"] = session_id
-
         try:
-            document = await self.sessions_collection.find_one(
-                query,
-                sort=[("updatedAt", -1)],
+            return await self.storage.find_session(
+                phone_number, self._hash_passcode(passcode), session_id, with_history=True
             )
-            return document
         except Exception as exc:
             print(f"Failed to fetch history: {exc}")
             return None
 
-    async def _append_message(self, session_id: Optional[str], message: dict):
-        await self.ensure_db()
-        if not session_id or self.sessions_collection is None:
-            return
-
-        payload = {**message, "timestamp": datetime.now(timezone.utc)}
+    async def find_session(
+        self,
+        *,
+        phone_number: str,
+        passcode: str,
+        session_id: Optional[str] = None,
+    ) -> Optional[dict]:
+        """Like ``fetch_history`` but returns session metadata only."""
+        if not self.storage.available:
+            return None
+        return await self.storage.find_session(phone_number, self._hash_passcode(passcode), session_id)
 
-        try:
-            await self.sessions_collection.update_one(
-                {"sessionId": session_id},
-                {"$push": {"messages": payload}, "$set": {"updatedAt": datetime.now(timezone.utc)}},
-                upsert=True,
+    async def stream_history(
+        self,
+        reply: CommandReply,
+        session: dict,
+        *,
+        size: int,
+        cursor: Optional[str] = None,
+        fields: Optional[list] = None,
+    ) -> int:
+        """Send a session's history to one client as ``history_chunk`` events."""
+        session_id = session["sessionId"]
+        sent = 0
+        async for entries, next_cursor in self.storage.history_pages(
+            session, size=size, cursor=cursor, fields=fields
+        ):
+            sent += len(entries)
+            # Each send waits for the socket, so a slow client paces the reads
+            await reply.send(
+                {
+                    "event": "history_chunk",
+                    "session_id": session_id,
+                    "entries": entries,
+                    "next_cursor": next_cursor,
+                }
             )
-        except Exception as exc:
-            print(f"Failed to append message for session '{session_id}': {exc}")
+        return sent
 
-    async def _append_function_call(self, session_id: Optional[str], entry: dict):
-        await self.ensure_db()
-        if not session_id or self.sessions_collection is None:
+    async def _append_message(self, session_id: Optional[str], message: dict):
+        if not session_id:
             return
+        await self.writer.add(session_id, "messages", {"timestamp": datetime.now(timezone.utc), **message})
 
-        payload = {**entry, "timestamp": datetime.now(timezone.utc)}
-
-        try:
-            await self.sessions_collection.update_one(
-                {"sessionId": session_id},
-                {
-                    "$push": {"functionCalls": payload},
-                    "$set": {"updatedAt": datetime.now(timezone.utc)},
-                },
-                upsert=True,
-            )
-        except Exception as exc:
-            print(f"Failed to append function call for session '{session_id}': {exc}")
+    async def _append_function_call(self, session_id: Optional[str], entry: dict):
+        if not session_id:
+            return
+        await self.writer.add(session_id, "functionCalls", {"timestamp": datetime.now(timezone.utc), **entry})
 
     async def store_conversation_buffer(self, session_id: str, conversation_buffer: list):
-        """Store buffered conversation messages to MongoDB"""
-        await self.ensure_db()
-        if not session_id or self.sessions_collection is None:
-            print(f"⚠️ Cannot store conversation: session_id={session_id}, collection={self.sessions_collection}")
+        """Store buffered conversation messages to history storage"""
+        # A configured but unreachable database still gets the batch once it reconnects
+        if not session_id or not self.storage.configured:
+            print(f"⚠️ Cannot store conversation: session_id={session_id}, storage={self.storage.name}")
             return
 
         if not conversation_buffer:
             return
 
         try:
-            # Convert buffer messages to proper format for MongoDB
+            # Convert buffer messages to the stored history format
             formatted_messages = []
             for msg in conversation_buffer:
                 # Prefer the original timestamp from the buffer when available
@@ -309,15 +263,13 @@ class MobileBridge:
                 }
                 formatted_messages.append(formatted_msg)
 
-            # Bulk update: add all buffered messages at once
-            await self.sessions_collection.update_one(
-                {"sessionId": session_id},
-                {
-                    "$push": {"messages": {"$each": formatted_messages}},
-                    "$set": {"updatedAt": datetime.now(timezone.utc)}
-                },
-                upsert=True,
-            )
+            # Written as one batch in whichever layout is configured
+            for formatted_msg in formatted_messages:
+                await self.writer.add(session_id, "messages", formatted_msg)
+            await self.writer.flush(session_id)
+            # Sent once the call is over, after session_completed already
+            # forgot the session; numbering this batch brought its seq back
+            self.writer.forget(session_id)
             print(f"✅ Stored {len(formatted_messages)} conversation messages for session {session_id}")
 
         except Exception as exc:
@@ -325,85 +277,201 @@ class MobileBridge:
 
     async def get_recent_conversations(self, limit: int = 5):
         """Get the most recent conversation(s) from the database"""
-        await self.ensure_db()
-        if self.sessions_collection is None:
-            print(f"⚠️ Cannot get conversations: collection is None")
-            return None
-
         try:
-            # Get recent conversations sorted by creation time
-            cursor = self.sessions_collection.find().sort("createdAt", -1).limit(limit)
-            conversations = await cursor.to_list(length=limit)
-
-            if conversations:
-                formatted_conversations = []
-                for conv in conversations:
-                    serialised = self._serialise_for_client(conv)
-                    formatted_conversations.append(serialised)
-
-                print(f"✅ Retrieved {len(formatted_conversations)} conversation(s)")
-                return formatted_conversations
-            else:
-                print("📋 No conversations found in database")
-                return None
-
+            return await self._query_recent_conversations(limit)
         except Exception as exc:
             print(f"❌ Failed to get recent conversations: {exc}")
             return None
 
-    async def register_mobile_client(self, websocket):
+    async def _query_recent_conversations(self, limit: int):
+        if not self.storage.available:
+            print(f"⚠️ Cannot get conversations: {self.storage.name} storage is unavailable")
+            return None
+
+        # Get recent conversations sorted by creation time
+        conversations = await self.storage.recent_conversations(limit)
+
+        if conversations:
+            # Encoded as they are: the codec converts datetimes and ObjectIds
+            # while writing, and storage never returns the passcode hash
+            print(f"✅ Retrieved {len(conversations)} conversation(s)")
+            return conversations
+        else:
+            print("📋 No conversations found in database")
+            return None
+
+    async def _encode_recent_conversations(self, limit: int, codec: mobile_codec.WireCodec) -> mobile_codec.Frame:
+        recent_conversations = await self._query_recent_conversations(limit)
+        if recent_conversations:
+            print(f"📋 Found {len(recent_conversations)} recent conversations")
+            return codec.encode(
+                {
+                    "event": "recent_conversations",
+                    "conversations": recent_conversations,
+                }
+            )
+        print(f"📋 No recent conversations found")
+        return codec.encode(
+            {
+                "event": "recent_conversations_error",
+                "message": "No recent conversations found"
+            }
+        )
+
+    async def register_mobile_client(self, websocket, codec: Optional[mobile_codec.WireCodec] = None):
         """Register a new mobile client"""
         self.mobile_clients.add(websocket)
+        self.broadcast.add(websocket, codec)
+        self.subscriptions.add(websocket)
         print(f"Mobile client connected. Total clients: {len(self.mobile_clients)}")
         print(f"Client address: {websocket.remote_address}")
+        if codec is not None and codec.binary:
+            print(f"Client negotiated {codec.name} encoding")
         
-        # Send connection confirmation directly to this client
+        # Send connection confirmation to this client, ahead of any broadcasts
         connection_msg = {
             "event": "connection_established",
             "timestamp": datetime.now().isoformat(),
             "message": "Connected to Dr. Claude AI"
         }
-        await websocket.send(json.dumps(connection_msg))
+        self.broadcast.send_to(websocket, connection_msg)
         print(f"Sent connection confirmation to mobile client")
 
-        if self.session_metadata:
-            await websocket.send(
-                json.dumps(
-                    {
-                        "event": "active_sessions",
-                        "sessions": [
-                            {
-                                "session_id": session_id,
-                                "phone_number": meta.get("phone_number"),
-                                "username": meta.get("username"),
-                                "passcode": meta.get("passcode"),
-                            }
-                            for session_id, meta in self.session_metadata.items()
-                        ],
-                        "timestamp": datetime.now().isoformat(),
-                    }
-                )
+        # Catch the client up on the calls it follows without going to storage
+        self._send_catch_up(websocket, self.subscriptions.topics(websocket))
+
+    def _send_catch_up(self, websocket, topics):
+        """Queue ``active_sessions`` and ``event_replay`` covering ``topics`` for one client."""
+        if not topics:
+            return
+        active = [
+            {
+                "session_id": session_id,
+                "phone_number": meta.get("phone_number"),
+                "username": meta.get("username"),
+                "passcode": meta.get("passcode"),
+            }
+            for session_id, meta in self.session_metadata.items()
+            if any(self.subscriptions.matches(topic, session_id, meta.get("phone_number")) for topic in topics)
+        ]
+        if active:
+            self.broadcast.send_to(
+                websocket,
+                {
+                    "event": "active_sessions",
+                    "sessions": active,
+                    "timestamp": datetime.now().isoformat(),
+                },
+            )
+
+        followed = [
+            session_id
+            for session_id in self.history.session_ids()
+            if any(self.subscriptions.matches(topic, session_id) for topic in topics)
+        ]
+        recent_events = self.history.recent(self.replay_limit, sessions=followed)
+        if recent_events:
+            self.broadcast.send_to(
+                websocket,
+                {
+                    "event": "event_replay",
+                    "events": recent_events,
+                    "timestamp": datetime.now().isoformat(),
+                },
             )
 
+    def _handle_subscription(self, reply: CommandReply, data: dict):
+        """``subscribe``/``unsubscribe`` by ``session_id``, ``phone_number`` or ``all``."""
+        websocket = reply.websocket
+        subscribe = data.get("command") == "subscribe"
+        topic = topic_from_command(data)
+        if topic is None and subscribe:
+            self.broadcast.send_to(
+                websocket,
+                reply.tag({"event": "subscription_error", "message": "session_id, phone_number or all is required"}),
+            )
+            return
+
+        if subscribe:
+            if self.subscriptions.subscribe(websocket, topic):
+                self._send_catch_up(websocket, {topic})
+        else:
+            # A bare unsubscribe stops everything
+            self.subscriptions.unsubscribe(websocket, topic)
+        # Queued behind the catch-up so the client knows when it is complete
+        self.broadcast.send_to(
+            websocket,
+            reply.tag(
+                {
+                    "event": "subscribed" if subscribe else "unsubscribed",
+                    "subscriptions": self.subscriptions.subscriptions(websocket),
+                }
+            ),
+        )
+
+    def command_stats(self) -> list:
+        return [
+            {"client": str(getattr(websocket, "remote_address", None)), **inflight.stats()}
+            for websocket, inflight in self.inflight.items()
+        ]
+
     async def unregister_mobile_client(self, websocket):
         """Unregister a mobile client"""
         self.mobile_clients.discard(websocket)
+        self.broadcast.remove(websocket)
+        self.subscriptions.remove(websocket)
+        self.tail.remove(websocket)
         print(f"Mobile client disconnected. Total clients: {len(self.mobile_clients)}")
 
-    async def send_to_mobile(self, message):
-        """Send message to all connected mobile clients"""
-        if self.mobile_clients:
-            # Send to all connected mobile clients
-            disconnected = set()
-            for client in self.mobile_clients:
-                try:
-                    await client.send(json.dumps(message))
-                except websockets.exceptions.ConnectionClosed:
-                    disconnected.add(client)
-            
-            # Remove disconnected clients
-            for client in disconnected:
-                self.mobile_clients.discard(client)
+    async def send_to_mobile(self, message, session_id: Optional[str] = None):
+        """Send message to the mobile clients subscribed to ``session_id``"""
+        # Encoded once and queued per client; writer tasks do the sends, so a
+        # slow client never holds up the caller or the other clients
+        self.broadcast.publish(message, self.subscriptions.recipients(session_id))
+
+    def _publish(self, kind: str, session_id: Optional[str], *, record=None, client=None):
+        """Hand a call event to the bus; returns without doing any I/O."""
+        self.events.publish(
+            {"kind": kind, "session_id": session_id, "record": record, "client": client},
+            # Starting and completing a session drive the upsert, the final
+            # flush and unbinding subscribers, so they are never shed
+            droppable=kind not in LIFECYCLE_EVENTS,
+        )
+
+    async def _deliver_to_mobile(self, event: dict):
+        kind = event["kind"]
+        session_id = event["session_id"]
+        client = event["client"]
+        if kind == "session_started":
+            self.subscriptions.bind(session_id, event["record"]["phoneNumber"])
+        if client is not None:
+            # Recorded as it is broadcast, so a replay never repeats a live event
+            if kind in ("message", "function_call") and not is_droppable(client):
+                self.history.record(session_id, client)
+            await self.send_to_mobile(client, session_id)
+        if kind == "session_completed":
+            # Phone subscribers can still be caught up on the call while
+            # its events are in the replay history
+            self.subscriptions.unbind(session_id)
+            self.subscriptions.retain(self.history.session_ids())
+
+    async def _persist_event(self, event: dict):
+        kind = event["kind"]
+        session_id = event["session_id"]
+        if not session_id or event["record"] is None:
+            return
+        if kind == "message":
+            await self._append_message(session_id, event["record"])
+        elif kind == "function_call":
+            await self._append_function_call(session_id, event["record"])
+        elif kind == "session_started":
+            # Queued and retried with the call's messages until storage takes it
+            await self.writer.start_session(session_id, event["record"])
+        elif kind == "session_completed":
+            # Everything buffered for the call lands before it is marked complete
+            await self.writer.complete_session(session_id, event["record"]["timestamp"])
+            self.writer.forget(session_id)
+            self.tail.end(session_id)
 
     async def handle_transcription(self, text, is_final=False, session_id: Optional[str] = None):
         """Handle transcription from Deepgram"""
@@ -416,18 +484,18 @@ class MobileBridge:
             "timestamp": datetime.now().isoformat()
         }
         
-        self.transcriptions.append(transcription)
-        await self.send_to_mobile(transcription)
-        await self._append_message(
+        self._publish(
+            "message",
             session_id,
-            {
+            record={
                 "role": "user",
                 "type": "transcription",
                 "text": text,
                 "isFinal": is_final,
+                "timestamp": datetime.now(timezone.utc),
             },
+            client=transcription,
         )
-        print(f"Sent transcription to {len(self.mobile_clients)} mobile clients")
 
     async def handle_agent_response(self, response_text, session_id: Optional[str] = None):
         """Handle response from the agent"""
@@ -437,15 +505,16 @@ class MobileBridge:
             "timestamp": datetime.now().isoformat()
         }
         
-        self.agent_responses.append(response)
-        await self.send_to_mobile(response)
-        await self._append_message(
+        self._publish(
+            "message",
             session_id,
-            {
+            record={
                 "role": "assistant",
                 "type": "agent_response",
                 "text": response_text,
+                "timestamp": datetime.now(timezone.utc),
             },
+            client=response,
         )
 
     async def handle_function_call(
@@ -464,15 +533,16 @@ class MobileBridge:
             "timestamp": datetime.now().isoformat()
         }
         
-        self.function_calls.append(function_call)
-        await self.send_to_mobile(function_call)
-        await self._append_function_call(
+        self._publish(
+            "function_call",
             session_id,
-            {
+            record={
                 "name": function_name,
                 "parameters": parameters,
                 "result": result,
+                "timestamp": datetime.now(timezone.utc),
             },
+            client=function_call,
         )
 
     async def handle_audio_chunk(self, audio_data, duration):
@@ -511,12 +581,14 @@ class MobileBridge:
             response = self.generate_medical_response(message)
 
             print(f"Generated response: '{response}'")
-            await self._append_message(
+            self._publish(
+                "message",
                 session_id,
-                {
+                record={
                     "role": "user",
                     "type": "text_message",
                     "text": message,
+                    "timestamp": datetime.now(timezone.utc),
                 },
             )
             await self.handle_agent_response(response, session_id=session_id)
@@ -597,130 +669,315 @@ class MobileBridge:
                 session_id=session_id
             )
 
+    async def _send_history_stream(self, reply: CommandReply, data: dict):
+        """Paginated ``get_history``: history_start, history_chunk..., history_end."""
+        try:
+            size = history_pages.page_size(data.get("page_size"))
+            fields = history_pages.entry_fields(data.get("fields"))
+            session = await self.find_session(
+                phone_number=data["phone_number"],
+                passcode=data["passcode"],
+                session_id=data.get("session_id"),
+            )
+            if not session:
+                await reply.send(
+                    {"event": "history_error", "message": "No matching conversation found"}
+                )
+                return
+
+            await reply.send(
+                {"event": "history_start", "history": session}
+            )
+            sent = await self.stream_history(
+                reply, session, size=size, cursor=data.get("cursor"), fields=fields
+            )
+            await reply.send(
+                {"event": "history_end", "session_id": session["sessionId"], "count": sent}
+            )
+        except history_pages.CursorError as exc:
+            await reply.send({"event": "history_error", "message": str(exc)})
+
+    async def _sync_history(self, reply: CommandReply, data: dict):
+        """``sync_history``: entries after the client's ``since_seq``, then with ``live`` new ones as they're stored.
+
+        Sends history_start, history_chunk..., history_sync_end, then
+        history_tail events until the call ends (history_tail_end). With
+        ``since_session_id`` the delta only applies if that is the session
+        found; otherwise the whole history is sent and history_start says
+        ``since_seq: None``.
+        """
+        follower = None
+        try:
+            since_seq = data.get("since_seq")
+            if since_seq is not None and (isinstance(since_seq, bool) or not isinstance(since_seq, int)):
+                raise history_pages.CursorError(f"since_seq must be an integer, got {since_seq!r}")
+            size = history_pages.page_size(data.get("page_size"))
+            fields = history_pages.entry_fields(data.get("fields"))
+            session = await self.find_session(
+                phone_number=data["phone_number"],
+                passcode=data["passcode"],
+                session_id=data.get("session_id"),
+            )
+            if not session:
+                await reply.send({"event": "history_error", "message": "No matching conversation found"})
+                return
+
+            session_id = session["sessionId"]
+            since_session_id = data.get("since_session_id")
+            if since_session_id is not None and since_session_id != session_id:
+                # The client's copy is of another call, e.g. before this caller called again
+                since_seq = None
+            cursor = None if since_seq is None else f"seq:{since_seq}"
+            live = bool(data.get("live")) and session.get("status") != "completed"
+            if live:
+                # Following before reading, so nothing stored meanwhile is missed
+                follower = self.tail.follow(
+                    reply.websocket,
+                    session_id,
+                    lambda message: self.broadcast.send_to(reply.websocket, reply.tag(message)),
+                    fields,
+                )
+            # Entries still buffered by the writer must be readable first
+            await self.writer.flush(session_id)
+
+            await reply.send(
+                {"event": "history_start", "history": session, "since_seq": since_seq}
+            )
+            sent, last_seq = 0, since_seq
+            async for entries, _ in self.storage.history_pages(session, size=size, cursor=cursor, fields=fields):
+                sent += len(entries)
+                for entry in entries:
+                    if entry.get("seq") is not None and (last_seq is None or entry["seq"] > last_seq):
+                        last_seq = entry["seq"]
+                await reply.send(
+                    {
+                        "event": "history_chunk",
+                        "session_id": session_id,
+                        "entries": entries,
+                        "last_seq": last_seq,
+                    }
+                )
+            await reply.send(
+                {
+                    "event": "history_sync_end",
+                    "session_id": session_id,
+                    "count": sent,
+                    "last_seq": last_seq,
+                    "live": live,
+                }
+            )
+            if follower is not None:
+                self.tail.go_live(follower, last_seq)
+        except history_pages.CursorError as exc:
+            await reply.send({"event": "history_error", "message": str(exc)})
+        finally:
+            if follower is not None and not follower.live:
+                self.tail.drop(follower)
+
+    def _tail_entry(self, session_id: str, field: str, entry: dict):
+        if self.tail.following(session_id):
+            self.tail.publish(session_id, {**entry, "kind": session_messages.KINDS[field]})
+
+    async def _encode_recent_page(self, limit: int, cursor: Optional[str], codec: mobile_codec.WireCodec):
+        conversations, next_cursor = await self.storage.recent_sessions(limit=limit, cursor=cursor)
+        payload = codec.encode(
+            {
+                "event": "recent_conversations_page",
+                "conversations": conversations,
+                "next_cursor": next_cursor,
+            }
+        )
+        return payload, conversations
+
+    async def _send_recent_conversations_stream(self, reply: CommandReply, data: dict):
+        """Paginated ``get_recent_conversations``: session summaries, then optional history chunks."""
+        if not self.storage.available:
+            await reply.send(
+                {"event": "recent_conversations_error", "message": "Persistence not configured"}
+            )
+            return
+
+        try:
+            limit = history_pages.page_size(data.get("limit", 5))
+            size = history_pages.page_size(data.get("page_size"))
+            fields = history_pages.entry_fields(data.get("fields"))
+            cursor = data.get("cursor")
+            payload, conversations = await self.recent_cache.get_or_build(
+                ("page", limit, cursor, reply.codec.name),
+                lambda: self._encode_recent_page(limit, cursor, reply.codec),
+            )
+            await reply.send(payload)
+            if data.get("include_messages"):
+                for session in conversations:
+                    await self.stream_history(reply, session, size=size, fields=fields)
+            await reply.send(
+                {"event": "recent_conversations_end", "count": len(conversations)}
+            )
+        except history_pages.CursorError as exc:
+            await reply.send({"event": "recent_conversations_error", "message": str(exc)})
+
+    async def _handle_command(self, reply: CommandReply, data: dict):
+        """Run one command from a mobile client, sending its responses through ``reply``."""
+        command = data.get("command")
+
+        if command in {"get_history", "fetch_history"}:
+            phone_number = data.get("phone_number")
+            passcode = data.get("passcode")
+            session_id = data.get("session_id")
+
+            if not phone_number or not passcode:
+                await reply.send(
+                    {
+                        "event": "history_error",
+                        "message": "phone_number and passcode are required",
+                    }
+                )
+                return
+
+            if data.get("stream"):
+                await self._send_history_stream(reply, data)
+                return
+
+            history_doc = await self.fetch_history(
+                phone_number=phone_number,
+                passcode=passcode,
+                session_id=session_id,
+            )
+
+            if not history_doc:
+                await reply.send(
+                    {
+                        "event": "history_error",
+                        "message": "No matching conversation found",
+                    }
+                )
+                return
+
+            history_doc.pop("_id", None)
+
+            await reply.send(
+                {
+                    "event": "history",
+                    "history": history_doc,
+                }
+            )
+
+        elif command in {"set_credentials", "update_credentials"}:
+            session_id = data.get("session_id")
+            username = data.get("username")
+            passcode = data.get("passcode")
+
+            success, message_text = await self.update_session_credentials(
+                session_id,
+                username=username,
+                passcode=passcode,
+            )
+
+            await reply.send(
+                {
+                    "event": "credentials_updated" if success else "credentials_error",
+                    "session_id": session_id,
+                    "message": message_text,
+                }
+            )
+
+        elif command == "get_recent_conversations" and data.get("stream"):
+            await self._send_recent_conversations_stream(reply, data)
+
+        elif command == "get_recent_conversations":
+            print(f"🔍 Getting recent conversations...")
+            try:
+                # Shared by every dashboard until a session changes
+                payload = await self.recent_cache.get_or_build(
+                    ("recent", 5, reply.codec.name), lambda: self._encode_recent_conversations(5, reply.codec)
+                )
+            except Exception as exc:
+                print(f"❌ Failed to get recent conversations: {exc}")
+                payload = {
+                    "event": "recent_conversations_error",
+                    "message": "No recent conversations found"
+                }
+            await reply.send(payload)
+
+        elif command == "sync_history":
+            if not data.get("phone_number") or not data.get("passcode"):
+                await reply.send({"event": "history_error", "message": "phone_number and passcode are required"})
+                return
+            await self._sync_history(reply, data)
+
+        elif command == "stop_sync":
+            for session_id in self.tail.unfollow(reply.websocket, data.get("session_id")):
+                # Queued behind any tail events already on their way
+                self.broadcast.send_to(
+                    reply.websocket,
+                    reply.tag({"event": "history_tail_end", "session_id": session_id, "reason": "stopped"}),
+                )
+
+        elif command in {"subscribe", "unsubscribe"}:
+            self._handle_subscription(reply, data)
+
+        elif command == "ping":
+            await reply.send({"event": "pong"})
+            print(f"Ping received from mobile client")
+        elif data.get("event") == "user_message":
+            message = data.get("message", "")
+            session_id = data.get("session_id")
+            print(f"Received user message: '{message}'")
+            await self.handle_user_message(message, session_id=session_id)
+        else:
+            print(f"Received message from mobile: {data}")
+
+    async def _run_command(self, reply: CommandReply, data: dict):
+        try:
+            await self._handle_command(reply, data)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        except Exception as e:
+            print(f"Error handling message: {e}")
+            await reply.send({"event": "error", "command": data.get("command"), "message": str(e)})
+
     async def mobile_websocket_handler(self, websocket):
         """Handle WebSocket connections from mobile app"""
-        await self.register_mobile_client(websocket)
+        # The encoding the client negotiated through the websocket subprotocol, JSON otherwise
+        codec = mobile_codec.for_subprotocol(getattr(websocket, "subprotocol", None))
+        await self.register_mobile_client(websocket, codec)
+        # Storage-backed commands run concurrently, so a slow history query
+        # doesn't hold up this client's pings and messages
+        inflight = self.inflight[websocket] = InflightCommands()
         try:
             # Send initial connection message
-            await websocket.send(json.dumps({
+            self.broadcast.send_to(websocket, {
                 "event": "connection_established",
                 "timestamp": datetime.now().isoformat(),
                 "message": "Connected to Pharmacy Agent"
-            }))
+            })
             
             # Keep connection alive and handle messages
             async for message in websocket:
                 try:
-                    data = json.loads(message)
+                    data = mobile_codec.decode_frame(codec, message)
                     # Handle commands from mobile app if needed
-                    command = data.get("command")
-
-                    if command in {"get_history", "fetch_history"}:
-                        phone_number = data.get("phone_number")
-                        passcode = data.get("passcode")
-                        session_id = data.get("session_id")
-
-                        if not phone_number or not passcode:
-                            await websocket.send(
-                                json.dumps(
-                                    {
-                                        "event": "history_error",
-                                        "message": "phone_number and passcode are required",
-                                    }
-                                )
-                            )
-                            continue
-
-                        history_doc = await self.fetch_history(
-                            phone_number=phone_number,
-                            passcode=passcode,
-                            session_id=session_id,
-                        )
-
-                        if not history_doc:
-                            await websocket.send(
-                                json.dumps(
-                                    {
-                                        "event": "history_error",
-                                        "message": "No matching conversation found",
-                                    }
-                                )
-                            )
-                            continue
-
-                        history_payload = self._serialise_for_client(history_doc)
-                        history_payload.pop("_id", None)
-
-                        await websocket.send(
-                            json.dumps(
-                                {
-                                    "event": "history",
-                                    "history": history_payload,
-                                }
-                            )
-                        )
-
-                    elif command in {"set_credentials", "update_credentials"}:
-                        session_id = data.get("session_id")
-                        username = data.get("username")
-                        passcode = data.get("passcode")
-
-                        success, message_text = await self.update_session_credentials(
-                            session_id,
-                            username=username,
-                            passcode=passcode,
-                        )
-
-                        await websocket.send(
-                            json.dumps(
-                                {
-                                    "event": "credentials_updated" if success else "credentials_error",
-                                    "session_id": session_id,
-                                    "message": message_text,
-                                }
-                            )
+                    reply = CommandReply(websocket, data.get("request_id"), codec)
+
+                    if data.get("command") in INLINE_COMMANDS or data.get("event") == "user_message":
+                        # Cheap, and their order matters
+                        await self._run_command(reply, data)
+                    elif inflight.start(
+                        self._run_command(reply, data), barrier=data.get("command") in CREDENTIAL_COMMANDS
+                    ) is None:
+                        await reply.send(
+                            {
+                                "event": "error",
+                                "command": data.get("command"),
+                                "message": f"Too many requests in flight (limit {inflight.limit})",
+                            }
                         )
-
-                    elif command == "get_recent_conversations":
-                        print(f"🔍 Getting recent conversations from database...")
-                        recent_conversations = await self.get_recent_conversations(limit=5)
-
-                        if recent_conversations:
-                            print(f"📋 Found {len(recent_conversations)} recent conversations")
-                            await websocket.send(
-                                json.dumps(
-                                    {
-                                        "event": "recent_conversations",
-                                        "conversations": recent_conversations,
-                                    }
-                                )
-                            )
-                        else:
-                            print(f"📋 No recent conversations found")
-                            await websocket.send(
-                                json.dumps(
-                                    {
-                                        "event": "recent_conversations_error",
-                                        "message": "No recent conversations found"
-                                    }
-                                )
-                            )
-
-                    elif command == "ping":
-                        await websocket.send(json.dumps({"event": "pong"}))
-                        print(f"Ping received from mobile client")
-                    elif data.get("event") == "user_message":
-                        message = data.get("message", "")
-                        session_id = data.get("session_id")
-                        print(f"Received user message: '{message}'")
-                        await self.handle_user_message(message, session_id=session_id)
-                    else:
-                        print(f"Received message from mobile: {data}")
                         
-                except json.JSONDecodeError:
-                    print(f"Invalid JSON from mobile client: {message}")
-                    error = {"event": "error", "message": "Invalid JSON"}
-                    await websocket.send(json.dumps(error))
+                except ValueError:
+                    encoding = "JSON" if isinstance(message, str) else codec.name
+                    print(f"Invalid {encoding} from mobile client: {message!r}")
+                    error = {"event": "error", "message": f"Invalid {encoding}"}
+                    await websocket.send(codec.encode(error))
                 except Exception as e:
                     print(f"Error handling message: {e}")
                     
@@ -729,6 +986,8 @@ class MobileBridge:
         except Exception as e:
             print(f"Error in mobile websocket handler: {e}")
         finally:
+            await inflight.cancel()
+            self.inflight.pop(websocket, None)
             await self.unregister_mobile_client(websocket)
 
 # Global mobile bridge instance
@@ -746,5 +1005,9 @@ async def start_mobile_server(*, host: str = "0.0.0.0", port: int = 8080):
         mobile_websocket_handler_wrapper,
         host,
         port,
-        max_size=None
+        # Inbound frames are commands; history goes out in chunks, so nothing needs more
+        max_size=int(os.getenv("MOBILE_WS_MAX_FRAME_BYTES", str(1024 * 1024))),
+        # MessagePack/CBOR for clients that ask for them, and permessage-deflate
+        select_subprotocol=mobile_codec.select_subprotocol,
+        **mobile_codec.deflate_options(),
     )
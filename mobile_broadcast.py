@@ -0,0 +1,189 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Dict, Iterable, Optional
+
+from websockets.exceptions import ConnectionClosed
+
+import mobile_codec
+
+# websocket close code 1013: "try again later"
+SLOW_CLIENT_CLOSE_CODE = 1013
+# websocket close code 1011: the server hit an unexpected condition
+SEND_FAILED_CLOSE_CODE = 1011
+
+
+def is_droppable(message: dict) -> bool:
+    """Events a lagging client can miss without losing conversation content."""
+    return message.get("event") == "transcription" and not message.get("is_final")
+
+
+class ClientChannel:
+    """Bounded send queue for one mobile client, drained by its own writer task."""
+
+    __slots__ = (
+        "websocket", "codec", "queue", "ready", "task", "sent", "dropped", "degraded", "peak_lag",
+    )
+
+    def __init__(self, websocket, codec: Optional[mobile_codec.WireCodec] = None):
+        self.websocket = websocket
+        self.codec = codec or mobile_codec.default
+        # (enqueued_at, encoded message, droppable)
+        self.queue = deque()
+        self.ready = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.sent = 0
+        self.dropped = 0
+        self.degraded = False
+        self.peak_lag = 0.0
+
+    def lag(self) -> float:
+        """Seconds the oldest queued message has been waiting."""
+        if not self.queue:
+            return 0.0
+        return time.monotonic() - self.queue[0][0]
+
+    def stats(self) -> dict:
+        return {
+            "client": str(getattr(self.websocket, "remote_address", None)),
+            "encoding": self.codec.name,
+            "depth": len(self.queue),
+            "lag_ms": round(self.lag() * 1000, 2),
+            "peak_lag_ms": round(self.peak_lag * 1000, 2),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "degraded": self.degraded,
+        }
+
+
+class BroadcastHub:
+    """Fan events out to mobile clients without one slow client stalling the rest.
+
+    Each event is encoded once per wire encoding in use and appended to
+    every client's bounded queue; per-client writer tasks do the actual
+    sends. A client whose queue fills up is downgraded (interim
+    transcriptions are skipped for it until it catches up), and evicted if
+    it still can't keep up with essential events.
+    """
+
+    def __init__(self, *, max_queue: Optional[int] = None):
+        self.max_queue = max_queue or int(os.getenv("MOBILE_SEND_QUEUE_SIZE", "100"))
+        self.channels: Dict[object, ClientChannel] = {}
+        self.evicted = 0
+        self.send_failures = 0
+        self._closing = set()
+
+    def add(self, websocket, codec: Optional[mobile_codec.WireCodec] = None) -> ClientChannel:
+        channel = ClientChannel(websocket, codec)
+        channel.task = asyncio.create_task(self._writer(channel))
+        self.channels[websocket] = channel
+        return channel
+
+    def remove(self, websocket):
+        channel = self.channels.pop(websocket, None)
+        if channel is not None and channel.task is not None:
+            if channel.task is not asyncio.current_task():
+                channel.task.cancel()
+
+    def publish(self, message: dict, recipients: Optional[Iterable[object]] = None) -> int:
+        """Queue ``message`` for every client, or only ``recipients``; returns how many accepted it."""
+        if recipients is None:
+            channels = list(self.channels.values())
+        else:
+            channels = [self.channels[ws] for ws in recipients if ws in self.channels]
+        if not channels:
+            # Nobody is listening, so don't even encode it
+            return 0
+        encoded = {}
+        droppable = is_droppable(message)
+        accepted = 0
+        for channel in channels:
+            codec = channel.codec
+            frame = encoded.get(codec.name)
+            if frame is None:
+                frame = encoded[codec.name] = codec.encode(message)
+            if self._offer(channel, frame, droppable):
+                accepted += 1
+        return accepted
+
+    def send_to(self, websocket, message: dict) -> bool:
+        """Queue ``message`` for one client, in order with its broadcasts."""
+        channel = self.channels.get(websocket)
+        if channel is None:
+            return False
+        return self._offer(channel, channel.codec.encode(message), is_droppable(message))
+
+    def _offer(self, channel: ClientChannel, encoded: mobile_codec.Frame, droppable: bool) -> bool:
+        depth = len(channel.queue)
+        if channel.degraded and depth <= self.max_queue // 4:
+            channel.degraded = False
+            print(f"Mobile client {channel.websocket.remote_address} caught up")
+
+        if droppable and (channel.degraded or depth >= self.max_queue):
+            channel.dropped += 1
+            return False
+
+        if depth >= self.max_queue:
+            if not channel.degraded:
+                channel.degraded = True
+                print(f"⚠️ Mobile client {channel.websocket.remote_address} is lagging; downgrading")
+            # Make room by shedding queued low-priority events first
+            if not self._shed_droppable(channel):
+                self._evict(channel)
+                return False
+
+        channel.queue.append((time.monotonic(), encoded, droppable))
+        channel.ready.set()
+        return True
+
+    def _shed_droppable(self, channel: ClientChannel) -> bool:
+        for index, (_, _, droppable) in enumerate(channel.queue):
+            if droppable:
+                del channel.queue[index]
+                channel.dropped += 1
+                return True
+        return False
+
+    def _evict(self, channel: ClientChannel):
+        websocket = channel.websocket
+        print(f"⚠️ Evicting mobile client {websocket.remote_address}: {channel.stats()}")
+        self.evicted += 1
+        self.remove(websocket)
+        self._close_later(websocket, SLOW_CLIENT_CLOSE_CODE, "client too slow")
+
+    def _close_later(self, websocket, code: int, reason: str):
+        task = asyncio.ensure_future(self._close(websocket, code, reason))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    @staticmethod
+    async def _close(websocket, code: int, reason: str):
+        try:
+            await websocket.close(code=code, reason=reason)
+        except Exception:
+            pass
+
+    async def _writer(self, channel: ClientChannel):
+        websocket = channel.websocket
+        try:
+            while True:
+                while not channel.queue:
+                    channel.ready.clear()
+                    await channel.ready.wait()
+                enqueued_at, encoded, _ = channel.queue.popleft()
+                channel.peak_lag = max(channel.peak_lag, time.monotonic() - enqueued_at)
+                await websocket.send(encoded)
+                channel.sent += 1
+        except ConnectionClosed:
+            self.remove(websocket)
+        except Exception as exc:
+            # e.g. a frame the socket refused; without its writer the client
+            # would stay connected but never hear from us again
+            print(f"⚠️ Sending to mobile client {getattr(websocket, 'remote_address', None)} failed: {exc!r}")
+            self.send_failures += 1
+            self.remove(websocket)
+            self._close_later(websocket, SEND_FAILED_CLOSE_CODE, "send failed")
+
+    def stats(self) -> list:
+        return [channel.stats() for channel in self.channels.values()]
@@ -0,0 +1,212 @@
+import os
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence, Union
+
+from bson import ObjectId
+
+import json_backend
+
+Frame = Union[str, bytes]
+
+JSON = "json"
+MSGPACK = "msgpack"
+CBOR = "cbor"
+
+# Websocket subprotocol a client offers to get each encoding
+SUBPROTOCOLS = {
+    MSGPACK: "pharmacy.msgpack.v1",
+    CBOR: "pharmacy.cbor.v1",
+    JSON: "pharmacy.json.v1",
+}
+
+
+def encode_default(value: Any) -> Any:
+    """Client representation of the non-JSON types in stored documents.
+
+    Codecs call it while encoding, so documents go out in one pass with no
+    converted copy built first.
+    """
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not serializable")
+
+
+class WireCodec:
+    """How messages to and from one mobile client are encoded.
+
+    JSON goes out as text frames, MessagePack and CBOR as binary frames.
+    ``tag`` adds a ``request_id`` to an already-encoded object without
+    decoding it when the encoding allows.
+    """
+
+    __slots__ = ("name", "subprotocol", "encode", "decode", "_tag")
+
+    def __init__(
+        self,
+        name: str,
+        encode: Callable[[Any], Frame],
+        decode: Callable[[Frame], Any],
+        tag: Callable[[Frame, Frame], Optional[Frame]],
+    ):
+        self.name = name
+        self.subprotocol = SUBPROTOCOLS[name]
+        self.encode = encode
+        self.decode = decode
+        self._tag = tag
+
+    @property
+    def binary(self) -> bool:
+        return self.name != JSON
+
+    def tag(self, frame: Frame, request_id: Any) -> Frame:
+        tagged = self._tag(frame, request_id)
+        if tagged is not None:
+            return tagged
+        return self.encode({"request_id": request_id, **self.decode(frame)})
+
+
+def _json_tag(frame: str, request_id: Any) -> Optional[str]:
+    if frame.startswith("{") and frame != "{}":
+        return '{"request_id": ' + json_backend.dumps(request_id) + ", " + frame[1:]
+    return None
+
+
+def _json_codec() -> WireCodec:
+    # orjson writes datetimes itself, in the same format as isoformat()
+    backend = json_backend.get_backend(os.getenv("JSON_BACKEND"), default=encode_default)
+    return WireCodec(JSON, backend.dumps, backend.loads, _json_tag)
+
+
+def _map_tag(encode: Callable[[Any], bytes], first: int, last: int) -> Callable[[bytes, Any], Optional[bytes]]:
+    """Tag objects whose map header is a single byte: bump the count, prepend the pair."""
+    key = None
+
+    def tag(frame: bytes, request_id: Any) -> Optional[bytes]:
+        nonlocal key
+        if not frame or not first <= frame[0] < last:
+            return None
+        if key is None:
+            key = encode("request_id")
+        return bytes((frame[0] + 1,)) + key + encode(request_id) + frame[1:]
+
+    return tag
+
+
+def _msgpack_codec() -> WireCodec:
+    import msgpack
+
+    packb = msgpack.Packer(use_bin_type=True, default=encode_default).pack
+
+    def encode(obj) -> bytes:
+        # A Packer isn't safe to share across threads, but the bridge encodes on the event loop
+        return packb(obj)
+
+    def decode(frame: bytes):
+        return msgpack.unpackb(frame, raw=False)
+
+    # fixmap: 0x80 | size, for up to 15 keys
+    return WireCodec(MSGPACK, encode, decode, _map_tag(encode, 0x80, 0x8F))
+
+
+def _cbor_codec() -> WireCodec:
+    import cbor2
+
+    def encode(obj) -> bytes:
+        # Datetimes use CBOR's own datetime tag; naive ones are UTC, as Mongo stores them
+        return cbor2.dumps(obj, default=_cbor_default, timezone=timezone.utc)
+
+    # map with up to 23 keys: 0xa0 + size
+    return WireCodec(CBOR, encode, cbor2.loads, _map_tag(encode, 0xA0, 0xB7))
+
+
+def _cbor_default(encoder, value):
+    encoder.encode(encode_default(value))
+
+
+_FACTORIES = {
+    MSGPACK: _msgpack_codec,
+    CBOR: _cbor_codec,
+    JSON: _json_codec,
+}
+
+
+def _load_codecs(names: Sequence[str]) -> Dict[str, WireCodec]:
+    codecs = {}
+    for name in names:
+        try:
+            codecs[name] = _FACTORIES[name]()
+        except ImportError:
+            continue
+    return codecs
+
+
+def enabled_encodings() -> List[str]:
+    """``MOBILE_ENCODINGS``, in order of server preference."""
+    names = [name.strip() for name in os.getenv("MOBILE_ENCODINGS", "msgpack,cbor,json").split(",") if name.strip()]
+    unknown = [name for name in names if name not in _FACTORIES]
+    if unknown:
+        raise ValueError(f"Unknown MOBILE_ENCODINGS {unknown}")
+    return names
+
+
+# JSON is always available, for clients that don't negotiate anything
+available = _load_codecs(enabled_encodings())
+available.setdefault(JSON, _json_codec())
+default = available[JSON]
+_by_subprotocol = {codec.subprotocol: codec for codec in available.values()}
+
+
+def get_codec(name: str) -> WireCodec:
+    if name not in available:
+        raise ValueError(f"Encoding '{name}' is not available")
+    return available[name]
+
+
+def for_subprotocol(subprotocol: Optional[str]) -> WireCodec:
+    return _by_subprotocol.get(subprotocol, default)
+
+
+def select_subprotocol(connection, offered: Sequence[str]) -> Optional[str]:
+    """Pick our preferred encoding among those a client offers.
+
+    Clients that offer none of them still connect, and get JSON.
+    """
+    for codec in available.values():
+        if codec.subprotocol in offered:
+            return codec.subprotocol
+    return None
+
+
+def decode_frame(codec: WireCodec, frame: Frame):
+    """Clients may always send JSON text; binary frames use their encoding."""
+    if isinstance(frame, str):
+        return json_backend.loads(frame)
+    return codec.decode(frame)
+
+
+def deflate_options() -> dict:
+    """``websockets.serve`` keyword arguments for permessage-deflate.
+
+    ``MOBILE_WS_COMPRESSION=none`` turns it off; otherwise the window and
+    compression level can be tuned, trading server memory per connection
+    against compression ratio.
+    """
+    if os.getenv("MOBILE_WS_COMPRESSION", "deflate") == "none":
+        return {"compression": None}
+
+    from websockets.extensions.permessage_deflate import ServerPerMessageDeflateFactory
+
+    window_bits = int(os.getenv("MOBILE_WS_DEFLATE_WINDOW_BITS", "12"))
+    level = int(os.getenv("MOBILE_WS_DEFLATE_LEVEL", "6"))
+    return {
+        "compression": None,
+        "extensions": [
+            ServerPerMessageDeflateFactory(
+                server_max_window_bits=window_bits,
+                client_max_window_bits=window_bits,
+                compress_settings={"level": level, "memLevel": 5},
+            )
+        ],
+    }
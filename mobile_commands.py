@@ -0,0 +1,101 @@
+import asyncio
+import os
+from typing import Any, Awaitable, Optional, Set
+
+import mobile_codec
+
+
+class CommandReply:
+    """Sends the responses to one mobile command, tagged with its ``request_id``.
+
+    It stands in for the websocket wherever a handler sends frames, so
+    streamed and cached responses are correlated too. Messages are encoded
+    with the client's negotiated ``codec``; the tag is spliced into frames
+    that are already encoded instead of re-encoding them.
+    """
+
+    __slots__ = ("websocket", "request_id", "codec")
+
+    def __init__(self, websocket, request_id: Any = None, codec: Optional[mobile_codec.WireCodec] = None):
+        self.websocket = websocket
+        self.request_id = request_id
+        self.codec = codec or mobile_codec.default
+
+    @property
+    def remote_address(self):
+        return self.websocket.remote_address
+
+    def tag(self, message: dict) -> dict:
+        if self.request_id is None:
+            return message
+        return {"request_id": self.request_id, **message}
+
+    async def send(self, message):
+        """Send a message dict, or a frame already encoded with ``codec``."""
+        if isinstance(message, dict):
+            message = self.codec.encode(self.tag(message))
+        elif self.request_id is not None:
+            message = self.codec.tag(message, self.request_id)
+        await self.websocket.send(message)
+
+
+class InflightCommands:
+    """The commands one connection is running concurrently, up to ``limit``.
+
+    ``start`` refuses new work once the limit is reached, so the
+    connection's reader is never blocked and a client can't queue
+    unbounded work on the server. Work started with ``barrier=True`` (a
+    write) holds back everything started after it until it finishes, so
+    a read sent after a write sees its result.
+    """
+
+    def __init__(self, limit: Optional[int] = None):
+        self.limit = limit or int(os.getenv("MOBILE_MAX_INFLIGHT", "8"))
+        self.tasks: Set[asyncio.Task] = set()
+        self._barrier: Optional[asyncio.Task] = None
+        self.started = 0
+        self.rejected = 0
+        self.peak = 0
+
+    def start(self, work: Awaitable[Any], *, barrier: bool = False) -> Optional[asyncio.Task]:
+        if len(self.tasks) >= self.limit:
+            self.rejected += 1
+            if asyncio.iscoroutine(work):
+                work.close()
+            return None
+        if self._barrier is not None and not self._barrier.done():
+            work = self._after(self._barrier, work)
+        task = asyncio.ensure_future(work)
+        if barrier:
+            self._barrier = task
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        self.started += 1
+        self.peak = max(self.peak, len(self.tasks))
+        return task
+
+    @staticmethod
+    async def _after(barrier: asyncio.Task, work: Awaitable[Any]) -> Any:
+        try:
+            # wait() rather than await: a failed write still lets the reads run
+            await asyncio.wait([barrier])
+        except asyncio.CancelledError:
+            if asyncio.iscoroutine(work):
+                work.close()
+            raise
+        return await work
+
+    async def cancel(self):
+        tasks = list(self.tasks)
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self.tasks),
+            "peak": self.peak,
+            "started": self.started,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,133 @@
+import os
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+ALL = "all"
+SESSION = "session"
+PHONE = "phone"
+
+Topic = Tuple[str, Optional[str]]
+ALL_TOPIC: Topic = (ALL, None)
+
+
+def topic_from_command(data: dict) -> Optional[Topic]:
+    """The topic a ``subscribe``/``unsubscribe`` command names, if any."""
+    if data.get("all") or data.get("scope") == ALL:
+        return ALL_TOPIC
+    if data.get("session_id"):
+        return (SESSION, str(data["session_id"]))
+    if data.get("phone_number"):
+        return (PHONE, str(data["phone_number"]))
+    return None
+
+
+class SubscriptionIndex:
+    """Which mobile clients want events from which calls.
+
+    Clients subscribe to a session, to every call from a phone number, or
+    to ``all``. The index maps each topic to its clients, and each live
+    session to its caller's number, so ``recipients(session_id)`` is a
+    couple of set lookups however many clients and calls there are.
+    New clients start with ``MOBILE_DEFAULT_SUBSCRIPTION`` (``all`` or
+    ``none``).
+    """
+
+    def __init__(self, *, default: Optional[str] = None):
+        self.default = default or os.getenv("MOBILE_DEFAULT_SUBSCRIPTION", ALL)
+        if self.default not in (ALL, "none"):
+            raise ValueError(f"Unknown MOBILE_DEFAULT_SUBSCRIPTION '{self.default}'")
+        self._topics: Dict[object, Set[Topic]] = {}
+        self._clients: Dict[Topic, Set[object]] = {}
+        # Live session -> caller's phone number
+        self._phones: Dict[str, str] = {}
+        # Ended sessions whose events can still be replayed -> phone number
+        self._ended: Dict[str, str] = {}
+
+    def add(self, client):
+        self._topics[client] = set()
+        if self.default == ALL:
+            self.subscribe(client, ALL_TOPIC)
+
+    def remove(self, client):
+        for topic in self._topics.pop(client, ()):
+            self._discard(topic, client)
+
+    def subscribe(self, client, topic: Topic) -> bool:
+        """Returns false if the client already had this subscription."""
+        topics = self._topics.setdefault(client, set())
+        if topic in topics:
+            return False
+        topics.add(topic)
+        self._clients.setdefault(topic, set()).add(client)
+        return True
+
+    def unsubscribe(self, client, topic: Optional[Topic] = None):
+        """Drop one subscription, or all of them when ``topic`` is ``None``."""
+        topics = self._topics.get(client, set())
+        for dropped in list(topics) if topic is None else [topic]:
+            if dropped in topics:
+                topics.discard(dropped)
+                self._discard(dropped, client)
+
+    def _discard(self, topic: Topic, client):
+        clients = self._clients.get(topic)
+        if clients is not None:
+            clients.discard(client)
+            if not clients:
+                del self._clients[topic]
+
+    def bind(self, session_id: str, phone_number: Optional[str]):
+        """Route a live session's events to subscribers of its phone number."""
+        if phone_number:
+            self._phones[session_id] = phone_number
+
+    def unbind(self, session_id: str):
+        """Stop routing live events; the number is kept for replays until ``retain`` drops it."""
+        phone_number = self._phones.pop(session_id, None)
+        if phone_number is not None:
+            self._ended[session_id] = phone_number
+
+    def retain(self, session_ids: Iterable[Optional[str]]):
+        """Forget the numbers of ended sessions that aren't in ``session_ids``."""
+        keep = set(session_ids)
+        for session_id in [sid for sid in self._ended if sid not in keep]:
+            del self._ended[session_id]
+
+    def recipients(self, session_id: Optional[str]) -> Set[object]:
+        """Clients interested in an event from ``session_id``."""
+        clients = set(self._clients.get(ALL_TOPIC, ()))
+        if session_id is None:
+            # Events outside any call only go to clients watching everything
+            return clients
+        clients.update(self._clients.get((SESSION, session_id), ()))
+        phone_number = self._phones.get(session_id)
+        if phone_number is not None:
+            clients.update(self._clients.get((PHONE, phone_number), ()))
+        return clients
+
+    def matches(self, topic: Topic, session_id: Optional[str], phone_number: Optional[str] = None) -> bool:
+        scope, key = topic
+        if scope == ALL:
+            return True
+        if session_id is None:
+            return False
+        if scope == SESSION:
+            return key == session_id
+        return key == (phone_number or self._phones.get(session_id) or self._ended.get(session_id))
+
+    def topics(self, client) -> Set[Topic]:
+        return set(self._topics.get(client, ()))
+
+    def subscriptions(self, client) -> List[dict]:
+        return [
+            {"scope": scope, "id": key} if key is not None else {"scope": scope}
+            for scope, key in sorted(self._topics.get(client, ()), key=lambda topic: (topic[0], topic[1] or ""))
+        ]
+
+    def stats(self) -> dict:
+        return {
+            "clients": len(self._topics),
+            "all": len(self._clients.get(ALL_TOPIC, ())),
+            "topics": len(self._clients),
+            "live_sessions": len(self._phones),
+            "ended_sessions": len(self._ended),
+        }
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+MongoDB index declarations for call history.
+
+Every query the bridge runs has an index declared here next to it.
+``ensure_indexes`` creates them (run at startup), ``verify_plans`` runs
+``explain()`` on each declared query shape and checks Mongo actually picks
+the intended index, and ``index_report`` lists declared indexes that are
+missing, indexes nobody declared, and indexes with no recorded use.
+
+Retention: with ``SESSION_RETENTION_DAYS`` set, ended sessions (and
+history messages) are removed by TTL indexes that many days later.
+
+Usage:
+    python mongo_indexes.py ensure
+    python mongo_indexes.py verify
+    python mongo_indexes.py report
+"""
+import argparse
+import asyncio
+import json
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+from session_messages import COLLECTION, SESSION_MESSAGES, storage_layout
+
+SESSIONS = "call_sessions"
+
+# Mongo error codes for an existing index whose options differ
+INDEX_OPTIONS_CONFLICT = (85, 86)
+
+
+class IndexSpec:
+    __slots__ = ("collection", "keys", "options", "purpose")
+
+    def __init__(self, collection: str, keys: Sequence[Tuple[str, int]], purpose: str, **options):
+        self.collection = collection
+        self.keys = list(keys)
+        self.options = options
+        self.purpose = purpose
+
+    @property
+    def name(self) -> str:
+        # Mongo's default name, so indexes created elsewhere with the same keys match
+        return "_".join(f"{field}_{direction}" for field, direction in self.keys)
+
+
+class QueryShape:
+    """A query the bridge runs and the index it should use."""
+
+    __slots__ = ("description", "collection", "filter", "sort", "index")
+
+    def __init__(self, description: str, collection: str, filter: dict, sort: list, index: IndexSpec):
+        self.description = description
+        self.collection = collection
+        self.filter = filter
+        self.sort = sort
+        self.index = index
+
+
+def retention_seconds() -> Optional[int]:
+    days = float(os.getenv("SESSION_RETENTION_DAYS", "0"))
+    return int(days * 86400) if days > 0 else None
+
+
+SESSION_BY_ID = IndexSpec(SESSIONS, [("sessionId", ASCENDING)], "session upserts and appends", unique=True)
+SESSION_BY_CREDENTIALS = IndexSpec(
+    SESSIONS,
+    [("phoneNumber", ASCENDING), ("passcodeHash", ASCENDING), ("updatedAt", DESCENDING)],
+    "fetch_history / find_session credential lookup, newest first",
+)
+SESSIONS_BY_CREATED = IndexSpec(
+    SESSIONS,
+    [("createdAt", DESCENDING), ("sessionId", DESCENDING)],
+    "get_recent_conversations and its pagination cursor",
+)
+MESSAGES_BY_SEQ = IndexSpec(
+    SESSION_MESSAGES, [("sessionId", ASCENDING), ("seq", ASCENDING)], "history pages in seq order", unique=True
+)
+MESSAGES_BY_KIND = IndexSpec(
+    SESSION_MESSAGES,
+    [("sessionId", ASCENDING), ("kind", ASCENDING), ("seq", ASCENDING)],
+    "history pages filtered by kind",
+)
+
+QUERY_SHAPES = [
+    QueryShape(
+        "credential lookup",
+        SESSIONS,
+        {"phoneNumber": "+15550100", "passcodeHash": "0" * 64},
+        [("updatedAt", DESCENDING)],
+        SESSION_BY_CREDENTIALS,
+    ),
+    QueryShape("session by id", SESSIONS, {"sessionId": "MZ0"}, [], SESSION_BY_ID),
+    QueryShape(
+        "recent conversations",
+        SESSIONS,
+        {},
+        [("createdAt", DESCENDING), ("sessionId", DESCENDING)],
+        SESSIONS_BY_CREATED,
+    ),
+    QueryShape(
+        "history page",
+        SESSION_MESSAGES,
+        {"sessionId": "MZ0", "seq": {"$gt": 0}},
+        [("seq", ASCENDING)],
+        MESSAGES_BY_SEQ,
+    ),
+]
+
+
+def layout_shapes(layout: str) -> List[QueryShape]:
+    """The declared query shapes the bridge runs in ``layout``.
+
+    The embedded layout keeps history in ``call_sessions`` arrays and never
+    queries ``session_messages``, which is usually empty then, so its
+    shapes would only ever explain to an EOF plan.
+    """
+    if layout == COLLECTION:
+        return list(QUERY_SHAPES)
+    return [shape for shape in QUERY_SHAPES if shape.collection != SESSION_MESSAGES]
+
+
+def declared_indexes(retention: Optional[int] = None) -> List[IndexSpec]:
+    specs = [SESSION_BY_ID, SESSION_BY_CREDENTIALS, SESSIONS_BY_CREATED, MESSAGES_BY_SEQ, MESSAGES_BY_KIND]
+    if retention:
+        specs += [
+            IndexSpec(SESSIONS, [("endedAt", ASCENDING)], "retention of ended sessions", expireAfterSeconds=retention),
+            IndexSpec(SESSION_MESSAGES, [("timestamp", ASCENDING)], "retention of history", expireAfterSeconds=retention),
+        ]
+    return specs
+
+
+async def ensure_indexes(db, specs: Optional[List[IndexSpec]] = None) -> List[str]:
+    """Create every declared index; returns the names that were created or updated."""
+    if specs is None:
+        specs = declared_indexes(retention_seconds())
+    changed = []
+    for spec in specs:
+        collection = db[spec.collection]
+        try:
+            await collection.create_index(spec.keys, name=spec.name, **spec.options)
+        except OperationFailure as exc:
+            if exc.code not in INDEX_OPTIONS_CONFLICT or "expireAfterSeconds" not in spec.options:
+                raise
+            # Only the retention period changed; update it in place
+            await db.command(
+                "collMod",
+                spec.collection,
+                index={"name": spec.name, "expireAfterSeconds": spec.options["expireAfterSeconds"]},
+            )
+        changed.append(spec.name)
+    return changed
+
+
+def _plan_indexes(plan: Dict[str, Any]) -> Tuple[List[str], List[str]]:
+    """Stages and index names used anywhere in an explain() plan tree."""
+    stages, indexes = [], []
+    pending = [plan]
+    while pending:
+        node = pending.pop()
+        stages.append(node.get("stage"))
+        if "indexName" in node:
+            indexes.append(node["indexName"])
+        if "inputStage" in node:
+            pending.append(node["inputStage"])
+        pending.extend(node.get("inputStages", []))
+    return stages, indexes
+
+
+async def verify_plans(db, shapes: Optional[Sequence[QueryShape]] = None) -> List[Dict[str, Any]]:
+    """Explain each query shape the configured layout runs and report which index won."""
+    if shapes is None:
+        shapes = layout_shapes(storage_layout())
+    results = []
+    for shape in shapes:
+        cursor = db[shape.collection].find(shape.filter)
+        if shape.sort:
+            cursor = cursor.sort(shape.sort)
+        explained = await cursor.limit(1).explain()
+        stages, indexes = _plan_indexes(explained["queryPlanner"]["winningPlan"])
+        results.append(
+            {
+                "query": shape.description,
+                "expected": shape.index.name,
+                "used": indexes,
+                "ok": shape.index.name in indexes and "COLLSCAN" not in stages and "SORT" not in stages,
+            }
+        )
+    return results
+
+
+async def index_report(db, specs: Optional[List[IndexSpec]] = None) -> Dict[str, Dict[str, List[str]]]:
+    """Per collection: declared-but-missing, present-but-undeclared and unused indexes."""
+    if specs is None:
+        specs = declared_indexes(retention_seconds())
+    report = {}
+    for collection_name in sorted({spec.collection for spec in specs}):
+        collection = db[collection_name]
+        declared = {spec.name for spec in specs if spec.collection == collection_name}
+        present = {index["name"] async for index in collection.list_indexes()}
+        usage = {
+            stats["name"]: stats["accesses"]["ops"]
+            async for stats in collection.aggregate([{"$indexStats": {}}])
+        }
+        present.discard("_id_")
+        report[collection_name] = {
+            "missing": sorted(declared - present),
+            "undeclared": sorted(present - declared),
+            # Counters reset when mongod restarts, so treat this as a hint
+            "unused": sorted(name for name in present if usage.get(name, 0) == 0),
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage MongoDB indexes for call history")
+    parser.add_argument("command", choices=["ensure", "verify", "report"])
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv()
+    mongo_uri = os.getenv("MONGODB_URI")
+    if not mongo_uri:
+        parser.error("MONGODB_URI is not set")
+
+    async def run():
+        client = AsyncIOMotorClient(mongo_uri, serverSelectionTimeoutMS=5000)
+        try:
+            db = client[os.getenv("MONGODB_DB_NAME", "agent")]
+            if args.command == "ensure":
+                return await ensure_indexes(db)
+            if args.command == "verify":
+                return await verify_plans(db)
+            return await index_report(db)
+        finally:
+            client.close()
+
+    result = asyncio.run(run())
+    print(json.dumps(result, indent=2))
+    if args.command == "verify" and not all(item["ok"] for item in result):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
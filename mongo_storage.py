@@ -0,0 +1,254 @@
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+import history_pages
+import session_messages
+from persistence import MongoPersistence, PersistenceUnavailable
+from storage import Batch, SessionStorage
+
+
+class MongoStorage(SessionStorage):
+    """Call history in MongoDB: ``call_sessions`` plus, with the
+    ``collection`` layout, one ``session_messages`` document per entry.
+
+    The client, pooling and reconnects are ``MongoPersistence``'s job;
+    ``use_database`` is called once it has a connection.
+    """
+
+    name = "mongo"
+
+    def __init__(self, persistence: Optional[MongoPersistence] = None, *, layout: Optional[str] = None):
+        super().__init__()
+        self.layout = layout or session_messages.storage_layout()
+        self.sequences = session_messages.SequenceAllocator()
+        self.db = None
+        self.sessions = None
+        self.persistence = persistence or MongoPersistence()
+        self.persistence.on_connect(self.use_database)
+
+    def use_database(self, db):
+        self.db = db
+        self.sessions = db["call_sessions"]
+        self._notify_available()
+
+    @property
+    def configured(self) -> bool:
+        return self.persistence.configured or self.sessions is not None
+
+    @property
+    def available(self) -> bool:
+        return self.sessions is not None
+
+    async def start(self):
+        await self.persistence.start()
+
+    async def close(self):
+        await self.persistence.close()
+
+    def _sessions(self):
+        if self.sessions is None:
+            raise PersistenceUnavailable(self.persistence.last_error or "MongoDB is not connected yet")
+        return self.sessions
+
+    async def upsert_session(self, session_id: str, record: dict):
+        now = record["timestamp"]
+        session_doc = {
+            "sessionId": session_id,
+            "callSid": record["callSid"],
+            "phoneNumber": record["phoneNumber"],
+            "username": record["username"],
+            "passcodeHash": record["passcodeHash"],
+            "status": "in_progress",
+            "createdAt": now,
+            "updatedAt": now,
+        }
+        if self.layout == session_messages.COLLECTION:
+            session_doc.update({"messagesLayout": session_messages.COLLECTION, "messageCount": 0})
+        else:
+            session_doc.update({"messages": [], "functionCalls": []})
+
+        await self._sessions().update_one(
+            {"sessionId": session_id},
+            {
+                "$setOnInsert": session_doc,
+                "$set": {
+                    "phoneNumber": record["phoneNumber"],
+                    "username": record["username"],
+                    "passcodeHash": record["passcodeHash"],
+                    "status": "in_progress",
+                    "updatedAt": now,
+                },
+            },
+            upsert=True,
+        )
+
+    async def complete_session(self, session_id: str, ended_at: datetime):
+        await self._sessions().update_one(
+            {"sessionId": session_id},
+            {"$set": {"status": "completed", "endedAt": ended_at, "updatedAt": ended_at}},
+        )
+
+    async def update_session(self, session_id: str, fields: dict) -> bool:
+        result = await self._sessions().update_one({"sessionId": session_id}, {"$set": fields})
+        return result.matched_count > 0
+
+    async def append_entries(self, batch: Batch):
+        """One ``bulk_write`` for the batch, in whichever layout is configured."""
+        sessions = self._sessions()
+        if self.layout == session_messages.COLLECTION:
+            await self._write_collection(sessions, batch)
+        else:
+            await self._write_embedded(sessions, batch)
+
+    async def _write_embedded(self, sessions, batch: Batch):
+        now = datetime.now(timezone.utc)
+        operations = []
+        for sid, entries in batch.items():
+            fields: Dict[str, List[dict]] = {}
+            for field, entry in entries:
+                fields.setdefault(field, []).append(entry)
+            operations.append(
+                UpdateOne(
+                    {"sessionId": sid},
+                    {
+                        "$push": {field: {"$each": items} for field, items in fields.items()},
+                        "$set": {"updatedAt": now},
+                    },
+                    upsert=True,
+                )
+            )
+        await sessions.bulk_write(operations, ordered=False)
+
+    async def _write_collection(self, sessions, batch: Batch):
+        messages = self.db[session_messages.SESSION_MESSAGES]
+        documents = []
+        for sid, entries in batch.items():
+            # Entries keep the seq they were given, so a retried batch
+            # re-inserts under the same keys instead of duplicating
+            unnumbered = []
+            for _, entry in entries:
+                if "seq" in entry:
+                    self.sequences.advance(sid, entry["seq"])
+                else:
+                    unnumbered.append(entry)
+            if unnumbered:
+                seq = await self.sequences.reserve(messages, sid, len(unnumbered))
+                for entry in unnumbered:
+                    entry["seq"] = seq
+                    seq += 1
+            documents.extend(
+                session_messages.message_document(sid, entry["seq"], field, entry)
+                for field, entry in entries
+            )
+        await session_messages.insert_documents(messages, documents)
+
+        # messageCount follows the highest seq stored rather than being
+        # incremented, so retrying a batch whose inserts already landed
+        # doesn't count them twice
+        now = datetime.now(timezone.utc)
+        await sessions.bulk_write(
+            [
+                UpdateOne(
+                    {"sessionId": sid},
+                    {
+                        "$set": {"updatedAt": now},
+                        "$max": {"messageCount": max(entry["seq"] for _, entry in entries) + 1},
+                    },
+                    upsert=True,
+                )
+                for sid, entries in batch.items()
+            ],
+            ordered=False,
+        )
+
+    async def last_seq(self, session_id: str) -> Optional[int]:
+        sessions = self._sessions()
+        if self.layout == session_messages.COLLECTION:
+            last = await self.db[session_messages.SESSION_MESSAGES].find_one(
+                {"sessionId": session_id},
+                projection={"_id": 0, "seq": 1},
+                sort=[("seq", -1)],
+            )
+            return last["seq"] if last else None
+        # Embedded entries written before they were numbered have no seq and are ignored by $max
+        found = await sessions.aggregate(
+            [
+                {"$match": {"sessionId": session_id}},
+                {
+                    "$project": {
+                        "_id": 0,
+                        "last": {"$max": [{"$max": f"${field}.seq"} for field in history_pages.EMBEDDED_FIELDS]},
+                    }
+                },
+            ]
+        ).to_list(length=1)
+        return found[0].get("last") if found else None
+
+    async def find_session(
+        self,
+        phone_number: str,
+        passcode_hash: str,
+        session_id: Optional[str] = None,
+        *,
+        with_history: bool = False,
+    ) -> Optional[dict]:
+        query = {"phoneNumber": phone_number, "passcodeHash": passcode_hash}
+        if session_id:
+            query["sessionId"] = session_id
+        if not with_history:
+            return await self._sessions().find_one(
+                query,
+                projection=history_pages.SUMMARY_PROJECTION,
+                sort=[("updatedAt", -1)],
+            )
+        document = await self._sessions().find_one(
+            query, projection=history_pages.DOCUMENT_PROJECTION, sort=[("updatedAt", -1)]
+        )
+        if document:
+            await self._attach_messages(document)
+        return document
+
+    async def _attach_messages(self, document: dict):
+        """Fill in history arrays for sessions stored in ``session_messages``."""
+        if document.get("messagesLayout") != session_messages.COLLECTION:
+            return
+        arrays = await session_messages.load_embedded(
+            self.db[session_messages.SESSION_MESSAGES], document["sessionId"]
+        )
+        for field, entries in arrays.items():
+            # Sessions migrated without --drop-arrays still carry the originals;
+            # migrate only runs once writers have stopped appending to them
+            document[field] = entries
+
+    def history_pages(
+        self,
+        session: dict,
+        *,
+        size: int,
+        cursor: Optional[str] = None,
+        fields: Optional[List[str]] = None,
+    ) -> AsyncIterator[Tuple[List[dict], Optional[str]]]:
+        return history_pages.history_pages(self.db, session, size=size, cursor=cursor, fields=fields)
+
+    async def recent_sessions(self, *, limit: int, cursor: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+        return await history_pages.recent_sessions(self._sessions(), limit=limit, cursor=cursor)
+
+    async def recent_conversations(self, limit: int) -> List[dict]:
+        cursor = (
+            self._sessions()
+            .find({}, projection=history_pages.DOCUMENT_PROJECTION)
+            .sort("createdAt", -1)
+            .limit(limit)
+        )
+        conversations = await cursor.to_list(length=limit)
+        for conversation in conversations:
+            await self._attach_messages(conversation)
+        return conversations
+
+    def forget(self, session_id: str):
+        self.sequences.forget(session_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name, "layout": self.layout, **self.persistence.stats()}
@@ -0,0 +1,275 @@
+import asyncio
+import os
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+
+import mongo_indexes
+
+
+class PersistenceUnavailable(Exception):
+    """MongoDB is configured but not reachable right now."""
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Connection pool utilisation, fed by PyMongo's CMAP events.
+
+    Events arrive on driver threads, hence the lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.open = 0
+        self.checked_out = 0
+        self.peak_checked_out = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.pool_clears = 0
+        self._wait_seconds = 0.0
+        self._wait_max = 0.0
+        self._timed_checkouts = 0
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open = max(0, self.open - 1)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures += 1
+
+    def connection_checked_out(self, event):
+        # ``duration`` (time spent waiting for the connection) needs PyMongo 4.7+
+        duration = getattr(event, "duration", None)
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.peak_checked_out = max(self.peak_checked_out, self.checked_out)
+            if duration is not None:
+                self._timed_checkouts += 1
+                self._wait_seconds += duration
+                self._wait_max = max(self._wait_max, duration)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out = max(0, self.checked_out - 1)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            timed = self._timed_checkouts
+            return {
+                "open": self.open,
+                "checked_out": self.checked_out,
+                "peak_checked_out": self.peak_checked_out,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "pool_clears": self.pool_clears,
+                "checkout_wait_ms_avg": round(self._wait_seconds / timed * 1000, 2) if timed else None,
+                "checkout_wait_ms_max": round(self._wait_max * 1000, 2) if timed else None,
+            }
+
+
+async def prepare_database(db):
+    """One-time setup after connecting: every index the history queries rely on."""
+    await mongo_indexes.ensure_indexes(db)
+    for plan in await mongo_indexes.verify_plans(db):
+        if not plan["ok"]:
+            print(f"⚠️ Query '{plan['query']}' is not using {plan['expected']}: {plan['used']}")
+
+
+def _write_concern_w(value: str):
+    return int(value) if value.isdigit() else value
+
+
+class MongoPersistence:
+    """The MongoDB client, initialised once and reconnected with backoff.
+
+    ``start`` connects, pings and ensures indexes the first time it is
+    called; later calls return at once. If the first attempt fails a
+    background task keeps retrying with exponential backoff, and the
+    ``on_connect`` listeners are called once it succeeds, so a Mongo
+    outage at boot no longer disables persistence for the life of the
+    process. Once connected, the driver handles reconnects itself.
+    """
+
+    def __init__(
+        self,
+        uri: Optional[str] = None,
+        db_name: Optional[str] = None,
+        *,
+        max_pool_size: Optional[int] = None,
+        min_pool_size: Optional[int] = None,
+        write_concern: Optional[str] = None,
+        journal: Optional[bool] = None,
+        read_preference: Optional[str] = None,
+        min_backoff: Optional[float] = None,
+        max_backoff: Optional[float] = None,
+        client_factory: Callable[..., Any] = AsyncIOMotorClient,
+        prepare: Callable[[Any], Awaitable[None]] = prepare_database,
+    ):
+        # Environment defaults are resolved in ``start`` (see ``_configure``),
+        # so a .env loaded after this module is imported still applies
+        self.uri = uri
+        self.db_name = db_name
+        self._overrides = {
+            "maxPoolSize": max_pool_size,
+            "minPoolSize": min_pool_size,
+            "w": write_concern,
+            "journal": journal,
+            "readPreference": read_preference,
+        }
+        self.client_options: Dict[str, Any] = {}
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self._client_factory = client_factory
+        self._prepare = prepare
+
+        self.client = None
+        self.db = None
+        self.pool = PoolMetrics()
+        self._started = False
+        self._start_lock: Optional[asyncio.Lock] = None
+        self._reconnect_task: Optional[asyncio.Task] = None
+        self._listeners: List[Callable[[Any], None]] = []
+        self.attempts = 0
+        self.last_error: Optional[str] = None
+        self.connected_at: Optional[float] = None
+
+    def _configure(self):
+        """Fill in every setting not passed to the constructor from the environment."""
+        if self.client_options:
+            return
+        overrides = self._overrides
+        if self.uri is None:
+            self.uri = os.getenv("MONGODB_URI")
+        self.db_name = self.db_name or os.getenv("MONGODB_DB_NAME", "agent")
+        self.client_options = {
+            "maxPoolSize": overrides["maxPoolSize"] or int(os.getenv("MONGO_MAX_POOL_SIZE", "50")),
+            "minPoolSize": (
+                overrides["minPoolSize"] if overrides["minPoolSize"] is not None
+                else int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+            ),
+            "maxIdleTimeMS": int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000")),
+            "waitQueueTimeoutMS": int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "2000")),
+            "serverSelectionTimeoutMS": int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000")),
+            "w": _write_concern_w(overrides["w"] or os.getenv("MONGO_WRITE_CONCERN", "1")),
+            "journal": (
+                overrides["journal"] if overrides["journal"] is not None
+                else os.getenv("MONGO_WRITE_JOURNAL", "false").lower() == "true"
+            ),
+            "readPreference": overrides["readPreference"] or os.getenv("MONGO_READ_PREFERENCE", "primaryPreferred"),
+            "retryWrites": True,
+        }
+        self.min_backoff = self.min_backoff or float(os.getenv("MONGO_RECONNECT_MIN_BACKOFF", "1"))
+        self.max_backoff = self.max_backoff or float(os.getenv("MONGO_RECONNECT_MAX_BACKOFF", "60"))
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.uri if self.uri is not None else os.getenv("MONGODB_URI"))
+
+    @property
+    def available(self) -> bool:
+        return self.db is not None
+
+    def on_connect(self, listener: Callable[[Any], None]):
+        """Call ``listener(db)`` whenever a database connection is established."""
+        self._listeners.append(listener)
+        if self.db is not None:
+            listener(self.db)
+
+    async def start(self):
+        if self._started:
+            return
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+        async with self._start_lock:
+            if self._started:
+                return
+            self._started = True
+            self._configure()
+            if not self.configured:
+                print("MONGODB_URI not set. Conversation persistence disabled.")
+                return
+            if not await self._connect():
+                self._reconnect_task = asyncio.create_task(self._reconnect())
+
+    async def _connect(self) -> bool:
+        self.attempts += 1
+        client = self._client_factory(self.uri, event_listeners=[self.pool], **self.client_options)
+        try:
+            await client.admin.command("ping")
+            db = client[self.db_name]
+            await self._prepare(db)
+        except Exception as exc:
+            self.last_error = str(exc)
+            print(f"Failed to initialise MongoDB (attempt {self.attempts}): {exc}")
+            client.close()
+            return False
+
+        self.client = client
+        self.db = db
+        self.connected_at = time.time()
+        self.last_error = None
+        print(f"MongoDB connected. Using database '{self.db_name}'.")
+        for listener in self._listeners:
+            listener(db)
+        return True
+
+    async def _reconnect(self):
+        delay = self.min_backoff
+        while True:
+            print(f"Retrying MongoDB connection in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            if await self._connect():
+                return
+            delay = min(delay * 2, self.max_backoff)
+
+    def sessions(self):
+        """The ``call_sessions`` collection, or raise while Mongo is down."""
+        if self.db is None:
+            if self.configured:
+                raise PersistenceUnavailable(self.last_error or "MongoDB is not connected yet")
+            return None
+        return self.db["call_sessions"]
+
+    async def close(self):
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+        if self.client is not None:
+            self.client.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "configured": self.configured,
+            "connected": self.available,
+            "attempts": self.attempts,
+            "last_error": self.last_error,
+            "max_pool_size": self.client_options.get("maxPoolSize"),
+            "pool": self.pool.stats(),
+        }
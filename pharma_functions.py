@@ -1,7 +1,9 @@
-import requests
 import json
 from typing import Dict, Any
 
+from fda_client import fda_client
+from fda_snapshot import fda_snapshot
+
 # Simple in-memory storage
 ORDERS_DB = {"orders": {}, "next_id": 1}
 DRUG_DB = { 
@@ -29,30 +31,17 @@ DRUG_DB = {
 }
 
 
-def get_drug_info_from_fda(drug_name: str) -> Dict[str, Any]:
-    """Get real drug information from OpenFDA API."""
-    try:
-        # OpenFDA API for drug labels
-        url = f"https://api.fda.gov/drug/label.json?search=openfda.brand_name:\"{drug_name}\"&limit=1"
-        response = requests.get(url, timeout=10)
-        
-        if response.status_code == 200:
-            data = response.json()
-            if data.get('results'):
-                result = data['results'][0]
-                return {
-                    "brand_name": result.get('openfda', {}).get('brand_name', ['Unknown'])[0] if result.get('openfda', {}).get('brand_name') else 'Unknown',
-                    "generic_name": result.get('openfda', {}).get('generic_name', ['Unknown'])[0] if result.get('openfda', {}).get('generic_name') else 'Unknown',
-                    "manufacturer": result.get('openfda', {}).get('manufacturer_name', ['Unknown'])[0] if result.get('openfda', {}).get('manufacturer_name') else 'Unknown',
-                    "indications": result.get('indications_and_usage', ['Not available'])[0] if result.get('indications_and_usage') else 'Not available',
-                    "warnings": result.get('warnings', ['None listed'])[0][:200] + "..." if result.get('warnings') and len(result.get('warnings', [''])[0]) > 200 else result.get('warnings', ['None listed'])[0] if result.get('warnings') else 'None listed',
-                    "dosage": result.get('dosage_and_administration', ['Not specified'])[0][:200] + "..." if result.get('dosage_and_administration') and len(result.get('dosage_and_administration', [''])[0]) > 200 else result.get('dosage_and_administration', ['Not specified'])[0] if result.get('dosage_and_administration') else 'Not specified'
-                }
-        return {"error": f"No FDA data found for '{drug_name}'"}
-    except Exception as e:
-        return {"error": f"FDA API error: {str(e)}"}
-
-def get_drug_info(drug_name: str) -> Dict[str, Any]:
+async def get_drug_info_from_fda(drug_name: str) -> Dict[str, Any]:
+    """Get real drug information from the offline snapshot or OpenFDA."""
+    # A configured snapshot is authoritative, keeping the network off the voice path
+    if fda_snapshot is not None:
+        label = fda_snapshot.lookup(drug_name)
+        if label is None:
+            return {"error": f"No FDA data found for '{drug_name}'"}
+        return label
+    return await fda_client.lookup(drug_name)
+
+async def get_drug_info(drug_name: str) -> Dict[str, Any]:
     """Get drug information from local DB first, then FDA API."""
     # Check local database first
     drug = DRUG_DB.get(drug_name.lower())
@@ -66,7 +55,7 @@ def get_drug_info(drug_name: str) -> Dict[str, Any]:
         }
         
         # Try to enhance with FDA data
-        fda_info = get_drug_info_from_fda(drug_name)
+        fda_info = await get_drug_info_from_fda(drug_name)
         if "error" not in fda_info:
             local_info.update({
                 "fda_data": fda_info,
@@ -76,7 +65,7 @@ def get_drug_info(drug_name: str) -> Dict[str, Any]:
         return local_info
     
     # If not in local DB, try FDA API
-    fda_info = get_drug_info_from_fda(drug_name)
+    fda_info = await get_drug_info_from_fda(drug_name)
     if "error" not in fda_info:
         return {
             "source": "fda",
@@ -13,6 +13,62 @@ import ConnectionStatus from './components/ConnectionStatus';
 import AuthModal from './components/AuthModal';
 import HistoryViewer from './components/HistoryViewer';
 
+// Messages per history_chunk frame requested from the backend
+const HISTORY_PAGE_SIZE = 50;
+
+// Opt in to MessagePack frames from the backend (smaller and cheaper to
+// parse for long histories). Commands are still sent as JSON text; a backend
+// that doesn't offer the subprotocol keeps sending JSON.
+const USE_BINARY_PROTOCOL = false;
+const MSGPACK_SUBPROTOCOL = 'pharmacy.msgpack.v1';
+
+// Only loaded when binary frames are on, so the JSON-only app never pulls
+// the decoder into its startup path
+const decodeMsgpack = USE_BINARY_PROTOCOL ? require('@msgpack/msgpack').decode : null;
+
+const decodeFrame = (frame) => {
+  if (typeof frame === 'string') {
+    return JSON.parse(frame);
+  }
+  return decodeMsgpack(new Uint8Array(frame));
+};
+
+const startStreamedHistory = (session) => ({
+  ...session,
+  messages: [],
+  functionCalls: [],
+  isStreaming: true,
+});
+
+const appendHistoryEntries = (history, sessionId, entries) => {
+  if (!history || history.sessionId !== sessionId) {
+    return history;
+  }
+  const messages = [...history.messages];
+  const functionCalls = [...history.functionCalls];
+  let { lastSeq } = history;
+  entries.forEach((entry) => {
+    if (entry.kind === 'function_call') {
+      functionCalls.push(entry);
+    } else {
+      messages.push(entry);
+    }
+    if (typeof entry.seq === 'number' && (lastSeq == null || entry.seq > lastSeq)) {
+      lastSeq = entry.seq;
+    }
+  });
+  return { ...history, messages, functionCalls, lastSeq };
+};
+
+// A delta sync continues the copy we already have; the backend clears
+// since_seq when the newest session is a different call
+const resumeSyncedHistory = (cached, session, sinceSeq) => {
+  if (sinceSeq == null || !cached || cached.sessionId !== session.sessionId) {
+    return startStreamedHistory(session);
+  }
+  return { ...cached, ...session, isStreaming: true };
+};
+
 const theme = {
   ...DefaultTheme,
   colors: {
@@ -35,6 +91,8 @@ export default function App() {
   const [isLoadingHistory, setIsLoadingHistory] = useState(false);
 
   const wsRef = useRef(null);
+  // Last synced history per phone number, so reopening it only fetches what's new
+  const syncedHistoryRef = useRef({});
 
   useEffect(() => {
     connectToAgent();
@@ -46,6 +104,12 @@ export default function App() {
     };
   }, []);
 
+  useEffect(() => {
+    if (conversationHistory && conversationHistory.phoneNumber) {
+      syncedHistoryRef.current[conversationHistory.phoneNumber] = conversationHistory;
+    }
+  }, [conversationHistory]);
+
   // Auto-load recent conversation for testing
   const autoLoadRecentConversation = () => {
     if (wsRef.current && wsRef.current.readyState === WebSocket.OPEN) {
@@ -54,7 +118,11 @@ export default function App() {
       // Request recent conversations instead of using hardcoded credentials
       setIsLoadingHistory(true);
       wsRef.current.send(JSON.stringify({
-        command: 'get_recent_conversations'
+        command: 'get_recent_conversations',
+        stream: true,
+        limit: 1,
+        include_messages: true,
+        page_size: HISTORY_PAGE_SIZE,
       }));
     }
   };
@@ -94,7 +162,11 @@ export default function App() {
     try {
       console.log('Attempting to connect to Dr. Claude AI at ws://localhost:9004');
       // Connect to the mobile bridge server
-      const ws = new WebSocket('ws://localhost:9004');
+      const ws = USE_BINARY_PROTOCOL
+        ? new WebSocket('ws://localhost:9004', [MSGPACK_SUBPROTOCOL])
+        : new WebSocket('ws://localhost:9004');
+      // Binary frames arrive as ArrayBuffers rather than Blobs
+      ws.binaryType = 'arraybuffer';
       
       ws.onopen = () => {
         console.log('Connected to Dr. Claude AI');
@@ -113,7 +185,7 @@ export default function App() {
 
       ws.onmessage = (event) => {
         try {
-          const data = JSON.parse(event.data);
+          const data = decodeFrame(event.data);
           console.log('Received from backend:', data);
           handleAgentMessage(data);
         } catch (error) {
@@ -160,6 +232,15 @@ export default function App() {
       case 'connection_established':
         console.log('Connection established:', data.message);
         break;
+      case 'event_replay': {
+        console.log(`Replaying ${data.events.length} recent events`);
+        // Pick up the latest agent response from calls already in progress
+        const lastResponse = [...data.events].reverse().find((item) => item.event === 'agent_response');
+        if (lastResponse) {
+          setAgentResponse(lastResponse.text);
+        }
+        break;
+      }
       case 'pong':
         console.log('Pong received from backend');
         break;
@@ -171,6 +252,44 @@ export default function App() {
         setShowAuthModal(false);
         // Auto-display conversation history without requiring user to click
         break;
+      case 'history_start':
+        console.log('Streaming conversation history:', data.history.sessionId);
+        setConversationHistory(
+          resumeSyncedHistory(syncedHistoryRef.current[data.history.phoneNumber], data.history, data.since_seq)
+        );
+        setIsLoadingHistory(false);
+        setShowHistory(true);
+        setShowAuthModal(false);
+        break;
+      case 'history_chunk':
+      case 'history_tail':
+        setConversationHistory((current) => appendHistoryEntries(current, data.session_id, data.entries));
+        break;
+      case 'history_sync_end':
+        console.log(`History synced to seq ${data.last_seq}${data.live ? ', following live' : ''}`);
+        setConversationHistory((current) => (
+          current && current.sessionId === data.session_id
+            ? { ...current, isStreaming: false, lastSeq: data.last_seq }
+            : current
+        ));
+        break;
+      case 'history_tail_end':
+        console.log(`Stopped following ${data.session_id}: ${data.reason}`);
+        break;
+      case 'history_end':
+      case 'recent_conversations_end':
+        setConversationHistory((current) => (current ? { ...current, isStreaming: false } : current));
+        break;
+      case 'recent_conversations_page':
+        console.log('Received recent conversations page:', data.conversations.length);
+        if (data.conversations.length > 0) {
+          // Messages for the most recent conversation follow as history_chunk events
+          setConversationHistory(startStreamedHistory(data.conversations[0]));
+          setShowHistory(true);
+          setShowAuthModal(false);
+        }
+        setIsLoadingHistory(false);
+        break;
       case 'history_error':
         console.log('History error:', data.message);
         setIsLoadingHistory(false);
@@ -207,10 +326,19 @@ export default function App() {
 
     if (wsRef.current && wsRef.current.readyState === WebSocket.OPEN) {
       console.log(`Requesting history for ${phoneNumber} with passcode ${passcode}`);
+      // Only entries after the last one we have, then new ones while the call
+      // goes on. The backend picks the newest session for these credentials
+      // and only sends a delta if that is still the call we have cached.
+      const cached = syncedHistoryRef.current[phoneNumber];
+      const hasSeq = cached && cached.lastSeq != null;
       wsRef.current.send(JSON.stringify({
-        command: 'fetch_history',
+        command: 'sync_history',
         phone_number: phoneNumber,
         passcode: passcode,
+        since_session_id: hasSeq ? cached.sessionId : undefined,
+        since_seq: hasSeq ? cached.lastSeq : undefined,
+        live: true,
+        page_size: HISTORY_PAGE_SIZE,
       }));
     } else {
       setIsLoadingHistory(false);
@@ -228,6 +356,9 @@ export default function App() {
   };
 
   const closeHistoryViewer = () => {
+    if (conversationHistory && wsRef.current && wsRef.current.readyState === WebSocket.OPEN) {
+      wsRef.current.send(JSON.stringify({ command: 'stop_sync', session_id: conversationHistory.sessionId }));
+    }
     setShowHistory(false);
     setConversationHistory(null);
   };
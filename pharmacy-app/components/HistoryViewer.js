@@ -180,8 +180,15 @@ const HistoryViewer = ({ history, onClose, isLoading }) => {
           </View>
         )}
 
+        {history.isStreaming && (
+          <View style={styles.emptySection}>
+            <Text style={styles.emptyText}>Loading more messages...</Text>
+          </View>
+        )}
+
         {/* Empty state for messages */}
-        {(!history.messages || history.messages.length === 0) &&
+        {!history.isStreaming &&
+         (!history.messages || history.messages.length === 0) &&
          (!history.functionCalls || history.functionCalls.length === 0) && (
           <View style={styles.emptySection}>
             <Text style={styles.emptyText}>No conversation data available</Text>
@@ -0,0 +1,64 @@
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from single_flight import SingleFlight
+
+
+def _kind(key: Hashable) -> Hashable:
+    """The first element of a tuple key, e.g. ``"recent"`` in ``("recent", 5, "json")``."""
+    return key[0] if isinstance(key, tuple) and key else key
+
+
+class ResponseCache:
+    """Responses shared by every client until the data behind them changes.
+
+    ``get_or_build`` returns the cached value (typically an encoded frame)
+    for ``key`` or builds it once, with concurrent misses for the same key
+    waiting on the same build. ``invalidate`` drops everything, or with a
+    ``kind`` only the keys that start with it; a build that was already
+    running when it was called is still returned to its waiters but not
+    stored. ``ttl`` is a backstop for writes made by other processes.
+    """
+
+    def __init__(self, *, ttl: Optional[float] = None):
+        self.ttl = ttl if ttl is not None else float(os.getenv("RECENT_CONVERSATIONS_CACHE_TTL", "30"))
+        self._entries: Dict[Hashable, Tuple[Any, float]] = {}
+        self._flights = SingleFlight()
+        self.generation = 0
+        self._kind_generations: Dict[Hashable, int] = {}
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "invalidations": 0}
+
+    def invalidate(self, kind: Optional[Hashable] = None):
+        if kind is None:
+            self.generation += 1
+            self._entries.clear()
+        else:
+            self._kind_generations[kind] = self._kind_generations.get(kind, 0) + 1
+            for key in [key for key in self._entries if _kind(key) == kind]:
+                del self._entries[key]
+        self.stats["invalidations"] += 1
+
+    def _generation(self, key: Hashable) -> Tuple[int, int]:
+        return self.generation, self._kind_generations.get(_kind(key), 0)
+
+    async def get_or_build(self, key: Hashable, build: Callable[[], Awaitable[Any]]) -> Any:
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] > time.monotonic():
+            self.stats["hits"] += 1
+            return entry[0]
+
+        if key in self._flights:
+            self.stats["coalesced"] += 1
+            return await self._flights.run(key, build)
+
+        self.stats["misses"] += 1
+        generation = self._generation(key)
+
+        async def build_and_store():
+            payload = await build()
+            if generation == self._generation(key):
+                self._entries[key] = (payload, time.monotonic() + self.ttl)
+            return payload
+
+        return await self._flights.run(key, build_and_store)
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Per-message storage layout for call session history.
+
+With ``SESSION_STORAGE_LAYOUT=collection`` messages and function calls are
+stored one document each in ``session_messages``, keyed by
+``(sessionId, seq)``, instead of being ``$push``ed onto ever-growing arrays
+in ``call_sessions``. Session documents then only carry metadata plus a
+``messageCount``, and history is read a page at a time in ``seq`` order.
+
+``migrate`` copies the embedded arrays of existing ``call_sessions``
+documents into ``session_messages``. It is idempotent: a message's ``seq``
+is its position in the merged, timestamp-ordered history, so re-running it
+only skips what was already copied. Switch the app to
+``SESSION_STORAGE_LAYOUT=collection`` first: migrated sessions are read
+from ``session_messages`` only, so anything an embedded-layout writer
+pushed onto their arrays afterwards would be hidden. ``migrate`` refuses
+to run while the layout is still ``embedded``.
+
+Usage:
+    python session_messages.py migrate [--drop-arrays] [--dry-run]
+"""
+import argparse
+import asyncio
+import itertools
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import BulkWriteError
+
+EMBEDDED = "embedded"
+COLLECTION = "collection"
+SESSION_MESSAGES = "session_messages"
+
+# call_sessions array field -> session_messages kind
+KINDS = {"messages": "message", "functionCalls": "function_call"}
+FIELDS = {kind: field for field, kind in KINDS.items()}
+
+DUPLICATE_KEY = 11000
+
+
+def storage_layout() -> str:
+    layout = os.getenv("SESSION_STORAGE_LAYOUT", EMBEDDED)
+    if layout not in (EMBEDDED, COLLECTION):
+        raise ValueError(f"Unknown SESSION_STORAGE_LAYOUT '{layout}'")
+    return layout
+
+
+async def ensure_indexes(messages):
+    await messages.create_index([("sessionId", ASCENDING), ("seq", ASCENDING)], unique=True)
+    await messages.create_index([("sessionId", ASCENDING), ("kind", ASCENDING), ("seq", ASCENDING)])
+
+
+def message_document(session_id: str, seq: int, field: str, entry: dict) -> dict:
+    return {**entry, "sessionId": session_id, "seq": seq, "kind": KINDS[field]}
+
+
+async def insert_documents(messages, documents: List[dict]) -> int:
+    """Insert ``documents``, treating already-stored ``(sessionId, seq)`` as done."""
+    if not documents:
+        return 0
+    try:
+        result = await messages.insert_many(documents, ordered=False)
+        return len(result.inserted_ids)
+    except BulkWriteError as exc:
+        errors = exc.details.get("writeErrors", [])
+        if any(error.get("code") != DUPLICATE_KEY for error in errors):
+            raise
+        return exc.details.get("nInserted", 0)
+
+
+class SequenceAllocator:
+    """Hands out consecutive ``seq`` numbers per session.
+
+    The first allocation for a session resumes after the highest ``seq``
+    already stored, so a restarted process never reuses one.
+    """
+
+    def __init__(self):
+        self._next: Dict[str, int] = {}
+
+    async def reserve(self, messages, session_id: str, count: int) -> int:
+        start = self._next.get(session_id)
+        if start is None:
+            last = await messages.find_one(
+                {"sessionId": session_id},
+                projection={"seq": 1},
+                sort=[("seq", DESCENDING)],
+            )
+            start = last["seq"] + 1 if last else 0
+        self._next[session_id] = start + count
+        return start
+
+    def advance(self, session_id: str, seq: int):
+        """Note that ``seq`` was used by an entry numbered elsewhere."""
+        if session_id in self._next:
+            self._next[session_id] = max(self._next[session_id], seq + 1)
+
+    def forget(self, session_id: str):
+        self._next.pop(session_id, None)
+
+
+async def read_page(
+    messages,
+    session_id: str,
+    *,
+    after_seq: Optional[int] = None,
+    limit: int = 100,
+    kind: Optional[str] = None,
+    projection: Optional[Dict[str, Any]] = None,
+) -> Tuple[List[dict], Optional[int]]:
+    """One page of a session's history in ``seq`` order, plus the next cursor.
+
+    The cursor is the last ``seq`` returned, or ``None`` when there is
+    nothing more to read.
+    """
+    query: Dict[str, Any] = {"sessionId": session_id}
+    if after_seq is not None:
+        query["seq"] = {"$gt": after_seq}
+    if kind is not None:
+        query["kind"] = kind
+
+    cursor = messages.find(query, projection=projection or {"_id": 0}).sort("seq", ASCENDING).limit(limit + 1)
+    documents = await cursor.to_list(length=limit + 1)
+    has_more = len(documents) > limit
+    documents = documents[:limit]
+    next_cursor = documents[-1]["seq"] if has_more and documents else None
+    return documents, next_cursor
+
+
+async def load_embedded(messages, session_id: str, page_size: int = 500) -> Dict[str, List[dict]]:
+    """Rebuild the legacy ``messages`` / ``functionCalls`` arrays for a session."""
+    arrays: Dict[str, List[dict]] = {field: [] for field in KINDS}
+    after_seq = None
+    while True:
+        page, after_seq = await read_page(messages, session_id, after_seq=after_seq, limit=page_size)
+        for document in page:
+            field = FIELDS.get(document.pop("kind", None), "messages")
+            document.pop("sessionId", None)
+            arrays[field].append(document)
+        if after_seq is None:
+            return arrays
+
+
+def _timestamp_key(entry: dict):
+    value = entry.get("timestamp")
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    return datetime.min.replace(tzinfo=timezone.utc)
+
+
+def embedded_documents(session: dict) -> Iterable[dict]:
+    """``session_messages`` documents for a session's embedded arrays."""
+    entries = [
+        (field, entry)
+        for field in KINDS
+        for entry in session.get(field) or []
+    ]
+    # Stable sort: entries without a timestamp keep their array order
+    entries.sort(key=lambda item: _timestamp_key(item[1]))
+    # Entries the writer already numbered keep their seq; older ones take
+    # the free numbers in timestamp order, the same way on every run
+    taken = {entry["seq"] for _, entry in entries if "seq" in entry}
+    free = (seq for seq in itertools.count() if seq not in taken)
+    for field, entry in entries:
+        seq = entry["seq"] if "seq" in entry else next(free)
+        yield message_document(session["sessionId"], seq, field, entry)
+
+
+async def migrate(
+    db,
+    *,
+    drop_arrays: bool = False,
+    dry_run: bool = False,
+    batch_size: int = 1000,
+    layout: Optional[str] = None,
+) -> dict:
+    layout = layout or storage_layout()
+    if layout != COLLECTION and not dry_run:
+        raise ValueError(
+            "SESSION_STORAGE_LAYOUT is 'embedded': switch the app to the 'collection' layout "
+            "before migrating, or its writes to migrated sessions would be lost"
+        )
+    sessions = db["call_sessions"]
+    messages = db[SESSION_MESSAGES]
+    if not dry_run:
+        await ensure_indexes(messages)
+
+    summary = {"sessions": 0, "messages": 0, "inserted": 0}
+    query = {"$or": [{"messages.0": {"$exists": True}}, {"functionCalls.0": {"$exists": True}}]}
+    projection = {"sessionId": 1, "messages": 1, "functionCalls": 1}
+
+    async for session in sessions.find(query, projection=projection):
+        documents = list(embedded_documents(session))
+        summary["sessions"] += 1
+        summary["messages"] += len(documents)
+        if dry_run:
+            continue
+
+        for start in range(0, len(documents), batch_size):
+            summary["inserted"] += await insert_documents(messages, documents[start:start + batch_size])
+
+        # $max, like the writer: never lower a count it has already raised
+        update: Dict[str, Any] = {
+            "$set": {"messagesLayout": COLLECTION},
+            "$max": {"messageCount": max(document["seq"] for document in documents) + 1},
+        }
+        if drop_arrays:
+            update["$unset"] = {field: "" for field in KINDS}
+        await sessions.update_one({"_id": session["_id"]}, update)
+
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the session_messages history layout")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    migrate_parser = commands.add_parser("migrate", help="copy embedded call_sessions arrays into session_messages")
+    migrate_parser.add_argument("--drop-arrays", action="store_true", help="remove the embedded arrays once copied")
+    migrate_parser.add_argument("--dry-run", action="store_true", help="only count what would be copied")
+
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv()
+    mongo_uri = os.getenv("MONGODB_URI")
+    if not mongo_uri:
+        parser.error("MONGODB_URI is not set")
+
+    async def run():
+        client = AsyncIOMotorClient(mongo_uri, serverSelectionTimeoutMS=5000)
+        try:
+            db = client[os.getenv("MONGODB_DB_NAME", "agent")]
+            return await migrate(db, drop_arrays=args.drop_arrays, dry_run=args.dry_run)
+        finally:
+            client.close()
+
+    try:
+        summary = asyncio.run(run())
+    except ValueError as exc:
+        parser.error(str(exc))
+    print(
+        f"✅ {summary['sessions']} sessions, {summary['messages']} messages, "
+        f"{summary['inserted']} newly inserted"
+    )
+
+
+if __name__ == "__main__":
+    main()
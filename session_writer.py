@@ -0,0 +1,274 @@
+import asyncio
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from storage import Batch, SessionStorage
+
+# Lifecycle writes queued per session
+START = "start"
+END = "end"
+
+
+class SessionWriteBehind:
+    """Buffer per-session appends and write them to storage in batches.
+
+    Messages and function calls are held in memory and handed to
+    ``storage.append_entries`` as one batch (a single ``bulk_write`` for
+    Mongo, one transaction for SQLite) once ``batch_size`` entries are
+    pending or ``flush_interval_ms`` after the first one arrived.
+    ``flush(session_id)`` writes a session out immediately, which
+    ``end_session`` relies on. Failed batches are kept for the next flush,
+    up to ``max_pending`` entries.
+
+    Session upserts and completions go through the same queue and are
+    retried the same way, but never dropped. A session's entries wait
+    for its upsert, and its completion waits for its entries, so a call
+    that starts while the database is unreachable still gets its caller
+    details and status once it is back.
+
+    Entries are numbered as they are added: each session's ``seq``
+    continues from the highest one in storage, so clients can ask for
+    everything after the last entry they saw.
+    """
+
+    def __init__(
+        self,
+        storage: SessionStorage,
+        *,
+        batch_size: Optional[int] = None,
+        flush_interval_ms: Optional[int] = None,
+        max_pending: Optional[int] = None,
+    ):
+        self.storage = storage
+        self.batch_size = batch_size or int(os.getenv("PERSIST_BATCH_SIZE", "50"))
+        if flush_interval_ms is None:
+            flush_interval_ms = int(os.getenv("PERSIST_FLUSH_INTERVAL_MS", "500"))
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_pending = max_pending or int(os.getenv("PERSIST_MAX_PENDING", "5000"))
+
+        # session_id -> (field, entry) in arrival order
+        self._pending: Batch = {}
+        self.pending_writes = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # Created on first flush so the writer can be built before the loop runs
+        self._lock: Optional[asyncio.Lock] = None
+        self._flush_tasks = set()
+        self._flush_listeners: List[Callable[[], Any]] = []
+        self._write_listeners: List[Callable[[str, str, dict], Any]] = []
+        # session_id -> next seq to hand out, once read from storage
+        self._next_seq: Dict[str, int] = {}
+        # session_id -> unwritten lifecycle writes: START's record, END's timestamp
+        self._lifecycle: Dict[str, Dict[str, Any]] = {}
+        self._session_listeners: List[Callable[[], Any]] = []
+
+        self.flushes = 0
+        self.written = 0
+        self.failed_flushes = 0
+        self.dropped = 0
+        self.session_writes = 0
+        self.failed_session_writes = 0
+        self._flush_seconds = 0.0
+        self._flush_max = 0.0
+
+    def on_flush(self, listener: Callable[[], Any]):
+        """Call ``listener`` after each batch that reached storage."""
+        self._flush_listeners.append(listener)
+
+    def on_write(self, listener: Callable[[str, str, dict], Any]):
+        """Call ``listener(session_id, field, entry)`` for each entry once storage has it."""
+        self._write_listeners.append(listener)
+
+    def on_session_write(self, listener: Callable[[], Any]):
+        """Call ``listener`` after each session upsert or completion that reached storage."""
+        self._session_listeners.append(listener)
+
+    async def start_session(self, session_id: str, record: dict):
+        """Queue the session's upsert and try to write it now."""
+        self._lifecycle.setdefault(session_id, {})[START] = record
+        await self.flush(session_id)
+
+    async def complete_session(self, session_id: str, ended_at):
+        """Write the session's pending entries, then mark it completed."""
+        self._lifecycle.setdefault(session_id, {})[END] = ended_at
+        await self.flush(session_id)
+
+    async def add(self, session_id: str, field: str, entry: dict):
+        self._pending.setdefault(session_id, []).append((field, entry))
+        self.pending_writes += 1
+        self._enforce_cap()
+        await self._number(session_id)
+        if self.pending_writes >= self.batch_size:
+            await self.flush()
+        else:
+            self._schedule()
+
+    async def _number(self, session_id: str, entries: Optional[list] = None):
+        """Give the session's unnumbered pending entries (or ``entries``) their ``seq``."""
+        if entries is None:
+            entries = self._pending.get(session_id, [])
+        if all("seq" in entry for _, entry in entries):
+            return
+        if session_id not in self._next_seq:
+            try:
+                last = await self.storage.last_seq(session_id) if self.storage.configured else None
+            except Exception:
+                # Storage numbers them when they are written instead; we try
+                # again with the next entry
+                return
+            # Another add may have read it while we waited
+            self._next_seq.setdefault(session_id, 0 if last is None else last + 1)
+        for _, entry in entries:
+            if "seq" not in entry:
+                entry["seq"] = self._next_seq[session_id]
+                self._next_seq[session_id] += 1
+
+    def _schedule(self):
+        if self._timer is None and (self._pending or self._lifecycle):
+            self._timer = asyncio.get_running_loop().call_later(self.flush_interval, self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        task = asyncio.ensure_future(self.flush())
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_done)
+
+    def _flush_done(self, task):
+        self._flush_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"⚠️ Session write-behind flush failed: {task.exception()}")
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _take(self, session_id: Optional[str]) -> Batch:
+        batch = {}
+        for sid in list(self._pending) if session_id is None else [session_id]:
+            if START in self._lifecycle.get(sid, ()):
+                # Written before the upsert, they would create the session
+                # without its caller details
+                continue
+            entries = self._pending.pop(sid, None)
+            if entries:
+                batch[sid] = entries
+        self.pending_writes -= sum(len(entries) for entries in batch.values())
+        return batch
+
+    def _requeue(self, batch: Batch):
+        # Older entries go back in front of anything that arrived meanwhile
+        for session_id, entries in batch.items():
+            self._pending[session_id] = entries + self._pending.get(session_id, [])
+            self.pending_writes += len(entries)
+        self._enforce_cap()
+
+    def _enforce_cap(self):
+        # The session that has waited longest goes first, as a whole
+        while self.pending_writes > self.max_pending and self._pending:
+            session_id = next(iter(self._pending))
+            dropped = len(self._pending.pop(session_id))
+            self.pending_writes -= dropped
+            self.dropped += dropped
+            print(f"⚠️ Dropped {dropped} unwritten entries for session '{session_id}'")
+
+    async def flush(self, session_id: Optional[str] = None) -> int:
+        """Write pending entries (all sessions, or just ``session_id``) now."""
+        # The lock keeps batches for a session in order across concurrent flushes
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if session_id is None:
+                self._cancel_timer()
+            if not self.storage.configured:
+                # Persistence is disabled; nothing will ever accept these
+                for sid in list(self._lifecycle) if session_id is None else [session_id]:
+                    self._lifecycle.pop(sid, None)
+                self._take(session_id)
+                return 0
+
+            await self._write_lifecycle(session_id, START)
+            batch = self._take(session_id)
+            if not batch:
+                await self._write_lifecycle(session_id, END)
+                self._schedule()
+                return 0
+
+            for sid, entries in batch.items():
+                await self._number(sid, entries)
+
+            count = sum(len(entries) for entries in batch.values())
+            started = time.perf_counter()
+            try:
+                # Raises while a configured database is unreachable, so the
+                # batch is kept for a retry
+                await self.storage.append_entries(batch)
+            except Exception as exc:
+                self.failed_flushes += 1
+                print(f"Failed to write {count} session entries: {exc}")
+                self._requeue(batch)
+                self._schedule()
+                return 0
+            elapsed = time.perf_counter() - started
+
+            self.flushes += 1
+            self.written += count
+            self._flush_seconds += elapsed
+            self._flush_max = max(self._flush_max, elapsed)
+            for listener in self._flush_listeners:
+                listener()
+            for sid, entries in batch.items():
+                for field, entry in entries:
+                    for listener in self._write_listeners:
+                        listener(sid, field, entry)
+            await self._write_lifecycle(session_id, END)
+            self._schedule()
+            return count
+
+    async def _write_lifecycle(self, session_id: Optional[str], step: str):
+        """Write the queued ``step`` for one session or all; failures stay queued."""
+        for sid in list(self._lifecycle) if session_id is None else [session_id]:
+            steps = self._lifecycle.get(sid)
+            if not steps or step not in steps:
+                continue
+            if step == END and (START in steps or sid in self._pending):
+                # Completed only once everything before it is stored
+                continue
+            try:
+                if step == START:
+                    await self.storage.upsert_session(sid, steps[START])
+                else:
+                    await self.storage.complete_session(sid, steps[END])
+            except Exception as exc:
+                self.failed_session_writes += 1
+                if step == START:
+                    print(f"Failed to upsert session '{sid}': {exc}")
+                else:
+                    print(f"Failed to mark session '{sid}' complete: {exc}")
+                continue
+            del steps[step]
+            if not steps:
+                del self._lifecycle[sid]
+            self.session_writes += 1
+            for listener in self._session_listeners:
+                listener()
+
+    def forget(self, session_id: str):
+        """Drop per-session state once a call has ended and been flushed."""
+        self._next_seq.pop(session_id, None)
+        self.storage.forget(session_id)
+
+    def stats(self) -> dict:
+        return {
+            "pending_writes": self.pending_writes,
+            "pending_sessions": len(self._pending),
+            "flushes": self.flushes,
+            "written": self.written,
+            "failed_flushes": self.failed_flushes,
+            "dropped": self.dropped,
+            "pending_session_writes": sum(len(steps) for steps in self._lifecycle.values()),
+            "session_writes": self.session_writes,
+            "failed_session_writes": self.failed_session_writes,
+            "flush_ms_avg": round(self._flush_seconds / self.flushes * 1000, 2) if self.flushes else 0.0,
+            "flush_ms_max": round(self._flush_max * 1000, 2),
+        }
@@ -0,0 +1,41 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """At most one build per key at a time; concurrent callers share its outcome.
+
+    The first caller for a key runs ``build``; anyone asking for the same
+    key meanwhile waits on that result (or exception) instead of starting
+    another. Waiters are shielded, so one of them being cancelled doesn't
+    cancel the build for the others.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Whether a build for ``key`` is running, i.e. ``run`` would join it."""
+        return key in self._inflight
+
+    async def run(self, key: Hashable, build: Callable[[], Awaitable[Any]]) -> Any:
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await build()
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            # Mark retrieved so a build with no waiters doesn't log a warning
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
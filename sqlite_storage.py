@@ -0,0 +1,380 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+
+import history_pages
+import session_messages
+from storage import Batch, SessionStorage
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS call_sessions (
+    session_id TEXT PRIMARY KEY,
+    call_sid TEXT,
+    phone_number TEXT,
+    username TEXT,
+    passcode_hash TEXT,
+    status TEXT NOT NULL DEFAULT 'in_progress',
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    ended_at TEXT,
+    message_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS call_sessions_by_credentials
+    ON call_sessions (phone_number, passcode_hash, updated_at DESC);
+CREATE INDEX IF NOT EXISTS call_sessions_by_created
+    ON call_sessions (created_at DESC, session_id DESC);
+CREATE TABLE IF NOT EXISTS session_messages (
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    timestamp TEXT,
+    body TEXT NOT NULL,
+    PRIMARY KEY (session_id, seq)
+) WITHOUT ROWID;
+"""
+
+# Session document field -> column
+COLUMNS = {
+    "sessionId": "session_id",
+    "callSid": "call_sid",
+    "phoneNumber": "phone_number",
+    "username": "username",
+    "passcodeHash": "passcode_hash",
+    "status": "status",
+    "createdAt": "created_at",
+    "updatedAt": "updated_at",
+    "endedAt": "ended_at",
+    "messageCount": "message_count",
+}
+DATETIME_FIELDS = ("createdAt", "updatedAt", "endedAt")
+# Everything in history_pages.SUMMARY_PROJECTION; the passcode hash is never read back
+SUMMARY_FIELDS = [field for field in COLUMNS if field != "passcodeHash"]
+SUMMARY_COLUMNS = ", ".join(COLUMNS[field] for field in SUMMARY_FIELDS)
+
+
+def _to_text(value: Optional[datetime]) -> Optional[str]:
+    """UTC ISO text with fixed precision, so the columns sort chronologically."""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).isoformat(timespec="microseconds")
+
+
+def _from_text(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value is not None else None
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serialisable")
+
+
+class SQLiteStorage(SessionStorage):
+    """Call history in a local SQLite file, for single-node deployments
+    and test rigs that don't run MongoDB.
+
+    The database runs in WAL mode so history reads don't block the
+    writer, and each write-behind batch is one transaction with a single
+    ``executemany`` insert. Entries are stored one row each keyed by
+    ``(session_id, seq)``, so sessions look like Mongo's ``collection``
+    layout to clients and page by ``seq:<n>`` cursors.
+
+    sqlite3 calls block, so they run on a worker thread; one connection
+    is shared and serialised by a lock.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: Optional[str] = None, *, synchronous: Optional[str] = None):
+        super().__init__()
+        self.path = path or os.getenv("SQLITE_HISTORY_PATH", "call_history.db")
+        # NORMAL is durable across crashes in WAL mode; FULL also survives power loss
+        self.synchronous = synchronous or os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._start_lock: Optional[asyncio.Lock] = None
+
+        self.transactions = 0
+        self.rows_written = 0
+        self._write_seconds = 0.0
+        self._write_max = 0.0
+
+    @property
+    def configured(self) -> bool:
+        return True
+
+    @property
+    def available(self) -> bool:
+        return self._conn is not None
+
+    async def start(self):
+        if self._conn is not None:
+            return
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+        async with self._start_lock:
+            if self._conn is not None:
+                return
+            self._conn = await asyncio.to_thread(self._open)
+        print(f"SQLite history storage ready at '{self.path}'.")
+        self._notify_available()
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        conn.execute("PRAGMA busy_timeout=5000")
+        conn.executescript(SCHEMA)
+        conn.commit()
+        return conn
+
+    async def close(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            with self._lock:
+                conn.close()
+
+    async def _run(self, func: Callable[..., Any], *args):
+        if self._conn is None:
+            await self.start()
+        return await asyncio.to_thread(self._locked, func, *args)
+
+    def _locked(self, func: Callable[..., Any], *args):
+        with self._lock:
+            return func(self._conn, *args)
+
+    async def upsert_session(self, session_id: str, record: dict):
+        await self._run(self._upsert_session, session_id, record)
+
+    @staticmethod
+    def _upsert_session(conn: sqlite3.Connection, session_id: str, record: dict):
+        now = _to_text(record["timestamp"])
+        with conn:
+            conn.execute(
+                "INSERT INTO call_sessions (session_id, call_sid, phone_number, username, passcode_hash,"
+                " status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, 'in_progress', ?, ?)"
+                " ON CONFLICT (session_id) DO UPDATE SET phone_number = excluded.phone_number,"
+                " username = excluded.username, passcode_hash = excluded.passcode_hash,"
+                " status = 'in_progress', updated_at = excluded.updated_at",
+                (
+                    session_id,
+                    record["callSid"],
+                    record["phoneNumber"],
+                    record["username"],
+                    record["passcodeHash"],
+                    now,
+                    now,
+                ),
+            )
+
+    async def complete_session(self, session_id: str, ended_at: datetime):
+        await self.update_session(session_id, {"status": "completed", "endedAt": ended_at, "updatedAt": ended_at})
+
+    async def update_session(self, session_id: str, fields: dict) -> bool:
+        return await self._run(self._update_session, session_id, fields)
+
+    @staticmethod
+    def _update_session(conn: sqlite3.Connection, session_id: str, fields: dict) -> bool:
+        assignments = ", ".join(f"{COLUMNS[field]} = ?" for field in fields)
+        values = [_to_text(value) if field in DATETIME_FIELDS else value for field, value in fields.items()]
+        with conn:
+            cursor = conn.execute(
+                f"UPDATE call_sessions SET {assignments} WHERE session_id = ?", (*values, session_id)
+            )
+        return cursor.rowcount > 0
+
+    async def append_entries(self, batch: Batch):
+        started = time.perf_counter()
+        count = await self._run(self._append_entries, batch)
+        elapsed = time.perf_counter() - started
+        self.transactions += 1
+        self.rows_written += count
+        self._write_seconds += elapsed
+        self._write_max = max(self._write_max, elapsed)
+
+    @staticmethod
+    def _append_entries(conn: sqlite3.Connection, batch: Batch) -> int:
+        now = _to_text(datetime.now(timezone.utc))
+        rows = []
+        with conn:
+            for sid, entries in batch.items():
+                # Entries the writer couldn't number are numbered inside the
+                # transaction, so a failed batch leaves no gaps
+                (next_seq,) = conn.execute(
+                    "SELECT COALESCE(MAX(seq), -1) + 1 FROM session_messages WHERE session_id = ?", (sid,)
+                ).fetchone()
+                for field, entry in entries:
+                    seq = entry.get("seq")
+                    if seq is None:
+                        seq = next_seq
+                    next_seq = max(next_seq, seq + 1)
+                    timestamp = entry.get("timestamp")
+                    if isinstance(timestamp, datetime):
+                        skip = ("timestamp", "seq", "kind")
+                        timestamp = _to_text(timestamp)
+                    else:
+                        skip = ("seq", "kind")
+                        timestamp = None
+                    body = {key: value for key, value in entry.items() if key not in skip}
+                    rows.append(
+                        (sid, seq, session_messages.KINDS[field], timestamp, json.dumps(body, default=_json_default))
+                    )
+                # Appends for a session nobody started still get a row, like Mongo's upsert
+                conn.execute(
+                    "INSERT INTO call_sessions (session_id, created_at, updated_at, message_count)"
+                    " VALUES (?, ?, ?, ?) ON CONFLICT (session_id) DO UPDATE SET"
+                    " updated_at = excluded.updated_at,"
+                    " message_count = message_count + excluded.message_count",
+                    (sid, now, now, len(entries)),
+                )
+            conn.executemany(
+                "INSERT INTO session_messages (session_id, seq, kind, timestamp, body) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+        return len(rows)
+
+    async def last_seq(self, session_id: str) -> Optional[int]:
+        return await self._run(self._last_seq, session_id)
+
+    @staticmethod
+    def _last_seq(conn: sqlite3.Connection, session_id: str) -> Optional[int]:
+        (seq,) = conn.execute("SELECT MAX(seq) FROM session_messages WHERE session_id = ?", (session_id,)).fetchone()
+        return seq
+
+    @staticmethod
+    def _session_document(row: tuple) -> dict:
+        document = dict(zip(SUMMARY_FIELDS, row))
+        for field in DATETIME_FIELDS:
+            document[field] = _from_text(document[field])
+        document["messagesLayout"] = session_messages.COLLECTION
+        return document
+
+    @staticmethod
+    def _entry(seq: int, kind: str, timestamp: Optional[str], body: str) -> dict:
+        entry = json.loads(body)
+        entry.update(seq=seq, kind=kind)
+        if timestamp is not None:
+            entry["timestamp"] = _from_text(timestamp)
+        return entry
+
+    @classmethod
+    def _read_entries(cls, conn: sqlite3.Connection, session_id: str, after_seq: int, limit: int) -> List[dict]:
+        rows = conn.execute(
+            "SELECT seq, kind, timestamp, body FROM session_messages"
+            " WHERE session_id = ? AND seq > ? ORDER BY seq LIMIT ?",
+            (session_id, after_seq, limit),
+        ).fetchall()
+        return [cls._entry(*row) for row in rows]
+
+    @classmethod
+    def _attach_messages(cls, conn: sqlite3.Connection, document: dict):
+        arrays: Dict[str, List[dict]] = {field: [] for field in session_messages.KINDS}
+        for entry in cls._read_entries(conn, document["sessionId"], -1, -1):
+            arrays[session_messages.FIELDS[entry.pop("kind")]].append(entry)
+        document.update(arrays)
+
+    async def find_session(
+        self,
+        phone_number: str,
+        passcode_hash: str,
+        session_id: Optional[str] = None,
+        *,
+        with_history: bool = False,
+    ) -> Optional[dict]:
+        return await self._run(self._find_session, phone_number, passcode_hash, session_id, with_history)
+
+    @classmethod
+    def _find_session(
+        cls,
+        conn: sqlite3.Connection,
+        phone_number: str,
+        passcode_hash: str,
+        session_id: Optional[str],
+        with_history: bool,
+    ) -> Optional[dict]:
+        query = f"SELECT {SUMMARY_COLUMNS} FROM call_sessions WHERE phone_number = ? AND passcode_hash = ?"
+        params: List[Any] = [phone_number, passcode_hash]
+        if session_id:
+            query += " AND session_id = ?"
+            params.append(session_id)
+        row = conn.execute(query + " ORDER BY updated_at DESC LIMIT 1", params).fetchone()
+        if row is None:
+            return None
+        document = cls._session_document(row)
+        if with_history:
+            cls._attach_messages(conn, document)
+        return document
+
+    async def history_pages(
+        self,
+        session: dict,
+        *,
+        size: int,
+        cursor: Optional[str] = None,
+        fields: Optional[List[str]] = None,
+    ) -> AsyncIterator[Tuple[List[dict], Optional[str]]]:
+        _, after_seq = history_pages.parse_history_cursor(cursor, session_messages.COLLECTION)
+        while True:
+            # One extra row tells us whether there is another page
+            entries = await self._run(self._read_entries, session["sessionId"], after_seq, size + 1)
+            has_more = len(entries) > size
+            entries = entries[:size]
+            next_cursor = None
+            if has_more and entries:
+                after_seq = entries[-1]["seq"]
+                next_cursor = f"seq:{after_seq}"
+            yield [history_pages.project_entry(entry, fields) for entry in entries], next_cursor
+            if next_cursor is None:
+                return
+
+    async def recent_sessions(self, *, limit: int, cursor: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+        found = await self._run(self._recent_sessions, limit + 1, history_pages.parse_recent_cursor(cursor), False)
+        page = found[:limit]
+        next_cursor = history_pages.recent_cursor(page[-1]) if len(found) > limit and page else None
+        return page, next_cursor
+
+    async def recent_conversations(self, limit: int) -> List[dict]:
+        return await self._run(self._recent_sessions, limit, None, True)
+
+    @classmethod
+    def _recent_sessions(
+        cls,
+        conn: sqlite3.Connection,
+        limit: int,
+        position: Optional[Tuple[datetime, str]],
+        with_history: bool,
+    ) -> List[dict]:
+        query = f"SELECT {SUMMARY_COLUMNS} FROM call_sessions"
+        params: List[Any] = []
+        if position is not None:
+            created_at, session_id = position
+            query += " WHERE created_at < ? OR (created_at = ? AND session_id < ?)"
+            params += [_to_text(created_at), _to_text(created_at), session_id]
+        query += " ORDER BY created_at DESC, session_id DESC LIMIT ?"
+        documents = [cls._session_document(row) for row in conn.execute(query, (*params, limit))]
+        if with_history:
+            for document in documents:
+                cls._attach_messages(conn, document)
+        return documents
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "path": self.path,
+            "available": self.available,
+            "transactions": self.transactions,
+            "rows_written": self.rows_written,
+            "write_ms_avg": round(self._write_seconds / self.transactions * 1000, 2) if self.transactions else 0.0,
+            "write_ms_max": round(self._write_max * 1000, 2),
+        }
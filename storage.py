@@ -0,0 +1,144 @@
+import os
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+MONGO = "mongo"
+SQLITE = "sqlite"
+
+# session_id -> (array field, entry) in arrival order, as buffered by the writer
+Batch = Dict[str, List[Tuple[str, dict]]]
+
+
+class SessionStorage(ABC):
+    """Where call sessions and their history are kept.
+
+    ``MobileBridge`` and ``SessionWriteBehind`` only talk to this
+    interface. Session documents use the Mongo field names
+    (``sessionId``, ``createdAt``, ...) whatever the backend, and history
+    entries come back as dicts with ``timestamp`` as a ``datetime``.
+
+    Entries carry a per-session ``seq`` given by the writer; backends keep
+    it, and only number entries that arrive without one. Session upserts
+    and completions also go through the writer, which retries them in
+    order with the entries, so backends just raise when a write fails.
+
+    ``configured`` is false when persistence is switched off; ``available``
+    is false while a configured backend can't be reached yet.
+    """
+
+    name = "none"
+
+    def __init__(self):
+        self._listeners: List[Callable[[], Any]] = []
+
+    @property
+    def configured(self) -> bool:
+        return False
+
+    @property
+    def available(self) -> bool:
+        return False
+
+    def on_available(self, listener: Callable[[], Any]):
+        """Call ``listener()`` whenever the backend becomes usable."""
+        self._listeners.append(listener)
+        if self.available:
+            listener()
+
+    def _notify_available(self):
+        for listener in self._listeners:
+            listener()
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    @abstractmethod
+    async def upsert_session(self, session_id: str, record: dict):
+        """Create the session (or refresh its caller details) when a call starts."""
+
+    @abstractmethod
+    async def complete_session(self, session_id: str, ended_at):
+        """Mark the session completed at ``ended_at``."""
+
+    @abstractmethod
+    async def update_session(self, session_id: str, fields: dict) -> bool:
+        """``$set``-style update of session fields; false if there is no such session."""
+
+    @abstractmethod
+    async def append_entries(self, batch: Batch):
+        """Append a write-behind batch of messages and function calls."""
+
+    @abstractmethod
+    async def last_seq(self, session_id: str) -> Optional[int]:
+        """Highest ``seq`` stored for the session, or ``None`` if it has no numbered entries."""
+
+    @abstractmethod
+    async def find_session(
+        self,
+        phone_number: str,
+        passcode_hash: str,
+        session_id: Optional[str] = None,
+        *,
+        with_history: bool = False,
+    ) -> Optional[dict]:
+        """Newest matching session; with its ``messages``/``functionCalls`` if asked."""
+
+    @abstractmethod
+    def history_pages(
+        self,
+        session: dict,
+        *,
+        size: int,
+        cursor: Optional[str] = None,
+        fields: Optional[List[str]] = None,
+    ) -> AsyncIterator[Tuple[List[dict], Optional[str]]]:
+        """Yield ``(entries, next_cursor)`` pages, like ``history_pages.history_pages``.
+
+        A ``seq:<n>`` cursor resumes after entry ``n`` in any layout.
+        """
+
+    @abstractmethod
+    async def recent_sessions(self, *, limit: int, cursor: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+        """Session summaries newest first, plus the cursor for the next page."""
+
+    @abstractmethod
+    async def recent_conversations(self, limit: int) -> List[dict]:
+        """The newest sessions with their full history attached."""
+
+    def forget(self, session_id: str):
+        """Drop per-session state once a call has ended and been flushed."""
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name, "configured": self.configured, "available": self.available}
+
+
+def storage_backend() -> str:
+    """``SESSION_STORAGE``, defaulting to Mongo when ``MONGODB_URI`` is set and SQLite otherwise."""
+    backend = os.getenv("SESSION_STORAGE")
+    if not backend:
+        backend = MONGO if os.getenv("MONGODB_URI") else SQLITE
+        if backend == SQLITE:
+            print(
+                "⚠️ MONGODB_URI is not set: call history falls back to the local SQLite file "
+                f"'{os.getenv('SQLITE_HISTORY_PATH', 'call_history.db')}'. "
+                "Set SESSION_STORAGE=sqlite to choose it explicitly."
+            )
+    if backend not in (MONGO, SQLITE):
+        raise ValueError(f"Unknown SESSION_STORAGE '{backend}'")
+    return backend
+
+
+def open_storage(backend: Optional[str] = None) -> SessionStorage:
+    backend = backend or storage_backend()
+    if backend == SQLITE:
+        from sqlite_storage import SQLiteStorage
+
+        return SQLiteStorage()
+    if backend == MONGO:
+        from mongo_storage import MongoStorage
+
+        return MongoStorage()
+    raise ValueError(f"Unknown storage backend '{backend}'")
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Tests for outbound agent-audio coalescing toward Twilio
+"""
+import asyncio
+
+from audio_batcher import OutboundAudioBatcher
+
+
+def make_batcher(sent, **kwargs):
+    async def send(message):
+        sent.append(message)
+
+    return OutboundAudioBatcher(send, lambda audio: audio, **kwargs)
+
+
+def test_small_chunks_are_coalesced_into_frames():
+    async def run():
+        sent = []
+        batcher = make_batcher(sent, frame_ms=20, max_latency_ms=1000)
+        for _ in range(10):
+            await batcher.add(b"x" * 40)  # 5 ms each at 8 kHz
+        return sent, batcher.stats()
+
+    sent, stats = asyncio.run(run())
+    assert sent == [b"x" * 160, b"x" * 160]
+    assert stats == {"chunks_in": 10, "messages_out": 2}
+
+
+def test_large_chunks_are_not_split():
+    async def run():
+        sent = []
+        batcher = make_batcher(sent, frame_ms=20, max_latency_ms=1000)
+        await batcher.add(b"y" * 1000)
+        return sent
+
+    assert asyncio.run(run()) == [b"y" * 1000]
+
+
+def test_timer_bounds_latency():
+    async def run():
+        sent = []
+        batcher = make_batcher(sent, frame_ms=100, max_latency_ms=20)
+        await batcher.add(b"z" * 10)
+        await batcher.add(b"z" * 10)
+        await asyncio.sleep(0.1)
+        return sent
+
+    assert asyncio.run(run()) == [b"z" * 20]
+
+
+def test_clear_drops_pending_audio():
+    async def run():
+        sent = []
+        batcher = make_batcher(sent, frame_ms=100, max_latency_ms=20)
+        await batcher.add(b"stale")
+        batcher.clear()
+        await asyncio.sleep(0.05)
+        await batcher.flush()
+        return sent
+
+    assert asyncio.run(run()) == []
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"✅ {name}")
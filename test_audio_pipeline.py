@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Tests for the bounded inbound audio pipeline
+"""
+import asyncio
+
+from audio_pipeline import AudioPipeline
+
+
+def drain(pipeline):
+    async def run():
+        frames = []
+        while pipeline.qsize():
+            frames.append(await pipeline.get())
+        return frames
+
+    return asyncio.run(run())
+
+
+def test_drop_oldest_keeps_newest_audio():
+    pipeline = AudioPipeline(max_frames=3, max_age=0, policy="drop_oldest")
+    for i in range(5):
+        pipeline.put_nowait(bytes([i]))
+    assert drain(pipeline) == [b"\x02", b"\x03", b"\x04"]
+    stats = pipeline.stats()
+    assert stats["dropped_overflow"] == 2 and stats["sent"] == 3 and stats["max_depth"] == 3
+
+
+def test_drop_newest_keeps_queued_audio():
+    pipeline = AudioPipeline(max_frames=2, max_age=0, policy="drop_newest")
+    for i in range(4):
+        pipeline.put_nowait(bytes([i]))
+    assert drain(pipeline) == [b"\x00", b"\x01"]
+
+
+def test_merge_coalesces_into_tail():
+    pipeline = AudioPipeline(max_frames=2, max_age=0, policy="merge", merge_limit=3)
+    for i in range(6):
+        pipeline.put_nowait(bytes([i]))
+    # The full tail forces one drop of the oldest frame, then merging resumes
+    assert drain(pipeline) == [b"\x01\x02\x03", b"\x04\x05"]
+    stats = pipeline.stats()
+    assert stats["merged"] == 3 and stats["dropped_overflow"] == 1 and stats["sent"] == 5
+
+
+def test_evicting_a_merged_frame_counts_all_its_audio():
+    pipeline = AudioPipeline(max_frames=2, max_age=0, policy="merge", merge_limit=2)
+    for i in range(6):
+        pipeline.put_nowait(bytes([i]))
+    assert drain(pipeline) == [b"\x03\x04", b"\x05"]
+    stats = pipeline.stats()
+    # The second eviction drops the merged b"\x01\x02"
+    assert stats["dropped_overflow"] == 3
+    assert stats["enqueued"] == stats["sent"] + stats["dropped_overflow"]
+
+
+def test_stale_frames_are_skipped():
+    async def run():
+        pipeline = AudioPipeline(max_frames=10, max_age=0.05)
+        pipeline.put_nowait(b"old")
+        await asyncio.sleep(0.1)
+        pipeline.put_nowait(b"new")
+        return await pipeline.get(), pipeline.stats()
+
+    frame, stats = asyncio.run(run())
+    assert frame == b"new"
+    assert stats["dropped_stale"] == 1
+
+
+def test_get_waits_for_audio():
+    async def run():
+        pipeline = AudioPipeline(max_frames=10, max_age=0)
+        getter = asyncio.create_task(pipeline.get())
+        await asyncio.sleep(0.01)
+        assert not getter.done()
+        pipeline.put_nowait(b"frame")
+        return await asyncio.wait_for(getter, 1)
+
+    assert asyncio.run(run()) == b"frame"
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"✅ {name}")
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Tests for the cached, validated and hot-reloaded agent config
+"""
+import asyncio
+import json
+import os
+import tempfile
+
+from config_store import ConfigError, ConfigStore, validate_functions
+from medical_functions import FUNCTION_MAP
+
+
+def lookup(order_id: str):
+    return {"order_id": order_id}
+
+
+def make_config(name="lookup", properties=("order_id",), required=("order_id",)):
+    return {
+        "type": "Settings",
+        "agent": {
+            "think": {
+                "functions": [
+                    {
+                        "name": name,
+                        "parameters": {
+                            "type": "object",
+                            "properties": {prop: {"type": "string"} for prop in properties},
+                            "required": list(required),
+                        },
+                    }
+                ]
+            }
+        },
+    }
+
+
+def write(path, config):
+    with open(path, "w") as f:
+        json.dump(config, f)
+
+
+def test_shipped_config_matches_function_map():
+    with open("config.json") as f:
+        assert validate_functions(json.load(f), FUNCTION_MAP) == []
+
+
+def test_validation_reports_mismatches():
+    tools = {"lookup": lookup}
+    assert "not in FUNCTION_MAP" in validate_functions(make_config(name="other"), tools)[0]
+    assert "does not accept" in validate_functions(make_config(properties=("order_id", "x")), tools)[0]
+    assert "doesn't require" in validate_functions(make_config(required=()), tools)[0]
+
+
+def test_payload_is_cached_and_reloaded_on_change():
+    async def run(path):
+        write(path, make_config())
+        store = ConfigStore(path, {"lookup": lookup}, poll_interval=0)
+        reloads = []
+        store.on_reload(lambda: reloads.append(store.generation))
+
+        payload = store.get_payload()
+        assert store.get_payload() is payload
+        assert not await store.reload_if_changed()
+
+        config = make_config()
+        config["agent"]["greeting"] = "Hi"
+        write(path, config)
+        os.utime(path, (0, store._mtime + 10))
+        assert await store.reload_if_changed()
+        assert store.get()["agent"]["greeting"] == "Hi"
+
+        # A broken edit keeps the last good config
+        write(path, make_config(name="missing"))
+        os.utime(path, (0, store._mtime + 20))
+        assert not await store.reload_if_changed()
+        assert store.get()["agent"]["greeting"] == "Hi"
+        return reloads
+
+    with tempfile.TemporaryDirectory() as tmp:
+        assert asyncio.run(run(os.path.join(tmp, "config.json"))) == [2]
+
+
+def test_invalid_config_fails_at_startup():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "config.json")
+        write(path, make_config(name="missing"))
+        try:
+            ConfigStore(path, {"lookup": lookup}).load()
+        except ConfigError:
+            return
+    raise AssertionError("expected ConfigError")
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"✅ {name}")
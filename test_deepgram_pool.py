@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Tests for the warm Deepgram agent connection pool against a local fake agent
+"""
+import asyncio
+import json
+import os
+from unittest.mock import patch
+
+import websockets
+
+from deepgram_pool import AgentConnectionPool
+
+SETTINGS = json.dumps({"type": "Settings", "audio": {}})
+
+
+async def start_fake_agent():
+    """Accept agent sockets, acknowledge Settings and greet with a little audio."""
+    received = []
+
+    async def agent(ws):
+        async for message in ws:
+            if isinstance(message, str):
+                received.append(json.loads(message)["type"])
+                if received[-1] == "Settings":
+                    await ws.send(json.dumps({"type": "SettingsApplied"}))
+                    await ws.send(b"\xff" * 160)
+
+    server = await websockets.serve(agent, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    return server, f"ws://127.0.0.1:{port}", received
+
+
+async def wait_for_idle(pool, count):
+    for _ in range(200):
+        if pool.stats()["idle"] >= count:
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"pool never reached {count} idle sockets: {pool.stats()}")
+
+
+def test_checkout_uses_warm_sockets_and_replenishes():
+    async def run():
+        server, url, received = await start_fake_agent()
+        pool = AgentConnectionPool(lambda: websockets.connect(url), lambda: SETTINGS, size=2, ttl=60)
+        await pool.start()
+        try:
+            await wait_for_idle(pool, 2)
+            ws = await pool.checkout()
+            # The socket was configured before checkout, so the greeting is already waiting
+            first = json.loads(await asyncio.wait_for(ws.recv(), 1))
+            greeting = await asyncio.wait_for(ws.recv(), 1)
+            await ws.close()
+            await wait_for_idle(pool, 2)
+            return first, greeting, received, pool.stats()
+        finally:
+            await pool.close()
+            server.close()
+            await server.wait_closed()
+
+    first, greeting, received, stats = asyncio.run(run())
+    assert first == {"type": "SettingsApplied"}
+    assert greeting == b"\xff" * 160
+    assert received.count("Settings") == 3
+    assert stats["hits"] == 1 and stats["misses"] == 0 and stats["hit_rate"] == 1.0
+
+
+def test_expired_and_closed_sockets_are_not_handed_out():
+    async def run():
+        server, url, _ = await start_fake_agent()
+        pool = AgentConnectionPool(
+            lambda: websockets.connect(url), lambda: SETTINGS, size=1, ttl=0.05, health_interval=60
+        )
+        await pool.start()
+        try:
+            await wait_for_idle(pool, 1)
+            await asyncio.sleep(0.1)
+            ws = await pool.checkout()
+            await ws.close()
+            return pool.stats()
+        finally:
+            await pool.close()
+            server.close()
+            await server.wait_closed()
+
+    stats = asyncio.run(run())
+    assert stats["misses"] == 1 and stats["hits"] == 0
+    assert stats["discarded"] >= 1
+
+
+def test_pool_disabled_connects_on_demand():
+    async def run():
+        server, url, received = await start_fake_agent()
+        pool = AgentConnectionPool(lambda: websockets.connect(url), lambda: SETTINGS, size=0)
+        await pool.start()
+        try:
+            ws = await pool.checkout()
+            reply = json.loads(await asyncio.wait_for(ws.recv(), 1))
+            await ws.close()
+            return reply, pool.stats()
+        finally:
+            await pool.close()
+            server.close()
+            await server.wait_closed()
+
+    reply, stats = asyncio.run(run())
+    assert reply == {"type": "SettingsApplied"}
+    assert stats["misses"] == 1
+
+
+def test_agent_url_override_can_point_at_a_plain_ws_agent():
+    async def run():
+        server, url, received = await start_fake_agent()
+        with patch.dict(os.environ, DEEPGRAM_API_KEY="test-key", DEEPGRAM_AGENT_URL=url):
+            import main
+
+            async with main.sts_connect() as ws:
+                await ws.send(SETTINGS)
+                reply = json.loads(await ws.recv())
+        server.close()
+        await server.wait_closed()
+        return reply, received
+
+    reply, received = asyncio.run(run())
+    assert reply == {"type": "SettingsApplied"} and received == ["Settings"]
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"✅ {name}")
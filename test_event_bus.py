@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Tests for the event bus that keeps mobile/Mongo side effects off the call path
+"""
+import asyncio
+import time
+
+from event_bus import EventBus
+from mobile_bridge import MobileBridge
+from mongo_storage import MongoStorage
+
+
+class SlowCollection:
+    """Stands in for the Mongo sessions collection with a slow ``update_one``."""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.updates = []
+
+    async def update_one(self, query, update, upsert=False):
+        await asyncio.sleep(self.delay)
+        self.updates.append((query["sessionId"], update))
+
+    async def bulk_write(self, operations, ordered=True):
+        await asyncio.sleep(self.delay)
+        for operation in operations:
+            self.updates.append((operation._filter["sessionId"], operation._doc))
+
+
+def make_bridge(delay):
+    storage = MongoStorage(layout="embedded")
+    storage.use_database({"call_sessions": SlowCollection(delay)})
+    return MobileBridge(storage)
+
+
+def test_events_are_handled_in_order_per_subscriber():
+    async def run():
+        bus = EventBus()
+        seen = {"fast": [], "slow": []}
+
+        async def fast(event):
+            seen["fast"].append(event["n"])
+
+        async def slow(event):
+            await asyncio.sleep(0.01)
+            seen["slow"].append(event["n"])
+
+        bus.subscribe("fast", fast)
+        bus.subscribe("slow", slow)
+        for n in range(5):
+            bus.publish({"n": n})
+        await asyncio.sleep(0)
+        assert seen["fast"] == [0, 1, 2, 3, 4]
+        assert seen["slow"] == []
+
+        await bus.drain(timeout=1)
+        assert seen["slow"] == [0, 1, 2, 3, 4]
+        return bus.stats()
+
+    stats = asyncio.run(run())
+    assert stats["slow"] == {"pending": 0, "handled": 5, "dropped": 0, "failed": 0}
+
+
+def test_full_queue_drops_instead_of_blocking():
+    async def run():
+        bus = EventBus(max_pending=2)
+
+        async def never_done(event):
+            await asyncio.sleep(10)
+
+        bus.subscribe("stuck", never_done)
+        for n in range(5):
+            bus.publish({"n": n})
+        return bus.stats()["stuck"]["dropped"]
+
+    assert asyncio.run(run()) == 3
+
+
+def test_lifecycle_events_are_never_dropped():
+    async def run():
+        bus = EventBus(max_pending=2)
+        seen = []
+        release = asyncio.Event()
+
+        async def blocked(event):
+            await release.wait()
+            seen.append(event["n"])
+
+        bus.subscribe("stuck", blocked)
+        for n in range(4):
+            bus.publish({"n": n})
+        bus.publish({"n": "completed"}, droppable=False)
+        release.set()
+        await bus.drain(timeout=1)
+        return seen, bus.stats()["stuck"]
+
+    seen, stats = asyncio.run(run())
+    assert seen == [0, 1, "completed"]
+    assert stats["dropped"] == 2
+
+
+def test_slow_mongo_does_not_block_call_events():
+    async def run():
+        bridge = make_bridge(delay=0.05)
+
+        started = time.perf_counter()
+        await bridge.start_session("MZ1", {"from": "+15550100", "callSid": "CA1"})
+        await bridge.handle_transcription("hello", is_final=True, session_id="MZ1")
+        await bridge.handle_agent_response("hi there", session_id="MZ1")
+        await bridge.handle_function_call("lookup", {"q": 1}, {"ok": True}, session_id="MZ1")
+        await bridge.end_session("MZ1")
+        elapsed = time.perf_counter() - started
+
+        assert elapsed < 0.05
+        assert bridge.storage.sessions.updates == []
+
+        await bridge.events.drain(timeout=2)
+        replay = [event["event"] for event in bridge.history.recent(10)]
+        assert replay == ["transcription", "agent_response", "function_call"]
+        return bridge.storage.sessions.updates
+
+    updates = asyncio.run(run())
+    kinds = [next(iter(update)) for _, update in updates]
+    assert kinds == ["$setOnInsert", "$push", "$set"]
+    pushed = updates[1][1]["$push"]
+    # Timestamps are taken when the event happened, not when it was written
+    first, second = pushed["messages"]["$each"]
+    assert first["timestamp"] <= second["timestamp"]
+    assert pushed["functionCalls"]["$each"][0]["name"] == "lookup"
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"✅ {name}")
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Tests for the bounded in-memory event history used for mobile replay
+"""
+from event_history import EventHistory
+
+
+def event(n):
+    return {"event": "agent_response", "text": str(n)}
+
+
+def texts(events):
+    return [e["text"] for e in events]
+
+
+def test_ring_buffer_per_session():
+    history = EventHistory(per_session=3, max_events=100)
+    for n in range(5):
+        history.record("MZ1", event(n))
+    assert texts(history.recent(10, "MZ1")) == ["2", "3", "4"]
+    assert history.stats() == {"sessions": 1, "events": 3, "evicted": 2}
+
+
+def test_global_cap_evicts_least_recently_active_session():
+    history = EventHistory(per_session=10, max_events=4)
+    history.record("old", event(0))
+    history.record("old", event(1))
+    history.record("new", event(2))
+    history.record("new", event(3))
+    history.record("new", event(4))
+    assert texts(history.recent(10, "old")) == ["1"]
+    history.record("new", event(5))
+    assert history.recent(10, "old") == []
+    assert history.stats()["sessions"] == 1
+    assert history.total == 4
+
+
+def test_recent_merges_sessions_in_order():
+    history = EventHistory(per_session=10, max_events=100)
+    for n in range(6):
+        history.record("MZ1" if n % 2 else "MZ2", event(n))
+    assert texts(history.recent(4)) == ["2", "3", "4", "5"]
+    assert history.recent(0) == []
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"✅ {name}")
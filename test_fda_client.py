@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Tests for the cached OpenFDA client against a local stand-in server
+"""
+import asyncio
+import os
+import tempfile
+
+from aiohttp import web
+
+from fda_client import OpenFDAClient
+
+LABEL = {
+    "openfda": {
+        "brand_name": ["Advil"],
+        "generic_name": ["IBUPROFEN"],
+        "manufacturer_name": ["Pfizer"],
+    },
+    "indications_and_usage": ["Temporarily relieves minor aches and pains"],
+    "warnings": ["W" * 300],
+    "dosage_and_administration": ["Take 1 tablet every 4 to 6 hours"],
+}
+
+
+async def start_fake_fda(delay: float = 0.0):
+    """Serve /drug/label.json like OpenFDA: Advil exists, everything else 404s."""
+    hits = []
+
+    async def label(request):
+        hits.append(request.query["search"])
+        await asyncio.sleep(delay)
+        if "Advil" in request.query["search"]:
+            return web.json_response({"results": [LABEL]})
+        return web.json_response({"error": {"code": "NOT_FOUND"}}, status=404)
+
+    app = web.Application()
+    app.router.add_get("/drug/label.json", label)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}", hits
+
+
+def test_cache_and_negative_cache():
+    async def run():
+        runner, url, hits = await start_fake_fda()
+        client = OpenFDAClient(base_url=url, cache_path="")
+        try:
+            first = await client.lookup("Advil")
+            second = await client.lookup("advil ")
+            missing = await client.lookup("Nothing")
+            missing_again = await client.lookup("nothing")
+        finally:
+            await client.close()
+            await runner.cleanup()
+        return first, second, missing, missing_again, hits
+
+    first, second, missing, missing_again, hits = asyncio.run(run())
+    assert first["brand_name"] == "Advil"
+    assert first["warnings"].endswith("...") and len(first["warnings"]) == 203
+    assert second == first
+    assert "error" in missing and missing_again == missing
+    assert len(hits) == 2
+
+
+def test_concurrent_lookups_are_coalesced():
+    async def run():
+        runner, url, hits = await start_fake_fda(delay=0.1)
+        client = OpenFDAClient(base_url=url, cache_path="")
+        try:
+            results = await asyncio.gather(*(client.lookup("Advil") for _ in range(10)))
+        finally:
+            await client.close()
+            await runner.cleanup()
+        return results, hits, client.stats
+
+    results, hits, stats = asyncio.run(run())
+    assert all(result["brand_name"] == "Advil" for result in results)
+    assert len(hits) == 1
+    assert stats["coalesced"] == 9
+
+
+def test_disk_cache_survives_restart():
+    async def run(path):
+        runner, url, hits = await start_fake_fda()
+        try:
+            client = OpenFDAClient(base_url=url, cache_path=path)
+            await client.lookup("Advil")
+            await client.close()
+
+            restarted = OpenFDAClient(base_url=url, cache_path=path)
+            result = await restarted.lookup("Advil")
+            await restarted.close()
+        finally:
+            await runner.cleanup()
+        return result, hits, restarted.stats
+
+    with tempfile.TemporaryDirectory() as tmp:
+        result, hits, stats = asyncio.run(run(os.path.join(tmp, "fda_cache.sqlite")))
+    assert result["brand_name"] == "Advil"
+    assert len(hits) == 1
+    assert stats["disk_hits"] == 1
+
+
+def test_server_errors_are_not_cached():
+    async def run():
+        client = OpenFDAClient(base_url="http://127.0.0.1:9", cache_path="", timeout=1)
+        try:
+            return await client.lookup("Advil"), len(client.cache)
+        finally:
+            await client.close()
+
+    result, cached = asyncio.run(run())
+    assert result["error"].startswith("FDA API error")
+    assert cached == 0
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"✅ {name}")
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Tests for the offline, memory-mapped FDA label snapshot
+"""
+import json
+import os
+import tempfile
+import zipfile
+from unittest.mock import patch
+
+from fda_snapshot import FDASnapshot, build_snapshot, load_default_snapshot
+
+
+def make_label(brand, generic, effective_time="20200101", warnings="Use as directed"):
+    return {
+        "effective_time": effective_time,
+        "openfda": {
+            "brand_name": [brand],
+            "generic_name": [generic],
+            "manufacturer_name": ["Acme"],
+        },
+        "warnings": [warnings],
+        "dosage_and_administration": ["D" * 400],
+    }
+
+
+def test_build_and_lookup():
+    labels = [make_label(f"Brand{i}", f"generic{i}") for i in range(500)]
+    labels.append(make_label("Advil", "IBUPROFEN", "20190101", "old warning"))
+    labels.append(make_label("Advil", "IBUPROFEN", "20230101", "new warning"))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        export = os.path.join(tmp, "drug-label-0001-of-0001.json.zip")
+        with zipfile.ZipFile(export, "w") as archive:
+            archive.writestr("drug-label-0001-of-0001.json", json.dumps({"results": labels}))
+
+        path = os.path.join(tmp, "labels.snap")
+        assert build_snapshot(path, [export]) == 1002
+
+        snapshot = FDASnapshot(path)
+        try:
+            advil = snapshot.lookup("  advil ")
+            assert advil["warnings"] == "new warning"
+            assert snapshot.lookup("Ibuprofen") == advil
+            assert len(advil["dosage"]) == 203
+            assert snapshot.lookup("generic250")["brand_name"] == "Brand250"
+            assert snapshot.lookup("not a drug") is None
+        finally:
+            snapshot.close()
+
+
+def test_rejects_other_files():
+    with tempfile.NamedTemporaryFile(suffix=".snap") as f:
+        f.write(b"not a snapshot file at all, just some bytes" * 2)
+        f.flush()
+        try:
+            FDASnapshot(f.name)
+        except ValueError:
+            return
+    raise AssertionError("expected ValueError")
+
+
+def test_truncated_snapshot_falls_back_to_the_api():
+    labels = [make_label(f"Brand{i}", f"generic{i}") for i in range(20)]
+    with tempfile.TemporaryDirectory() as tmp:
+        export = os.path.join(tmp, "labels.json")
+        with open(export, "w") as f:
+            json.dump({"results": labels}, f)
+        path = os.path.join(tmp, "labels.snap")
+        build_snapshot(path, [export])
+        with open(path, "rb") as f:
+            data = f.read()
+
+        # Cut inside the header, inside the index, and with no bytes at all
+        for length in (20, 100, 0):
+            with open(path, "wb") as f:
+                f.write(data[:length])
+            with patch.dict(os.environ, {"FDA_SNAPSHOT_PATH": path}):
+                assert load_default_snapshot() is None
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"✅ {name}")
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Tests for dispatching a FunctionCallRequest's functions concurrently
+"""
+import asyncio
+import json
+from unittest.mock import patch
+
+import main
+from tool_executor import ToolExecutor
+
+
+async def slow_lookup(delay: float):
+    await asyncio.sleep(delay)
+    return {"tool": "slow"}
+
+
+def fast_lookup():
+    return {"tool": "fast"}
+
+
+class AgentSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, message):
+        self.sent.append(json.loads(message))
+
+
+class RecordingBridge:
+    def __init__(self):
+        self.calls = []
+
+    async def handle_function_call(self, function_name, parameters, result, session_id=None):
+        self.calls.append((function_name, session_id))
+
+
+def test_responses_are_sent_as_each_function_finishes():
+    request = {
+        "type": "FunctionCallRequest",
+        "functions": [
+            {"id": "call-slow", "name": "slow_lookup", "arguments": json.dumps({"delay": 0.2})},
+            {"id": "call-fast", "name": "fast_lookup", "arguments": "{}"},
+            {"id": "call-bad", "name": "fast_lookup", "arguments": "not json"},
+        ],
+    }
+    executor = ToolExecutor({"slow_lookup": slow_lookup, "fast_lookup": fast_lookup}, default_timeout=2)
+    socket, bridge = AgentSocket(), RecordingBridge()
+
+    async def run():
+        await main.handle_function_call_request(request, socket, "MZ1")
+
+    with patch.object(main, "tool_executor", executor), patch.object(main, "mobile_bridge", bridge):
+        asyncio.run(run())
+    executor.shutdown(wait=True)
+
+    responses = {message["id"]: message for message in socket.sent}
+    # The slow call was requested first; dispatched one at a time it would be answered first
+    assert [message["id"] for message in socket.sent][-1] == "call-slow"
+    assert set(responses) == {"call-slow", "call-fast", "call-bad"}
+    assert all(response["type"] == "FunctionCallResponse" for response in responses.values())
+    assert json.loads(responses["call-fast"]["content"]) == {"tool": "fast"}
+    assert "func called failed" in json.loads(responses["call-bad"]["content"])["error"]
+    assert json.loads(responses["call-slow"]["content"]) == {"tool": "slow"}
+    assert sorted(bridge.calls) == [("fast_lookup", "MZ1"), ("fast_lookup", "MZ1"), ("slow_lookup", "MZ1")]
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"✅ {name}")
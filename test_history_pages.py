@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Tests for cursor-paginated, projected history reads
+"""
+import asyncio
+from datetime import datetime, timedelta
+
+import history_pages
+from conftest import FakeCollection, FakeCursor
+
+
+class FakeSessions(FakeCollection):
+    """Adds the ``$slice`` projection and ``$or`` cursor queries used for paging."""
+
+    async def find_one(self, query, projection=None, sort=None):
+        for doc in self.documents:
+            if doc["sessionId"] != query["sessionId"]:
+                continue
+            found = {"sessionId": doc["sessionId"]}
+            for field, spec in (projection or {}).items():
+                if isinstance(spec, dict) and "$slice" in spec:
+                    offset, count = spec["$slice"]
+                    found[field] = doc.get(field, [])[offset:offset + count]
+            return found
+        return None
+
+    def aggregate(self, pipeline):
+        """Only the ``$filter``-by-seq projection used to catch up embedded sessions."""
+        match, project = pipeline[0]["$match"], pipeline[1]["$project"]
+        found = []
+        for doc in self.documents:
+            if doc["sessionId"] != match["sessionId"]:
+                continue
+            projected = {}
+            for field, spec in project.items():
+                if field == "_id":
+                    continue
+                filtered, count = spec["$slice"]
+                after_seq = filtered["$filter"]["cond"]["$gt"][1]
+                projected[field] = [item for item in doc.get(field, []) if item.get("seq", -1) > after_seq][:count]
+            found.append(projected)
+        return FakeCursor(found)
+
+    def find(self, query, projection=None):
+        documents = self.documents
+        if "$or" in query:
+            older, same = query["$or"]
+            created_at = older["createdAt"]["$lt"]
+            documents = [
+                doc for doc in documents
+                if doc["createdAt"] < created_at
+                or (doc["createdAt"] == created_at and doc["sessionId"] < same["sessionId"]["$lt"])
+            ]
+        keep = {key for key, value in (projection or {}).items() if value == 1}
+        return FakeSortCursor([{k: v for k, v in doc.items() if k in keep} for doc in documents])
+
+
+class FakeSortCursor(FakeCursor):
+    def sort(self, keys, direction=None):
+        for key, key_direction in reversed(keys):
+            self.documents.sort(key=lambda doc: doc[key], reverse=key_direction < 0)
+        return self
+
+
+async def collect(db, session, **kwargs):
+    pages = []
+    async for entries, cursor in history_pages.history_pages(db, session, **kwargs):
+        pages.append((entries, cursor))
+    return pages
+
+
+def test_embedded_history_is_paged_per_array_with_projection():
+    session = {
+        "sessionId": "MZ1",
+        "messages": [{"text": str(n), "role": "user", "timestamp": n} for n in range(5)],
+        "functionCalls": [{"name": "lookup", "result": {"ok": True}}],
+    }
+    db = {"call_sessions": FakeSessions([session])}
+
+    pages = asyncio.run(collect(db, {"sessionId": "MZ1"}, size=2, fields=["text"]))
+    assert [cursor for _, cursor in pages] == ["messages:2", "messages:4", "functionCalls:0", None]
+    assert pages[0][0] == [{"text": "0", "kind": "message"}, {"text": "1", "kind": "message"}]
+    assert pages[-1][0] == [{"kind": "function_call"}]
+
+    resumed = asyncio.run(collect(db, {"sessionId": "MZ1"}, size=2, cursor="messages:4"))
+    assert [entry.get("text") for entry in resumed[0][0]] == ["4"]
+
+
+def test_collection_history_is_paged_by_seq():
+    messages = FakeCollection(
+        [{"sessionId": "MZ1", "seq": seq, "kind": "message", "text": str(seq)} for seq in range(3)]
+    )
+    db = {"session_messages": messages}
+    session = {"sessionId": "MZ1", "messagesLayout": "collection"}
+
+    pages = asyncio.run(collect(db, session, size=2))
+    assert [cursor for _, cursor in pages] == ["seq:1", None]
+    assert [entry["seq"] for entry in pages[1][0]] == [2]
+    assert "sessionId" not in pages[0][0][0]
+
+
+def test_embedded_history_catches_up_after_a_seq():
+    session = {
+        "sessionId": "MZ1",
+        # The first message predates numbering
+        "messages": [{"text": "old"}] + [{"text": str(seq), "seq": seq} for seq in (0, 1, 3, 4)],
+        "functionCalls": [{"name": "lookup", "seq": 2}],
+    }
+    db = {"call_sessions": FakeSessions([session])}
+
+    pages = asyncio.run(collect(db, {"sessionId": "MZ1"}, size=2, cursor="seq:0"))
+    assert [cursor for _, cursor in pages] == ["seq:2", None]
+    assert [(entry["seq"], entry["kind"]) for entry in pages[0][0]] == [(1, "message"), (2, "function_call")]
+    assert [entry["seq"] for entry in pages[1][0]] == [3, 4]
+
+
+def test_bad_cursor_is_rejected():
+    db = {"call_sessions": FakeSessions([])}
+    try:
+        asyncio.run(collect(db, {"sessionId": "MZ1"}, size=2, cursor="transcripts:3"))
+    except history_pages.CursorError:
+        return
+    raise AssertionError("expected CursorError")
+
+
+def test_recent_sessions_cursor_walks_newest_first():
+    start = datetime(2025, 1, 1)
+    sessions = FakeSessions(
+        [
+            {"sessionId": f"MZ{n}", "createdAt": start + timedelta(minutes=n // 2), "messages": [1, 2]}
+            for n in range(5)
+        ]
+    )
+
+    async def run():
+        seen = []
+        cursor = None
+        while True:
+            page, cursor = await history_pages.recent_sessions(sessions, limit=2, cursor=cursor)
+            seen.append([doc["sessionId"] for doc in page])
+            if cursor is None:
+                return seen, page
+
+    seen, last_page = asyncio.run(run())
+    assert seen == [["MZ4", "MZ3"], ["MZ2", "MZ1"], ["MZ0"]]
+    assert "messages" not in last_page[0]
+
+
+def test_page_size_is_clamped():
+    assert history_pages.page_size(None) == history_pages.DEFAULT_PAGE_SIZE
+    assert history_pages.page_size(10_000) == history_pages.MAX_PAGE_SIZE
+    assert history_pages.page_size("0") == 1
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"✅ {name}")
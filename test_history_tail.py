@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Tests for delta history sync and live-tailing a session
+"""
+import asyncio
+
+from conftest import FakeClient, temp_path
+from history_tail import HistoryTail
+from mobile_bridge import MobileBridge
+from mobile_commands import CommandReply
+from sqlite_storage import SQLiteStorage
+
+
+class FlakyStorage(SQLiteStorage):
+    """Fails the next ``failures`` batch writes."""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.failures = 0
+
+    async def append_entries(self, batch):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("disk unavailable")
+        await super().append_entries(batch)
+
+
+SYNC_EVENTS = {"history_start", "history_chunk", "history_sync_end", "history_tail", "history_tail_end"}
+
+
+def test_backlog_skips_entries_the_catch_up_sent():
+    tail = HistoryTail()
+    sent = []
+    follower = tail.follow("client", "MZ1", sent.append, fields=["text"])
+    for seq in (3, 4, 5):
+        tail.publish("MZ1", {"seq": seq, "kind": "message", "text": str(seq), "role": "user"})
+    tail.go_live(follower, 4)
+    tail.publish("MZ1", {"seq": 6, "kind": "message", "text": "6"})
+    tail.publish("MZ2", {"seq": 0, "kind": "message", "text": "other call"})
+    tail.end("MZ1")
+
+    assert [[entry["seq"] for entry in message["entries"]] for message in sent[:2]] == [[5], [6]]
+    assert sent[0]["entries"][0] == {"seq": 5, "kind": "message", "text": "5"}
+    assert sent[2] == {"event": "history_tail_end", "session_id": "MZ1", "reason": "completed"}
+    assert not tail.following("MZ1")
+
+
+def test_sync_sends_only_new_entries_then_tails_the_call():
+    async def run():
+        bridge = MobileBridge(SQLiteStorage(temp_path()))
+        await bridge.ensure_db()
+        await bridge.start_session("MZ1", {"from": "+15550100", "callSid": "CA1"})
+        passcode = bridge.session_metadata["MZ1"]["passcode"]
+        for n in range(3):
+            await bridge.handle_agent_response(f"stored {n}", session_id="MZ1")
+        await bridge.events.drain(timeout=2)
+
+        credentials = {"phone_number": "+15550100", "passcode": passcode}
+        follower, catch_up = FakeClient("follower"), FakeClient("catch-up")
+        for client in (follower, catch_up):
+            await bridge.register_mobile_client(client)
+        await bridge._handle_command(
+            CommandReply(follower, "s1"), {"command": "sync_history", "live": True, **credentials}
+        )
+        await asyncio.sleep(0.01)
+
+        await bridge.handle_agent_response("live 3", session_id="MZ1")
+        await bridge.handle_function_call("lookup", {"q": 1}, {"ok": True}, session_id="MZ1")
+        await bridge.events.drain(timeout=2)
+        # A client that last saw seq 3 only gets what came after it
+        await bridge._handle_command(
+            CommandReply(catch_up), {"command": "sync_history", "since_seq": 3, **credentials}
+        )
+        await bridge.end_session("MZ1")
+        await bridge.events.drain(timeout=2)
+        await asyncio.sleep(0.01)
+        return follower.received, catch_up.received, bridge.tail.stats()
+
+    follower, catch_up, stats = asyncio.run(run())
+    follower = [m for m in follower if m["event"] in SYNC_EVENTS]
+    assert [m["event"] for m in follower] == [
+        "history_start", "history_chunk", "history_sync_end", "history_tail", "history_tail", "history_tail_end",
+    ]
+    assert all(m["request_id"] == "s1" for m in follower)
+    assert [e["seq"] for e in follower[1]["entries"]] == [0, 1, 2]
+    assert follower[2]["last_seq"] == 2 and follower[2]["live"]
+    assert [(e["seq"], e["kind"]) for m in follower[3:5] for e in m["entries"]] == [(3, "message"), (4, "function_call")]
+
+    catch_up = [m for m in catch_up if m["event"] in SYNC_EVENTS]
+    assert [m["event"] for m in catch_up] == ["history_start", "history_chunk", "history_sync_end"]
+    assert catch_up[0]["since_seq"] == 3
+    assert [e["seq"] for e in catch_up[1]["entries"]] == [4]
+    assert catch_up[2] == {"event": "history_sync_end", "session_id": "MZ1", "count": 1, "last_seq": 4, "live": False}
+    assert stats["sessions"] == 0 and stats["sent"] == 2
+
+
+def test_delta_only_applies_to_the_cached_session():
+    async def run():
+        bridge = MobileBridge(SQLiteStorage(temp_path()))
+        await bridge.ensure_db()
+        await bridge.start_session("MZ2", {"from": "+15550100", "callSid": "CA2"})
+        passcode = bridge.session_metadata["MZ2"]["passcode"]
+        for n in range(3):
+            await bridge.handle_agent_response(f"new call {n}", session_id="MZ2")
+        await bridge.events.drain(timeout=2)
+
+        client = FakeClient("phone")
+        await bridge.register_mobile_client(client)
+        # The client's copy is of an earlier call from the same number
+        await bridge._handle_command(
+            CommandReply(client),
+            {
+                "command": "sync_history",
+                "phone_number": "+15550100",
+                "passcode": passcode,
+                "since_session_id": "MZ1",
+                "since_seq": 1,
+            },
+        )
+        await bridge.end_session("MZ2")
+        await bridge.events.drain(timeout=2)
+        return client.received
+
+    received = [m for m in asyncio.run(run()) if m["event"] in SYNC_EVENTS]
+    assert received[0]["history"]["sessionId"] == "MZ2" and received[0]["since_seq"] is None
+    assert [e["seq"] for e in received[1]["entries"]] == [0, 1, 2]
+
+
+def test_entries_are_tailed_once_stored_even_after_a_failed_flush():
+    async def run():
+        storage = FlakyStorage(temp_path())
+        bridge = MobileBridge(storage)
+        await bridge.ensure_db()
+        await bridge.start_session("MZ1", {"from": "+15550100", "callSid": "CA1"})
+        passcode = bridge.session_metadata["MZ1"]["passcode"]
+        await bridge.handle_agent_response("stored 0", session_id="MZ1")
+        await bridge.events.drain(timeout=2)
+        await bridge.writer.flush()
+
+        await bridge.handle_agent_response("unstored 1", session_id="MZ1")
+        await bridge.events.drain(timeout=2)
+        client = FakeClient("phone")
+        await bridge.register_mobile_client(client)
+        # The sync's own flush fails: entry 1 is neither caught up nor tailed yet
+        storage.failures = 1
+        await bridge._handle_command(
+            CommandReply(client),
+            {"command": "sync_history", "phone_number": "+15550100", "passcode": passcode, "live": True},
+        )
+        await bridge.writer.flush()
+        await bridge.end_session("MZ1")
+        await bridge.events.drain(timeout=2)
+        await asyncio.sleep(0.01)
+        return client.received
+
+    received = [m for m in asyncio.run(run()) if m["event"] in SYNC_EVENTS]
+    assert [m["event"] for m in received] == [
+        "history_start", "history_chunk", "history_sync_end", "history_tail", "history_tail_end",
+    ]
+    assert received[2]["last_seq"] == 0
+    assert [(e["seq"], e["text"]) for e in received[3]["entries"]] == [(1, "unstored 1")]
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"✅ {name}")
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Tests for the mobile broadcast hub's per-client queues
+"""
+import asyncio
+
+from conftest import FakeClient
+from mobile_broadcast import BroadcastHub
+
+
+def test_slow_client_does_not_stall_others():
+    async def run():
+        hub = BroadcastHub(max_queue=100)
+        fast, slow = FakeClient("fast"), FakeClient("slow", delay=0.05)
+        hub.add(fast)
+        hub.add(slow)
+        for i in range(5):
+            hub.publish({"event": "agent_response", "text": str(i)})
+        await asyncio.sleep(0.02)
+        fast_count, slow_count = len(fast.received), len(slow.received)
+        await asyncio.sleep(0.3)
+        hub.remove(fast)
+        hub.remove(slow)
+        return fast_count, slow_count, slow.received
+
+    fast_count, slow_count, slow_received = asyncio.run(run())
+    assert fast_count == 5
+    assert slow_count < 5
+    assert [m["text"] for m in slow_received] == ["0", "1", "2", "3", "4"]
+
+
+def test_lagging_client_is_downgraded_then_evicted():
+    async def run():
+        hub = BroadcastHub(max_queue=4)
+        stuck = FakeClient("stuck", delay=10)
+        hub.add(stuck)
+        await asyncio.sleep(0)
+        for i in range(4):
+            hub.publish({"event": "transcription", "text": "...", "is_final": False})
+        hub.publish({"event": "agent_response", "text": "kept"})
+        stats = hub.stats()[0]
+        for i in range(10):
+            hub.publish({"event": "agent_response", "text": str(i)})
+        await asyncio.sleep(0)
+        return stats, hub.stats(), hub.evicted, stuck.closed_with
+
+    stats, after, evicted, closed_with = asyncio.run(run())
+    assert stats["degraded"] and stats["dropped"] >= 1
+    assert after == [] and evicted == 1 and closed_with == 1013
+
+
+def test_unexpected_send_error_removes_the_client():
+    class BrokenClient(FakeClient):
+        async def send(self, message):
+            raise TypeError("data must be str or bytes")
+
+    async def run():
+        hub = BroadcastHub()
+        broken, healthy = BrokenClient("broken"), FakeClient("healthy")
+        hub.add(broken)
+        hub.add(healthy)
+        hub.publish({"event": "agent_response", "text": "hi"})
+        await asyncio.sleep(0.01)
+        hub.publish({"event": "agent_response", "text": "still here"})
+        await asyncio.sleep(0.01)
+        return hub, broken, healthy
+
+    hub, broken, healthy = asyncio.run(run())
+    assert list(hub.channels) == [healthy] and hub.send_failures == 1
+    assert broken.closed_with == 1011
+    assert [m["text"] for m in healthy.received] == ["hi", "still here"]
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"✅ {name}")
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Tests for negotiated mobile wire encodings
+"""
+import asyncio
+from datetime import datetime, timezone
+
+import msgpack
+from bson import ObjectId
+
+import mobile_codec
+from conftest import FakeClient
+from mobile_broadcast import BroadcastHub
+from mobile_commands import CommandReply
+
+
+class BinaryClient(FakeClient):
+    async def send(self, message):
+        self.received.append(msgpack.unpackb(message))
+
+
+def test_tag_splices_request_id_into_encoded_frames():
+    for codec in mobile_codec.available.values():
+        message = {"event": "history_end", "session_id": "MZ1", "count": 3}
+        tagged = codec.tag(codec.encode(message), "req-7")
+        assert codec.decode(tagged) == {"request_id": "req-7", **message}
+        # Empty objects and large maps fall back to re-encoding
+        assert codec.decode(codec.tag(codec.encode({}), 1)) == {"request_id": 1}
+        wide = {f"k{n}": n for n in range(30)}
+        assert codec.decode(codec.tag(codec.encode(wide), 2)) == {"request_id": 2, **wide}
+
+
+def test_stored_documents_encode_in_one_pass():
+    object_id = ObjectId("65f1c0ffee0000000000abcd")
+    document = {
+        "_id": object_id,
+        "createdAt": datetime(2026, 3, 2, 14, 5, 0, 120000),
+        "messages": [{"seq": 0, "text": "hi", "timestamp": datetime(2026, 3, 2, 14, 5, 1, tzinfo=timezone.utc)}],
+    }
+    expected = {
+        "_id": "65f1c0ffee0000000000abcd",
+        "createdAt": "2026-03-02T14:05:00.120000",
+        "messages": [{"seq": 0, "text": "hi", "timestamp": "2026-03-02T14:05:01+00:00"}],
+    }
+    for codec in mobile_codec.available.values():
+        if codec.name == mobile_codec.CBOR:
+            # CBOR sends datetimes with its own datetime tag
+            continue
+        assert codec.decode(codec.encode(document)) == expected
+    try:
+        mobile_codec.default.encode({"unknown": object()})
+    except TypeError:
+        pass
+    else:
+        raise AssertionError("unknown types must not be encoded silently")
+
+
+def test_server_picks_its_preferred_offered_encoding():
+    offered = ["pharmacy.json.v1", "pharmacy.msgpack.v1", "other.v1"]
+    assert mobile_codec.select_subprotocol(None, offered) == "pharmacy.msgpack.v1"
+    assert mobile_codec.select_subprotocol(None, ["other.v1"]) is None
+    assert mobile_codec.for_subprotocol("pharmacy.msgpack.v1").name == mobile_codec.MSGPACK
+    assert mobile_codec.for_subprotocol(None) is mobile_codec.default
+
+
+def test_clients_receive_their_own_encoding():
+    async def run():
+        hub = BroadcastHub()
+        text, binary = FakeClient("text"), BinaryClient("binary")
+        hub.add(text)
+        hub.add(binary, mobile_codec.get_codec(mobile_codec.MSGPACK))
+        hub.publish({"event": "agent_response", "text": "hello"})
+        await CommandReply(binary, "r1", mobile_codec.get_codec(mobile_codec.MSGPACK)).send({"event": "pong"})
+        await asyncio.sleep(0.01)
+        hub.remove(text)
+        hub.remove(binary)
+        return text.received, binary.received, hub.stats()
+
+    text, binary, stats = asyncio.run(run())
+    assert text == [{"event": "agent_response", "text": "hello"}]
+    assert binary == [{"request_id": "r1", "event": "pong"}, {"event": "agent_response", "text": "hello"}]
+    assert stats == []
+
+
+def test_commands_may_be_json_or_negotiated_encoding():
+    codec = mobile_codec.get_codec(mobile_codec.MSGPACK)
+    assert mobile_codec.decode_frame(codec, '{"command": "ping"}') == {"command": "ping"}
+    assert mobile_codec.decode_frame(codec, msgpack.packb({"command": "ping"})) == {"command": "ping"}
+    try:
+        mobile_codec.decode_frame(codec, b"\xc1")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("malformed frame was accepted")
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"✅ {name}")
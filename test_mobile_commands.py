@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Tests for concurrent, correlated mobile command handling
+"""
+import asyncio
+import json
+
+from mobile_bridge import MobileBridge
+from mobile_commands import CommandReply, InflightCommands
+from sqlite_storage import SQLiteStorage
+
+
+class SlowStorage(SQLiteStorage):
+    """Answers every history lookup after ``delay`` seconds."""
+
+    name = "slow"
+
+    def __init__(self, delay):
+        super().__init__(":memory:")
+        self.delay = delay
+
+    @property
+    def configured(self):
+        return True
+
+    @property
+    def available(self):
+        return True
+
+    async def find_session(self, phone_number, passcode_hash, session_id=None, *, with_history=False):
+        await asyncio.sleep(self.delay)
+        return {"sessionId": session_id or "MZ1", "phoneNumber": phone_number, "messages": []}
+
+
+class FakeSocket:
+    """Delivers ``incoming`` frames to the handler, then waits to be closed."""
+
+    def __init__(self, incoming):
+        self.remote_address = ("test", 0)
+        self.incoming = [json.dumps(frame) for frame in incoming]
+        self.sent = []
+        self.closed = asyncio.Event()
+
+    def __aiter__(self):
+        return self._frames()
+
+    async def _frames(self):
+        for frame in self.incoming:
+            yield frame
+        await self.closed.wait()
+
+    async def send(self, message):
+        self.sent.append(json.loads(message))
+
+
+def test_reply_tags_encoded_frames():
+    async def run():
+        socket = FakeSocket([])
+        await CommandReply(socket, "r1").send(json.dumps({"event": "pong"}))
+        await CommandReply(socket).send(json.dumps({"event": "pong"}))
+        return socket.sent
+
+    assert asyncio.run(run()) == [{"request_id": "r1", "event": "pong"}, {"event": "pong"}]
+
+
+def test_inflight_limit_rejects_extra_work():
+    async def run():
+        inflight = InflightCommands(limit=2)
+        gate = asyncio.Event()
+        started = [inflight.start(gate.wait()) for _ in range(3)]
+        gate.set()
+        await asyncio.gather(*(task for task in started if task is not None))
+        return started, inflight.stats()
+
+    started, stats = asyncio.run(run())
+    assert started[2] is None
+    assert stats == {"in_flight": 0, "peak": 2, "started": 2, "rejected": 1}
+
+
+def test_reads_wait_for_an_earlier_write():
+    async def run():
+        inflight = InflightCommands(limit=4)
+        release = asyncio.Event()
+        order = []
+
+        async def read(name):
+            order.append(name)
+
+        async def write():
+            await release.wait()
+            order.append("write")
+
+        inflight.start(read("read before"))
+        inflight.start(write(), barrier=True)
+        inflight.start(read("read after"))
+        await asyncio.sleep(0.01)
+        held = list(order)
+        release.set()
+        await asyncio.gather(*inflight.tasks)
+        return held, order
+
+    held, order = asyncio.run(run())
+    # Only the read sent after the write is held back
+    assert held == ["read before"]
+    assert order == ["read before", "write", "read after"]
+
+
+def test_failed_commands_always_get_an_error_event():
+    class BrokenBridge(MobileBridge):
+        async def _handle_command(self, reply, data):
+            raise RuntimeError("storage exploded")
+
+    async def run():
+        bridge = BrokenBridge(SlowStorage(delay=0))
+        socket = FakeSocket([])
+        await bridge._run_command(CommandReply(socket), {"command": "get_recent_conversations"})
+        await bridge._run_command(CommandReply(socket, "r1"), {"command": "get_recent_conversations"})
+        return socket.sent
+
+    assert asyncio.run(run()) == [
+        {"event": "error", "command": "get_recent_conversations", "message": "storage exploded"},
+        {"request_id": "r1", "event": "error", "command": "get_recent_conversations", "message": "storage exploded"},
+    ]
+
+
+def test_slow_history_does_not_block_ping():
+    async def run():
+        bridge = MobileBridge(SlowStorage(delay=0.05))
+        socket = FakeSocket(
+            [
+                {"command": "get_history", "phone_number": "+15550100", "passcode": "1", "request_id": "h1"},
+                {"command": "get_history", "phone_number": "+15550100", "passcode": "2", "request_id": "h2"},
+                {"command": "ping", "request_id": "p1"},
+            ]
+        )
+        handler = asyncio.ensure_future(bridge.mobile_websocket_handler(socket))
+        await asyncio.sleep(0.01)
+        early = [frame.get("request_id") for frame in socket.sent if "request_id" in frame]
+        running = bridge.command_stats()
+        await asyncio.sleep(0.1)
+        socket.closed.set()
+        await handler
+        return early, running, bridge.command_stats(), [frame for frame in socket.sent if "request_id" in frame]
+
+    early, running, closed, replies = asyncio.run(run())
+    assert early == ["p1"]
+    assert [stats["in_flight"] for stats in running] == [2] and closed == []
+    assert sorted(frame["request_id"] for frame in replies if frame["event"] == "history") == ["h1", "h2"]
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"✅ {name}")
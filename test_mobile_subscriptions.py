@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Tests for per-session mobile subscriptions
+"""
+import asyncio
+
+from conftest import FakeClient
+from mobile_bridge import MobileBridge
+from mobile_commands import CommandReply
+from mobile_subscriptions import ALL_TOPIC, PHONE, SESSION, SubscriptionIndex
+from mongo_storage import MongoStorage
+from persistence import MongoPersistence
+
+
+def test_recipients_follow_session_phone_and_all():
+    index = SubscriptionIndex(default="none")
+    watcher, caller_desk, session_desk, idle = "watcher", "caller", "session", "idle"
+    for client in (watcher, caller_desk, session_desk, idle):
+        index.add(client)
+    index.subscribe(watcher, ALL_TOPIC)
+    index.subscribe(caller_desk, (PHONE, "+15550100"))
+    index.subscribe(session_desk, (SESSION, "MZ2"))
+
+    index.bind("MZ1", "+15550100")
+    index.bind("MZ2", "+15550199")
+    assert index.recipients("MZ1") == {watcher, caller_desk}
+    assert index.recipients("MZ2") == {watcher, session_desk}
+    assert index.recipients(None) == {watcher}
+
+    index.unbind("MZ1")
+    index.unsubscribe(watcher)
+    index.remove(session_desk)
+    assert index.recipients("MZ1") == set()
+    assert index.recipients("MZ2") == set()
+    assert index.stats() == {"clients": 3, "all": 0, "topics": 1, "live_sessions": 1, "ended_sessions": 1}
+
+    # An ended call still matches its number for replays until it is dropped
+    assert index.matches((PHONE, "+15550100"), "MZ1")
+    index.retain(["MZ2"])
+    assert not index.matches((PHONE, "+15550100"), "MZ1")
+    assert index.stats()["ended_sessions"] == 0
+
+
+def test_bridge_only_sends_events_to_subscribers():
+    async def run():
+        bridge = MobileBridge(MongoStorage(MongoPersistence("")))
+        bridge.subscriptions.default = "none"
+        everyone, follower = FakeClient("everyone"), FakeClient("follower")
+        await bridge.register_mobile_client(everyone)
+        await bridge.register_mobile_client(follower)
+        bridge._handle_subscription(CommandReply(everyone), {"command": "subscribe", "all": True})
+
+        await bridge.start_session("MZ1", {"from": "+15550100"})
+        await bridge.start_session("MZ2", {"from": "+15550199"})
+        await bridge.handle_agent_response("for caller one", session_id="MZ1")
+        await bridge.handle_agent_response("for caller two", session_id="MZ2")
+        await bridge.events.drain(timeout=1)
+
+        # Subscribing mid-call replays what the client missed
+        bridge._handle_subscription(
+            CommandReply(follower, "sub-1"), {"command": "subscribe", "phone_number": "+15550100"}
+        )
+        await bridge.handle_agent_response("live for one", session_id="MZ1")
+        await bridge.handle_agent_response("live for two", session_id="MZ2")
+        await bridge.end_session("MZ1")
+        await bridge.events.drain(timeout=1)
+        await asyncio.sleep(0.01)
+        return everyone.received, follower.received
+
+    everyone, follower = asyncio.run(run())
+    assert [m["text"] for m in everyone if m["event"] == "agent_response"] == [
+        "for caller one", "for caller two", "live for one", "live for two",
+    ]
+    events = [m["event"] for m in follower]
+    assert events == [
+        "connection_established", "active_sessions", "event_replay", "subscribed",
+        "agent_response", "session_completed",
+    ]
+    assert [s["session_id"] for s in follower[1]["sessions"]] == ["MZ1"]
+    assert [e["text"] for e in follower[2]["events"]] == ["for caller one"]
+    assert follower[3]["subscriptions"] == [{"scope": "phone", "id": "+15550100"}]
+    assert follower[3]["request_id"] == "sub-1"
+    assert follower[4]["text"] == "live for one"
+
+
+def test_phone_subscribers_are_caught_up_on_a_call_that_just_ended():
+    async def run():
+        bridge = MobileBridge(MongoStorage(MongoPersistence("")))
+        bridge.subscriptions.default = "none"
+        await bridge.start_session("MZ1", {"from": "+15550100"})
+        await bridge.handle_agent_response("before hanging up", session_id="MZ1")
+        await bridge.end_session("MZ1")
+        await bridge.events.drain(timeout=1)
+
+        late = FakeClient("late")
+        await bridge.register_mobile_client(late)
+        bridge._handle_subscription(CommandReply(late), {"command": "subscribe", "phone_number": "+15550100"})
+        await asyncio.sleep(0.01)
+        return late.received
+
+    received = asyncio.run(run())
+    replays = [m for m in received if m["event"] == "event_replay"]
+    assert len(replays) == 1
+    assert [e["text"] for e in replays[0]["events"]] == ["before hanging up"]
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"✅ {name}")
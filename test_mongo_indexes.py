@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Tests for the declared MongoDB indexes and their verification helpers
+"""
+import asyncio
+
+from pymongo.errors import OperationFailure
+
+import mongo_indexes
+
+
+async def iterate(items):
+    for item in items:
+        yield item
+
+
+class FakeCollection:
+    def __init__(self, indexes=(), usage=None, conflict=()):
+        self.indexes = {"_id_"} | set(indexes)
+        self.usage = usage or {}
+        self.conflict = set(conflict)
+        self.created = []
+
+    async def create_index(self, keys, name, **options):
+        if name in self.conflict:
+            raise OperationFailure("Index with name already exists with different options", code=85)
+        self.created.append((name, options))
+        self.indexes.add(name)
+
+    def list_indexes(self):
+        return iterate([{"name": name} for name in sorted(self.indexes)])
+
+    def aggregate(self, pipeline):
+        return iterate(
+            [{"name": name, "accesses": {"ops": ops}} for name, ops in self.usage.items()]
+        )
+
+
+class FakeDB(dict):
+    def __init__(self, **collections):
+        super().__init__(collections)
+        self.commands = []
+
+    def __missing__(self, name):
+        self[name] = FakeCollection()
+        return self[name]
+
+    async def command(self, *args, **kwargs):
+        self.commands.append((args, kwargs))
+
+
+def test_ensure_creates_declared_indexes_and_updates_ttl():
+    db = FakeDB(call_sessions=FakeCollection(conflict={"endedAt_1"}))
+    specs = mongo_indexes.declared_indexes(retention=86400)
+
+    names = asyncio.run(mongo_indexes.ensure_indexes(db, specs))
+
+    assert "phoneNumber_1_passcodeHash_1_updatedAt_-1" in names
+    assert ("sessionId_1", {"unique": True}) in db["call_sessions"].created
+    assert db.commands == [
+        (("collMod", "call_sessions"), {"index": {"name": "endedAt_1", "expireAfterSeconds": 86400}})
+    ]
+    assert ("timestamp_1", {"expireAfterSeconds": 86400}) in db["session_messages"].created
+
+
+def test_plan_walk_finds_nested_index_scans():
+    plan = {
+        "stage": "LIMIT",
+        "inputStage": {
+            "stage": "FETCH",
+            "inputStage": {"stage": "IXSCAN", "indexName": "phoneNumber_1_passcodeHash_1_updatedAt_-1"},
+        },
+    }
+    stages, indexes = mongo_indexes._plan_indexes(plan)
+    assert stages == ["LIMIT", "FETCH", "IXSCAN"]
+    assert indexes == ["phoneNumber_1_passcodeHash_1_updatedAt_-1"]
+
+
+def test_embedded_layout_does_not_verify_session_messages_queries():
+    embedded = {shape.collection for shape in mongo_indexes.layout_shapes("embedded")}
+    collection = {shape.collection for shape in mongo_indexes.layout_shapes("collection")}
+    assert embedded == {"call_sessions"}
+    assert collection == {"call_sessions", "session_messages"}
+
+
+def test_report_lists_missing_undeclared_and_unused():
+    sessions = FakeCollection(
+        indexes={"sessionId_1", "phoneNumber_1_updatedAt_-1"},
+        usage={"sessionId_1": 12, "phoneNumber_1_updatedAt_-1": 0},
+    )
+    db = FakeDB(call_sessions=sessions)
+    specs = [spec for spec in mongo_indexes.declared_indexes() if spec.collection == "call_sessions"]
+
+    report = asyncio.run(mongo_indexes.index_report(db, specs))["call_sessions"]
+
+    assert report["missing"] == ["createdAt_-1_sessionId_-1", "phoneNumber_1_passcodeHash_1_updatedAt_-1"]
+    assert report["undeclared"] == ["phoneNumber_1_updatedAt_-1"]
+    assert report["unused"] == ["phoneNumber_1_updatedAt_-1"]
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"✅ {name}")
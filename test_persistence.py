@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Tests for MongoDB initialisation, reconnection and pool metrics
+"""
+import asyncio
+import os
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from mongo_storage import MongoStorage
+from persistence import MongoPersistence, PersistenceUnavailable, PoolMetrics
+from session_writer import SessionWriteBehind
+
+
+class FakeAdmin:
+    def __init__(self, outcomes):
+        self.outcomes = outcomes
+
+    async def command(self, name):
+        if self.outcomes.pop(0):
+            return {"ok": 1}
+        raise ConnectionError("connection refused")
+
+
+class FakeClient(dict):
+    instances = []
+
+    def __init__(self, uri, outcomes, **options):
+        super().__init__()
+        self.options = options
+        self.admin = FakeAdmin(outcomes)
+        self.closed = False
+        FakeClient.instances.append(self)
+
+    def __missing__(self, name):
+        self[name] = {"call_sessions": SimpleNamespace(name="call_sessions")}
+        return self[name]
+
+    def close(self):
+        self.closed = True
+
+
+async def no_setup(db):
+    pass
+
+
+def test_reconnects_with_backoff_after_failed_start():
+    outcomes = [False, False, True]
+
+    async def run():
+        store = MongoPersistence(
+            "mongodb://db.invalid",
+            min_backoff=0.01,
+            max_pool_size=7,
+            write_concern="majority",
+            client_factory=lambda uri, **options: FakeClient(uri, outcomes, **options),
+            prepare=no_setup,
+        )
+        connected = []
+        store.on_connect(connected.append)
+
+        await store.start()
+        await store.start()
+        assert not store.available
+        try:
+            store.sessions()
+        except PersistenceUnavailable:
+            pass
+        else:
+            raise AssertionError("expected PersistenceUnavailable")
+
+        await asyncio.wait_for(store._reconnect_task, 1)
+        return store, connected
+
+    store, connected = asyncio.run(run())
+    assert store.attempts == 3
+    assert len(connected) == 1
+    assert store.sessions().name == "call_sessions"
+    assert [client.closed for client in FakeClient.instances[-3:]] == [True, True, False]
+    options = FakeClient.instances[-1].options
+    assert options["maxPoolSize"] == 7 and options["w"] == "majority"
+    assert options["event_listeners"] == [store.pool]
+
+
+def test_unconfigured_persistence_is_disabled():
+    async def run():
+        store = MongoPersistence("")
+        await store.start()
+        return store
+
+    store = asyncio.run(run())
+    assert store.sessions() is None and store._reconnect_task is None
+
+
+def test_uri_is_read_when_started_not_when_built():
+    outcomes = [True]
+    with patch.dict(os.environ, clear=True):
+        store = MongoPersistence(
+            client_factory=lambda uri, **options: FakeClient(uri, outcomes, host=uri, **options),
+            prepare=no_setup,
+        )
+        # e.g. load_dotenv() running after the module that built the client was imported
+        os.environ.update(MONGODB_URI="mongodb://db.invalid", MONGODB_DB_NAME="pharmacy")
+        assert store.configured
+        asyncio.run(store.start())
+    assert store.available and store.db_name == "pharmacy"
+    assert FakeClient.instances[-1].options["host"] == "mongodb://db.invalid"
+
+
+def test_writer_keeps_batches_while_database_is_down():
+    async def run():
+        storage = MongoStorage(MongoPersistence("mongodb://db.invalid"), layout="embedded")
+
+        class Sessions:
+            written = []
+
+            async def bulk_write(self, operations, ordered=True):
+                self.written.extend(operations)
+
+        writer = SessionWriteBehind(storage, batch_size=100, flush_interval_ms=10_000)
+        await writer.add("MZ1", "messages", {"text": "hi"})
+        assert await writer.flush() == 0
+        storage.use_database({"call_sessions": Sessions()})
+        assert await writer.flush() == 1
+        return writer.stats()
+
+    stats = asyncio.run(run())
+    assert stats["failed_flushes"] == 1 and stats["written"] == 1
+
+
+def test_session_upsert_and_completion_wait_for_the_database():
+    async def run():
+        storage = MongoStorage(MongoPersistence("mongodb://db.invalid"), layout="embedded")
+
+        class Sessions:
+            writes = []
+
+            async def update_one(self, query, update, upsert=False):
+                self.writes.append("complete" if "status" in update.get("$set", {}) and not upsert else "upsert")
+
+            async def bulk_write(self, operations, ordered=True):
+                self.writes.append("entries")
+
+        record = {
+            "callSid": "CA1", "phoneNumber": "+15550100", "username": "caller",
+            "passcodeHash": "0" * 64, "timestamp": datetime.now(timezone.utc),
+        }
+        writer = SessionWriteBehind(storage, batch_size=100, flush_interval_ms=10_000)
+        await writer.start_session("MZ1", record)
+        await writer.add("MZ1", "messages", {"text": "hi"})
+        await writer.complete_session("MZ1", datetime.now(timezone.utc))
+        assert writer.stats()["pending_session_writes"] == 2
+        storage.use_database({"call_sessions": Sessions()})
+        await writer.flush()
+        return Sessions.writes, writer.stats()
+
+    writes, stats = asyncio.run(run())
+    # Entries never create the session before its caller details are stored
+    assert writes == ["upsert", "entries", "complete"]
+    assert stats["pending_session_writes"] == 0 and stats["session_writes"] == 2
+    assert stats["failed_session_writes"] == 2
+
+
+def test_pool_metrics_track_checkouts():
+    metrics = PoolMetrics()
+    metrics.connection_created(None)
+    metrics.connection_created(None)
+    metrics.connection_checked_out(SimpleNamespace(duration=0.004))
+    metrics.connection_checked_out(SimpleNamespace())
+    metrics.connection_checked_in(None)
+    metrics.connection_check_out_failed(None)
+
+    stats = metrics.stats()
+    assert stats["open"] == 2
+    assert stats["checked_out"] == 1 and stats["peak_checked_out"] == 2
+    assert stats["checkouts"] == 2 and stats["checkout_failures"] == 1
+    assert stats["checkout_wait_ms_max"] == 4.0
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"✅ {name}")
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Tests for the shared recent-conversations response cache
+"""
+import asyncio
+
+from conftest import temp_path
+from mobile_bridge import MobileBridge
+from response_cache import ResponseCache
+from sqlite_storage import SQLiteStorage
+
+
+def test_concurrent_requests_share_one_build():
+    async def run():
+        cache = ResponseCache(ttl=60)
+        builds = []
+
+        async def build():
+            builds.append(1)
+            await asyncio.sleep(0.01)
+            return '{"event": "recent_conversations"}'
+
+        payloads = await asyncio.gather(*(cache.get_or_build("recent", build) for _ in range(10)))
+        await cache.get_or_build("recent", build)
+        return payloads, builds, cache.stats
+
+    payloads, builds, stats = asyncio.run(run())
+    assert len(set(payloads)) == 1
+    assert len(builds) == 1
+    assert stats == {"hits": 1, "misses": 1, "coalesced": 9, "invalidations": 0}
+
+
+def test_invalidation_during_build_is_not_cached():
+    async def run():
+        cache = ResponseCache(ttl=60)
+        versions = iter(["old", "new"])
+
+        async def build():
+            value = next(versions)
+            await asyncio.sleep(0.01)
+            return value
+
+        pending = asyncio.ensure_future(cache.get_or_build("recent", build))
+        await asyncio.sleep(0)
+        cache.invalidate()
+        first = await pending
+        second = await cache.get_or_build("recent", build)
+        return first, second
+
+    assert asyncio.run(run()) == ("old", "new")
+
+
+def test_failed_build_is_not_cached():
+    async def run():
+        cache = ResponseCache(ttl=60)
+
+        async def broken():
+            raise ConnectionError("mongo unavailable")
+
+        async def working():
+            return "ok"
+
+        try:
+            await cache.get_or_build("recent", broken)
+        except ConnectionError:
+            pass
+        return await cache.get_or_build("recent", working)
+
+    assert asyncio.run(run()) == "ok"
+
+
+def test_invalidating_a_kind_keeps_other_entries():
+    async def run():
+        cache = ResponseCache(ttl=60)
+        release = asyncio.Event()
+
+        async def slow():
+            await release.wait()
+            return "stale"
+
+        async def value():
+            return "fresh"
+
+        await cache.get_or_build(("page", 5), value)
+        building = asyncio.ensure_future(cache.get_or_build(("recent", 5), slow))
+        await asyncio.sleep(0)
+        cache.invalidate("recent")
+        release.set()
+        await building
+        return set(cache._entries)
+
+    assert asyncio.run(run()) == {("page", 5)}
+
+
+def test_bridge_drops_message_payloads_when_messages_are_written():
+    async def run():
+        bridge = MobileBridge(SQLiteStorage(temp_path()))
+        await bridge.ensure_db()
+        await bridge.start_session("MZ1", {"from": "+15550100", "callSid": "CA1"})
+        await bridge.events.drain(timeout=2)
+
+        async def payload():
+            return "cached"
+
+        cached = []
+        for key in (("recent", 5, "json"), ("page", 5, None, "json")):
+            await bridge.recent_cache.get_or_build(key, payload)
+        for n in range(3):
+            await bridge.handle_agent_response(f"reply {n}", session_id="MZ1")
+        await bridge.events.drain(timeout=2)
+        await bridge.writer.flush()
+        cached.append(set(bridge.recent_cache._entries))
+        await bridge.end_session("MZ1")
+        await bridge.events.drain(timeout=2)
+        cached.append(set(bridge.recent_cache._entries))
+        return cached
+
+    written, ended = asyncio.run(run())
+    assert written == {("page", 5, None, "json")}
+    assert ended == set()
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"✅ {name}")
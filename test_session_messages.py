@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Tests for the session_messages history layout, its writer and migration
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import session_messages
+from conftest import FakeCollection, FakeCursor
+from mongo_storage import MongoStorage
+from session_writer import SessionWriteBehind
+
+
+def test_writer_assigns_seq_and_resumes_after_stored_history():
+    async def run():
+        messages = FakeCollection([{"sessionId": "MZ1", "seq": 4, "kind": "message"}])
+        sessions = FakeCollection()
+        storage = MongoStorage(layout=session_messages.COLLECTION)
+        storage.use_database({"call_sessions": sessions, session_messages.SESSION_MESSAGES: messages})
+
+        writer = SessionWriteBehind(storage, batch_size=100)
+        await writer.add("MZ1", "messages", {"text": "hi"})
+        await writer.add("MZ1", "functionCalls", {"name": "lookup"})
+        await writer.add("MZ1", "messages", {"text": "bye"})
+        await writer.flush("MZ1")
+        return messages.documents, sessions.updates
+
+    documents, updates = asyncio.run(run())
+    assert [(doc["seq"], doc["kind"]) for doc in documents[1:]] == [
+        (5, "message"), (6, "function_call"), (7, "message")
+    ]
+    assert updates[0]["$max"] == {"messageCount": 8}
+
+
+def test_retried_batch_does_not_recount_messages():
+    class FailingOnce(FakeCollection):
+        failed = False
+
+        async def bulk_write(self, operations, ordered=True):
+            if not self.failed:
+                self.failed = True
+                raise ConnectionError("primary stepped down")
+            await super().bulk_write(operations, ordered)
+
+    async def run():
+        messages = FakeCollection()
+        sessions = FailingOnce()
+        storage = MongoStorage(layout=session_messages.COLLECTION)
+        storage.use_database({"call_sessions": sessions, session_messages.SESSION_MESSAGES: messages})
+
+        writer = SessionWriteBehind(storage, batch_size=100)
+        for text in ("hi", "bye"):
+            await writer.add("MZ1", "messages", {"text": text})
+        # The inserts land, the session update fails and the batch is retried
+        assert await writer.flush("MZ1") == 0
+        assert await writer.flush("MZ1") == 2
+        return messages.documents, sessions.updates
+
+    documents, updates = asyncio.run(run())
+    assert [doc["seq"] for doc in documents] == [0, 1]
+    assert [update["$max"] for update in updates] == [{"messageCount": 2}]
+
+
+def test_full_documents_are_read_without_the_passcode_hash():
+    class ProjectingCollection(FakeCollection):
+        def find(self, query, projection=None):
+            hidden = {key for key, value in (projection or {}).items() if value == 0}
+            return FakeCursor([
+                {key: value for key, value in doc.items() if key not in hidden}
+                for doc in self.documents if self._matches(doc, query)
+            ])
+
+        async def find_one(self, query, projection=None, sort=None):
+            found = await self.find(query, projection).to_list(1)
+            return found[0] if found else None
+
+    async def run():
+        sessions = ProjectingCollection([
+            {"_id": 1, "sessionId": "MZ1", "phoneNumber": "+15550100", "passcodeHash": "hash", "createdAt": 1, "updatedAt": 1}
+        ])
+        storage = MongoStorage(layout=session_messages.EMBEDDED)
+        storage.use_database({"call_sessions": sessions})
+        found = await storage.find_session("+15550100", "hash", with_history=True)
+        recent = await storage.recent_conversations(5)
+        return found, recent
+
+    found, recent = asyncio.run(run())
+    assert found["sessionId"] == "MZ1" and "passcodeHash" not in found
+    assert "passcodeHash" not in recent[0]
+
+
+def test_read_page_cursor():
+    async def run():
+        messages = FakeCollection(
+            [{"sessionId": "MZ1", "seq": seq, "kind": "message"} for seq in range(5)]
+        )
+        first, cursor = await session_messages.read_page(messages, "MZ1", limit=3)
+        second, end = await session_messages.read_page(messages, "MZ1", after_seq=cursor, limit=3)
+        return first, cursor, second, end
+
+    first, cursor, second, end = asyncio.run(run())
+    assert [doc["seq"] for doc in first] == [0, 1, 2] and cursor == 2
+    assert [doc["seq"] for doc in second] == [3, 4] and end is None
+
+
+def test_migration_is_idempotent_and_ordered_by_timestamp():
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    session = {
+        "_id": 1,
+        "sessionId": "MZ1",
+        "messages": [
+            {"text": "hello", "timestamp": start},
+            {"text": "result?", "timestamp": start + timedelta(seconds=2)},
+        ],
+        "functionCalls": [{"name": "lookup", "timestamp": start + timedelta(seconds=1)}],
+    }
+
+    async def run():
+        db = {"call_sessions": FakeCollection([session]), "session_messages": FakeCollection()}
+        first = await session_messages.migrate(db, drop_arrays=True, layout=session_messages.COLLECTION)
+        second = await session_messages.migrate(db, layout=session_messages.COLLECTION)
+        arrays = await session_messages.load_embedded(db["session_messages"], "MZ1")
+        return first, second, arrays, db["call_sessions"].updates
+
+    first, second, arrays, updates = asyncio.run(run())
+    assert first == {"sessions": 1, "messages": 3, "inserted": 3}
+    assert second["inserted"] == 0
+    assert [m["text"] for m in arrays["messages"]] == ["hello", "result?"]
+    assert arrays["functionCalls"][0]["seq"] == 1
+    assert updates[0]["$unset"] == {"messages": "", "functionCalls": ""}
+
+
+def test_migration_keeps_assigned_seq_and_never_lowers_the_count():
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    session = {
+        "_id": 1,
+        "sessionId": "MZ1",
+        "messages": [
+            {"text": "legacy", "timestamp": start},
+            {"text": "numbered", "seq": 0, "timestamp": start + timedelta(seconds=1)},
+            {"text": "older legacy", "timestamp": start - timedelta(seconds=1)},
+        ],
+    }
+
+    async def run():
+        db = {"call_sessions": FakeCollection([session]), "session_messages": FakeCollection()}
+        await session_messages.migrate(db, layout=session_messages.COLLECTION)
+        await session_messages.migrate(db, layout=session_messages.COLLECTION)
+        return db["session_messages"].documents, db["call_sessions"].updates
+
+    documents, updates = asyncio.run(run())
+    assert {doc["text"]: doc["seq"] for doc in documents} == {"older legacy": 1, "legacy": 2, "numbered": 0}
+    assert len(documents) == 3
+    assert all(update["$max"] == {"messageCount": 3} for update in updates)
+    assert all("messageCount" not in update["$set"] for update in updates)
+
+
+def test_migration_refuses_while_writers_use_embedded_arrays():
+    async def run():
+        sessions = FakeCollection([{"_id": 1, "sessionId": "MZ1", "messages": [{"text": "hi"}]}])
+        db = {"call_sessions": sessions, "session_messages": FakeCollection()}
+        try:
+            await session_messages.migrate(db, layout=session_messages.EMBEDDED)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("migrated while the app still writes embedded arrays")
+        return await session_messages.migrate(db, dry_run=True, layout=session_messages.EMBEDDED), db
+
+    summary, db = asyncio.run(run())
+    assert summary == {"sessions": 1, "messages": 1, "inserted": 0}
+    assert db["call_sessions"].updates == []
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"✅ {name}")
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Tests for batched write-behind persistence of call sessions
+"""
+import asyncio
+
+from mongo_storage import MongoStorage
+from session_writer import SessionWriteBehind
+
+
+class FakeCollection:
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.batches = []
+
+    async def bulk_write(self, operations, ordered=True):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("primary stepped down")
+        self.batches.append([(op._filter["sessionId"], op._doc) for op in operations])
+
+
+def make_writer(collection, **kwargs):
+    storage = MongoStorage(layout="embedded")
+    storage.use_database({"call_sessions": collection})
+    return SessionWriteBehind(storage, **kwargs)
+
+
+def test_flushes_one_push_each_per_session_on_size():
+    async def run():
+        collection = FakeCollection()
+        writer = make_writer(collection, batch_size=4, flush_interval_ms=10_000)
+        await writer.add("MZ1", "messages", {"text": "a"})
+        await writer.add("MZ2", "messages", {"text": "b"})
+        await writer.add("MZ1", "functionCalls", {"name": "lookup"})
+        assert collection.batches == []
+        await writer.add("MZ1", "messages", {"text": "c"})
+        return collection.batches, writer.stats()
+
+    batches, stats = asyncio.run(run())
+    assert len(batches) == 1
+    updates = dict(batches[0])
+    assert [m["text"] for m in updates["MZ1"]["$push"]["messages"]["$each"]] == ["a", "c"]
+    assert updates["MZ1"]["$push"]["functionCalls"]["$each"] == [{"name": "lookup"}]
+    assert [m["text"] for m in updates["MZ2"]["$push"]["messages"]["$each"]] == ["b"]
+    assert stats["written"] == 4 and stats["pending_writes"] == 0
+
+
+def test_timer_and_session_flush():
+    async def run():
+        collection = FakeCollection()
+        writer = make_writer(collection, batch_size=100, flush_interval_ms=20)
+        await writer.add("MZ1", "messages", {"text": "a"})
+        await writer.add("MZ2", "messages", {"text": "b"})
+
+        # end_session flushes only its own session, right away
+        assert await writer.flush("MZ1") == 1
+        assert writer.stats()["pending_writes"] == 1
+
+        await asyncio.sleep(0.05)
+        return collection.batches, writer.stats()
+
+    batches, stats = asyncio.run(run())
+    assert [[sid for sid, _ in batch] for batch in batches] == [["MZ1"], ["MZ2"]]
+    assert stats["flushes"] == 2 and stats["pending_writes"] == 0
+
+
+def test_failed_batch_is_retried_in_order():
+    async def run():
+        collection = FakeCollection(failures=1)
+        writer = make_writer(collection, batch_size=100, flush_interval_ms=10_000)
+        await writer.add("MZ1", "messages", {"text": "a"})
+        assert await writer.flush() == 0
+        await writer.add("MZ1", "messages", {"text": "b"})
+        assert await writer.flush() == 2
+        return collection.batches, writer.stats()
+
+    batches, stats = asyncio.run(run())
+    texts = [m["text"] for m in batches[0][0][1]["$push"]["messages"]["$each"]]
+    assert texts == ["a", "b"]
+    assert stats["failed_flushes"] == 1 and stats["written"] == 2
+
+
+def test_failed_batches_are_bounded():
+    async def run():
+        collection = FakeCollection(failures=1)
+        writer = make_writer(collection, batch_size=100, flush_interval_ms=10_000, max_pending=2)
+        await writer.add("MZ1", "messages", {"text": "a"})
+        await writer.add("MZ2", "messages", {"text": "b"})
+        await writer.add("MZ2", "messages", {"text": "c"})
+        await writer.flush()
+        return writer.stats()
+
+    stats = asyncio.run(run())
+    assert stats["dropped"] == 1 and stats["pending_writes"] == 2
+
+
+def test_adds_are_bounded_before_any_flush():
+    async def run():
+        writer = make_writer(FakeCollection(), batch_size=100, flush_interval_ms=10_000, max_pending=3)
+        for session_id in ("MZ1", "MZ1", "MZ2", "MZ3", "MZ3"):
+            await writer.add(session_id, "messages", {"text": session_id})
+            assert writer.pending_writes <= 3
+        return writer.stats(), list(writer._pending)
+
+    stats, sessions = asyncio.run(run())
+    assert stats["dropped"] == 2 and stats["pending_writes"] == 3
+    assert sessions == ["MZ2", "MZ3"]
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"✅ {name}")
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Tests for sharing one in-flight build between concurrent callers
+"""
+import asyncio
+
+from single_flight import SingleFlight
+
+
+def test_concurrent_callers_share_one_build():
+    async def run():
+        flights = SingleFlight()
+        builds = []
+
+        async def build():
+            builds.append(1)
+            await asyncio.sleep(0.01)
+            return "payload"
+
+        results = await asyncio.gather(*(flights.run("key", build) for _ in range(5)))
+        return results, len(builds), "key" in flights
+
+    results, builds, still_running = asyncio.run(run())
+    assert results == ["payload"] * 5 and builds == 1 and not still_running
+
+
+def test_failures_reach_every_waiter_and_cancelled_waiters_leave_the_build():
+    async def run():
+        flights = SingleFlight()
+        release = asyncio.Event()
+
+        async def failing():
+            await release.wait()
+            raise LookupError("not found")
+
+        leader = asyncio.ensure_future(flights.run("key", failing))
+        await asyncio.sleep(0)
+        waiters = [asyncio.ensure_future(flights.run("key", failing)) for _ in range(2)]
+        await asyncio.sleep(0)
+        waiters[0].cancel()
+        release.set()
+        return await asyncio.gather(leader, *waiters, return_exceptions=True)
+
+    leader, cancelled, waiter = asyncio.run(run())
+    assert isinstance(leader, LookupError) and isinstance(waiter, LookupError)
+    assert isinstance(cancelled, asyncio.CancelledError)
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"✅ {name}")
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Tests for the embedded SQLite history storage
+"""
+import asyncio
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+from conftest import temp_path
+from mobile_bridge import MobileBridge
+from session_writer import SessionWriteBehind
+from sqlite_storage import SQLiteStorage
+
+
+def test_bridge_round_trip_through_sqlite():
+    path = temp_path()
+
+    async def run():
+        bridge = MobileBridge(SQLiteStorage(path))
+        await bridge.ensure_db()
+        await bridge.start_session("MZ1", {"from": "+15550100", "callSid": "CA1"})
+        passcode = bridge.session_metadata["MZ1"]["passcode"]
+        await bridge.handle_transcription("hello", is_final=True, session_id="MZ1")
+        await bridge.handle_function_call("lookup", {"q": 1}, {"ok": True}, session_id="MZ1")
+        await bridge.handle_agent_response("hi there", session_id="MZ1")
+        await bridge.end_session("MZ1")
+        await bridge.events.drain(timeout=2)
+        await bridge.storage.close()
+
+        # A fresh process reads back what the first one wrote
+        reopened = MobileBridge(SQLiteStorage(path))
+        await reopened.ensure_db()
+        history = await reopened.fetch_history(phone_number="+15550100", passcode=passcode)
+        wrong = await reopened.fetch_history(phone_number="+15550100", passcode="000000")
+        return history, wrong, reopened.storage.stats()
+
+    history, wrong, stats = asyncio.run(run())
+    assert wrong is None
+    assert history["status"] == "completed" and history["messageCount"] == 3
+    assert "passcodeHash" not in history
+    assert [m["text"] for m in history["messages"]] == ["hello", "hi there"]
+    assert [m["seq"] for m in history["messages"]] == [0, 2]
+    assert history["functionCalls"][0]["result"] == {"ok": True}
+    assert isinstance(history["messages"][0]["timestamp"], datetime)
+    assert stats["available"]
+
+
+def test_failed_session_writes_are_retried_in_order():
+    class LockedOnce(SQLiteStorage):
+        """Every session write fails the first time, as with a busy database."""
+
+        def __init__(self, path):
+            super().__init__(path)
+            self.failed = set()
+
+        async def upsert_session(self, session_id, record):
+            self._fail_once("upsert")
+            await super().upsert_session(session_id, record)
+
+        async def complete_session(self, session_id, ended_at):
+            self._fail_once("complete")
+            await super().complete_session(session_id, ended_at)
+
+        def _fail_once(self, step):
+            if step not in self.failed:
+                self.failed.add(step)
+                raise sqlite3.OperationalError("database is locked")
+
+    async def run():
+        bridge = MobileBridge(LockedOnce(temp_path()))
+        await bridge.ensure_db()
+        await bridge.start_session("MZ1", {"from": "+15550100", "callSid": "CA1"})
+        passcode = bridge.session_metadata["MZ1"]["passcode"]
+        await bridge.handle_agent_response("hi there", session_id="MZ1")
+        await bridge.end_session("MZ1")
+        await bridge.events.drain(timeout=2)
+        pending = bridge.writer.stats()["pending_session_writes"]
+        await bridge.writer.flush()
+        history = await bridge.fetch_history(phone_number="+15550100", passcode=passcode)
+        return pending, history, bridge.writer.stats()
+
+    pending, history, stats = asyncio.run(run())
+    # The upsert went through when ending the call retried it; the completion is still queued
+    assert pending == 1
+    assert history["status"] == "completed" and history["callSid"] == "CA1"
+    assert [m["text"] for m in history["messages"]] == ["hi there"]
+    assert stats["pending_session_writes"] == 0 and stats["pending_writes"] == 0
+
+
+def test_conversation_buffer_after_the_call_leaves_no_seq_behind():
+    async def run():
+        bridge = MobileBridge(SQLiteStorage(temp_path()))
+        await bridge.ensure_db()
+        await bridge.start_session("MZ1", {"from": "+15550100", "callSid": "CA1"})
+        await bridge.handle_agent_response("hi there", session_id="MZ1")
+        await bridge.end_session("MZ1")
+        await bridge.events.drain(timeout=2)
+        await bridge.store_conversation_buffer("MZ1", [{"role": "user", "content": "thanks"}])
+        return dict(bridge.writer._next_seq), await bridge.storage.last_seq("MZ1")
+
+    next_seq, last_seq = asyncio.run(run())
+    assert next_seq == {} and last_seq == 1
+
+
+def test_batches_are_paged_by_seq_with_projection():
+    async def run():
+        storage = SQLiteStorage(temp_path())
+        writer = SessionWriteBehind(storage, batch_size=4, flush_interval_ms=10_000)
+        for n in range(5):
+            await writer.add("MZ1", "messages", {"text": str(n), "role": "user"})
+        await writer.flush()
+
+        pages = []
+        session = {"sessionId": "MZ1"}
+        async for entries, cursor in storage.history_pages(session, size=2, fields=["text"]):
+            pages.append((entries, cursor))
+        resumed = [entries async for entries, _ in storage.history_pages(session, size=10, cursor="seq:3")]
+        return pages, resumed, storage.stats()
+
+    pages, resumed, stats = asyncio.run(run())
+    assert [cursor for _, cursor in pages] == ["seq:1", "seq:3", None]
+    assert pages[0][0] == [{"text": "0", "seq": 0, "kind": "message"}, {"text": "1", "seq": 1, "kind": "message"}]
+    assert [entry["text"] for entry in resumed[0]] == ["4"]
+    # One transaction per flush, however many rows it carried
+    assert stats["transactions"] == 2 and stats["rows_written"] == 5
+
+
+def test_a_new_writer_continues_the_session_seq():
+    path = temp_path()
+
+    async def run():
+        written = []
+        for text in ("first run", "second run"):
+            storage = SQLiteStorage(path)
+            writer = SessionWriteBehind(storage, batch_size=10, flush_interval_ms=10_000)
+            writer.on_write(lambda sid, field, entry: written.append((entry["seq"], entry["text"])))
+            for n in range(2):
+                await writer.add("MZ1", "messages", {"text": f"{text} {n}"})
+            await writer.flush()
+            last = await storage.last_seq("MZ1")
+            await storage.close()
+        return written, last
+
+    written, last = asyncio.run(run())
+    assert written == [(0, "first run 0"), (1, "first run 1"), (2, "second run 0"), (3, "second run 1")]
+    assert last == 3
+
+
+def test_recent_sessions_cursor_and_credentials():
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+    async def run():
+        storage = SQLiteStorage(temp_path())
+        for n in range(5):
+            record = {
+                "callSid": f"CA{n}",
+                "phoneNumber": "+15550100",
+                "username": "caller",
+                "passcodeHash": "hash",
+                "timestamp": start + timedelta(minutes=n // 2),
+            }
+            await storage.upsert_session(f"MZ{n}", record)
+
+        seen, cursor = [], None
+        while True:
+            page, cursor = await storage.recent_sessions(limit=2, cursor=cursor)
+            seen.append([doc["sessionId"] for doc in page])
+            if cursor is None:
+                break
+
+        updated = await storage.update_session("MZ0", {"username": "renamed", "passcodeHash": "new"})
+        missing = await storage.update_session("MZ9", {"username": "nobody"})
+        found = await storage.find_session("+15550100", "new")
+        return seen, updated, missing, found
+
+    seen, updated, missing, found = asyncio.run(run())
+    assert seen == [["MZ4", "MZ3"], ["MZ2", "MZ1"], ["MZ0"]]
+    assert updated and not missing
+    assert found["sessionId"] == "MZ0" and found["username"] == "renamed"
+    assert "messages" not in found
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"✅ {name}")
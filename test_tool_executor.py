@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Tests for the non-blocking tool execution engine
+"""
+import asyncio
+import time
+
+from tool_executor import ToolExecutor
+
+
+def slow_sync_tool(delay: float):
+    time.sleep(delay)
+    return {"slept": delay}
+
+
+async def async_tool(value: str):
+    await asyncio.sleep(0)
+    return {"value": value}
+
+
+def failing_tool():
+    raise ValueError("boom")
+
+
+FUNCTION_MAP = {
+    "slow_sync_tool": slow_sync_tool,
+    "async_tool": async_tool,
+    "failing_tool": failing_tool,
+}
+
+
+def test_sync_tool_does_not_block_loop():
+    async def run():
+        executor = ToolExecutor(FUNCTION_MAP, max_workers=2, default_timeout=2)
+        ticks = 0
+
+        async def heartbeat():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        beat = asyncio.create_task(heartbeat())
+        result = await executor.execute("slow_sync_tool", {"delay": 0.2})
+        beat.cancel()
+        executor.shutdown()
+        return result, ticks
+
+    result, ticks = asyncio.run(run())
+    assert result == {"slept": 0.2}
+    assert ticks >= 5, f"event loop stalled while tool ran ({ticks} ticks)"
+
+
+def test_async_tool_is_awaited():
+    executor = ToolExecutor(FUNCTION_MAP)
+    assert asyncio.run(executor.execute("async_tool", {"value": "ok"})) == {"value": "ok"}
+
+
+def test_timeout_and_errors_become_results():
+    executor = ToolExecutor(FUNCTION_MAP, max_workers=1, timeouts={"slow_sync_tool": 0.05})
+    timed_out = asyncio.run(executor.execute("slow_sync_tool", {"delay": 0.3}))
+    assert "timed out" in timed_out["error"]
+    assert "boom" in asyncio.run(executor.execute("failing_tool", {}))["error"]
+    assert "not found" in asyncio.run(executor.execute("missing", {}))["error"]
+    executor.shutdown(wait=True)
+
+
+def test_concurrency_limit():
+    async def run():
+        executor = ToolExecutor(
+            FUNCTION_MAP,
+            max_workers=4,
+            default_timeout=2,
+            concurrency={"slow_sync_tool": 1},
+        )
+        started = time.perf_counter()
+        await asyncio.gather(
+            executor.execute("slow_sync_tool", {"delay": 0.1}),
+            executor.execute("slow_sync_tool", {"delay": 0.1}),
+        )
+        executor.shutdown()
+        return time.perf_counter() - started
+
+    assert asyncio.run(run()) >= 0.2
+
+
+def test_timed_out_sync_tool_keeps_its_slot_until_the_thread_returns():
+    async def run():
+        executor = ToolExecutor(
+            FUNCTION_MAP,
+            max_workers=4,
+            timeouts={"slow_sync_tool": 0.05},
+            concurrency={"slow_sync_tool": 1},
+        )
+        first = await executor.execute("slow_sync_tool", {"delay": 0.2})
+        # The first call's thread is still sleeping, so there is no free slot
+        second = await executor.execute("slow_sync_tool", {"delay": 0})
+        await asyncio.sleep(0.2)
+        third = await executor.execute("slow_sync_tool", {"delay": 0})
+        executor.shutdown(wait=True)
+        return first, second, third
+
+    first, second, third = asyncio.run(run())
+    assert "timed out" in first["error"] and "timed out" in second["error"]
+    assert third == {"slept": 0}
+
+
+def test_executor_is_reusable_across_event_loops():
+    executor = ToolExecutor(FUNCTION_MAP, max_workers=2, default_timeout=2, concurrency={"slow_sync_tool": 1})
+
+    async def contended():
+        return await asyncio.gather(*(executor.execute("slow_sync_tool", {"delay": 0.01}) for _ in range(3)))
+
+    # e.g. one asyncio.run per test, or a restarted server loop
+    for _ in range(2):
+        assert asyncio.run(contended()) == [{"slept": 0.01}] * 3
+    executor.shutdown(wait=True)
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"✅ {name}")
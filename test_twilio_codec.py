@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Tests for the Twilio media codec and JSON backend selection
+"""
+import base64
+import json
+
+from json_backend import get_backend
+from twilio_codec import TwilioMediaCodec
+
+
+def test_outbound_templates_match_stdlib_encoding():
+    codec = TwilioMediaCodec(get_backend("json"))
+    encoder = codec.encoder('MZ"quoted\\sid')
+    audio = bytes(range(256))
+
+    assert json.loads(encoder.media(audio)) == {
+        "event": "media",
+        "streamSid": 'MZ"quoted\\sid',
+        "media": {"payload": base64.b64encode(audio).decode("ascii")},
+    }
+    assert json.loads(encoder.clear_message) == {"event": "clear", "streamSid": 'MZ"quoted\\sid'}
+    assert codec.encoder('MZ"quoted\\sid') is encoder
+
+    codec.release('MZ"quoted\\sid')
+    assert codec.encoder('MZ"quoted\\sid') is not encoder
+
+
+def test_inbound_decoding_with_every_available_backend():
+    message = json.dumps({
+        "event": "media",
+        "media": {"track": "inbound", "payload": base64.b64encode(b"\xff\x7f\x00").decode("ascii")},
+    })
+    for name in ("json", "ujson", "orjson"):
+        codec = TwilioMediaCodec(get_backend(name))
+        data = codec.decode(message)
+        assert codec.decode_payload(data["media"]) == b"\xff\x7f\x00"
+
+
+def test_backend_dumps_returns_text():
+    for name in ("json", "ujson", "orjson"):
+        backend = get_backend(name)
+        assert isinstance(backend.dumps({"event": "pong"}), str)
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"✅ {name}")
@@ -0,0 +1,112 @@
+import asyncio
+import functools
+import inspect
+import os
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+
+def _release_slot(semaphore: asyncio.Semaphore, future: asyncio.Future):
+    if not future.cancelled():
+        # Retrieved so a tool that fails after its caller timed out isn't logged as unhandled
+        future.exception()
+    semaphore.release()
+
+
+class ToolExecutor:
+    """Run agent tools without blocking the event loop.
+
+    Sync tools are dispatched to a bounded thread pool, async tools are
+    awaited directly. Every call is bounded by a per-tool timeout and a
+    per-tool concurrency limit so one slow tool cannot starve the audio
+    tasks of other calls sharing the process. A sync tool that times out
+    keeps its slot until its thread returns, so the limit also bounds the
+    threads still running abandoned calls.
+    """
+
+    def __init__(
+        self,
+        function_map: Dict[str, Callable[..., Any]],
+        *,
+        max_workers: Optional[int] = None,
+        default_timeout: Optional[float] = None,
+        default_concurrency: Optional[int] = None,
+        timeouts: Optional[Dict[str, float]] = None,
+        concurrency: Optional[Dict[str, int]] = None,
+    ):
+        self.function_map = function_map
+        self.max_workers = max_workers or int(os.getenv("TOOL_MAX_WORKERS", "8"))
+        if default_timeout is None:
+            default_timeout = float(os.getenv("TOOL_TIMEOUT_SECONDS", "8"))
+        self.default_timeout = default_timeout
+        self.default_concurrency = default_concurrency or int(
+            os.getenv("TOOL_MAX_CONCURRENCY", "4")
+        )
+        self.timeouts = dict(timeouts or {})
+        self.concurrency = dict(concurrency or {})
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # event loop -> tool name -> semaphore, as asyncio primitives belong to one loop
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="tool",
+            )
+        return self._executor
+
+    def _get_semaphore(self, func_name: str) -> asyncio.Semaphore:
+        semaphores = self._semaphores.setdefault(asyncio.get_running_loop(), {})
+        semaphore = semaphores.get(func_name)
+        if semaphore is None:
+            limit = self.concurrency.get(func_name, self.default_concurrency)
+            semaphore = asyncio.Semaphore(limit)
+            semaphores[func_name] = semaphore
+        return semaphore
+
+    async def _run_limited(self, func_name: str, func: Callable[..., Any], arguments: dict):
+        semaphore = self._get_semaphore(func_name)
+        await semaphore.acquire()
+        if inspect.iscoroutinefunction(func):
+            try:
+                return await func(**arguments)
+            finally:
+                semaphore.release()
+
+        future = asyncio.get_running_loop().run_in_executor(
+            self._get_executor(),
+            functools.partial(func, **arguments),
+        )
+        # Released when the thread finishes, not when the caller stops waiting
+        future.add_done_callback(functools.partial(_release_slot, semaphore))
+        result = await asyncio.shield(future)
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+
+    async def execute(self, func_name: str, arguments: dict):
+        """Execute ``func_name`` and return its result or an error dict."""
+        func = self.function_map.get(func_name)
+        if func is None:
+            return {"error": f"Function {func_name} not found"}
+
+        timeout = self.timeouts.get(func_name, self.default_timeout)
+        try:
+            # The timeout covers waiting for a concurrency slot as well, so a
+            # backlog of slow calls surfaces as an error instead of silence.
+            return await asyncio.wait_for(
+                self._run_limited(func_name, func, arguments),
+                timeout=timeout,
+            )
+        except asyncio.TimeoutError:
+            # A sync tool keeps its worker thread, and its slot, until it returns
+            return {"error": f"Function {func_name} timed out after {timeout}s"}
+        except Exception as exc:
+            return {"error": f"func called failed:{exc}"}
+
+    def shutdown(self, wait: bool = False):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
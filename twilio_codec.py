@@ -0,0 +1,56 @@
+import binascii
+import json
+from typing import Dict, Optional
+
+import json_backend
+
+
+class OutboundMediaEncoder:
+    """Pre-serialised Twilio envelopes for one ``streamSid``.
+
+    The JSON around the payload never changes within a call, so encoding a
+    chunk is two string concatenations around the base64 text instead of
+    building and serialising a dict.
+    """
+
+    __slots__ = ("stream_sid", "_prefix", "_suffix", "clear_message")
+
+    def __init__(self, stream_sid: str):
+        self.stream_sid = stream_sid
+        quoted_sid = json.dumps(stream_sid)
+        self._prefix = '{"event":"media","streamSid":' + quoted_sid + ',"media":{"payload":"'
+        self._suffix = '"}}'
+        self.clear_message = '{"event":"clear","streamSid":' + quoted_sid + '}'
+
+    def media(self, audio) -> str:
+        return self._prefix + binascii.b2a_base64(audio, newline=False).decode("ascii") + self._suffix
+
+
+class TwilioMediaCodec:
+    """Codec for the Twilio Media Streams websocket protocol."""
+
+    def __init__(self, backend: Optional[json_backend.JSONBackend] = None):
+        self.backend = backend or json_backend.backend
+        self._encoders: Dict[str, OutboundMediaEncoder] = {}
+
+    def decode(self, message) -> dict:
+        return self.backend.loads(message)
+
+    @staticmethod
+    def decode_payload(media: dict) -> bytes:
+        return binascii.a2b_base64(media["payload"])
+
+    def encoder(self, stream_sid: str) -> OutboundMediaEncoder:
+        encoder = self._encoders.get(stream_sid)
+        if encoder is None:
+            encoder = OutboundMediaEncoder(stream_sid)
+            self._encoders[stream_sid] = encoder
+        return encoder
+
+    def release(self, stream_sid: Optional[str]):
+        """Forget a finished call's envelope templates."""
+        self._encoders.pop(stream_sid, None)
+
+
+# Shared codec for all calls on this process
+twilio_codec = TwilioMediaCodec()